@@ -0,0 +1,232 @@
+"""
+Priority-aware admission control.
+
+Routes are grouped into priority classes, each with its own concurrency limit
+and a bounded FIFO queue with a deadline. A request starts immediately while
+its class has a free slot. Otherwise it waits in the queue. It is shed, and
+should get a 503 with Retry-After, when the queue is full or its deadline
+passes. Classes are strictly ordered: no request of a class starts while a
+request of a higher class is waiting. Under overload, analytics and bulk
+work are deferred and shed first, and the triage and hospital routes keep
+their own capacity.
+
+One controller serves both serving modes. Flask's request hooks call the
+blocking `acquire`, and asgi.py awaits `acquire_async` before it dispatches,
+so queued requests there wait on the event loop instead of holding a thread.
+Limits are per worker process.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Sequence
+
+# Set on the ASGI scope when asgi.py has admitted a request, so Flask doesn't admit it again
+SCOPE_KEY = 'health.admission'
+
+
+class PriorityClass(NamedTuple):
+    name: str
+    limit: int              # requests running at once
+    queue_size: int         # requests waiting for a slot; more are shed straight away
+    queue_timeout: float    # seconds a request may wait before it is shed
+    retry_after: int        # Retry-After seconds sent with the 503
+
+    @classmethod
+    def from_env(cls, name: str, limit: int, queue_size: int, queue_timeout: float,
+                 retry_after: int) -> 'PriorityClass':
+        """Defaults overridable with ADMISSION_<NAME>_LIMIT / _QUEUE / _TIMEOUT / _RETRY_AFTER"""
+        prefix = f'ADMISSION_{name.upper()}_'
+        return cls(
+            name,
+            int(os.environ.get(prefix + 'LIMIT', limit)),
+            int(os.environ.get(prefix + 'QUEUE', queue_size)),
+            float(os.environ.get(prefix + 'TIMEOUT', queue_timeout)),
+            int(os.environ.get(prefix + 'RETRY_AFTER', retry_after))
+        )
+
+
+class Overloaded(Exception):
+    """A request was shed; `reason` is 'queue_full' or 'timeout'"""
+
+    def __init__(self, priority_class: PriorityClass, reason: str):
+        super().__init__(f'{priority_class.name} requests are over capacity ({reason})')
+        self.priority_class = priority_class
+        self.reason = reason
+        self.retry_after = priority_class.retry_after
+
+
+class _Waiter:
+    """A queued request, woken by a thread event or an event loop future"""
+    __slots__ = ('granted', 'event', 'loop', 'future')
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.granted = False
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def grant(self):
+        self.granted = True
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(True)
+
+
+class _ClassState:
+    __slots__ = ('active', 'waiters', 'admitted', 'queued', 'rejected', 'wait_seconds')
+
+    def __init__(self):
+        self.active = 0
+        self.waiters: Deque[_Waiter] = deque()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = {'queue_full': 0, 'timeout': 0}
+        self.wait_seconds = 0.0
+
+
+class AdmissionController:
+    """Per-class concurrency limits with bounded, deadline-limited queues; classes highest priority first"""
+
+    def __init__(self, classes: Sequence[PriorityClass],
+                 wait_observer: Optional[Callable[[str, float], None]] = None):
+        if not classes:
+            raise ValueError('At least one priority class is required')
+        self.classes = {c.name: c for c in classes}
+        self.order = [c.name for c in classes]
+        self.wait_observer = wait_observer
+        self._states = {c.name: _ClassState() for c in classes}
+        self._lock = threading.Lock()
+
+    def acquire(self, name: str):
+        """Take a slot for class `name`, waiting in its queue; raises Overloaded when shed"""
+        waiter = self._enqueue(name, None)
+        if waiter is None:
+            return
+        started = time.perf_counter()
+        waiter.event.wait(self.classes[name].queue_timeout)
+        self._settle(name, waiter, started)
+
+    async def acquire_async(self, name: str):
+        """acquire() for coroutines: the wait parks on the event loop"""
+        waiter = self._enqueue(name, asyncio.get_running_loop())
+        if waiter is None:
+            return
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.classes[name].queue_timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # Client went away while queued; give back a slot handed over meanwhile
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._states[name].waiters.remove(waiter)
+                    self._dispatch()
+            if granted:
+                self.release(name)
+            raise
+        self._settle(name, waiter, started)
+
+    def release(self, name: str):
+        """Give back a slot taken by acquire() / acquire_async()"""
+        with self._lock:
+            self._states[name].active -= 1
+            self._dispatch()
+
+    def _enqueue(self, name: str, loop: Optional[asyncio.AbstractEventLoop]) -> Optional[_Waiter]:
+        """Admit right away (None) or queue a waiter; raises Overloaded when the queue is full"""
+        priority_class = self.classes[name]
+        with self._lock:
+            state = self._states[name]
+            if state.active < priority_class.limit and not state.waiters and not self._higher_waiting(name):
+                state.active += 1
+                state.admitted += 1
+                return None
+            if len(state.waiters) >= priority_class.queue_size:
+                state.rejected['queue_full'] += 1
+                raise Overloaded(priority_class, 'queue_full')
+            waiter = _Waiter(loop)
+            state.waiters.append(waiter)
+            state.queued += 1
+            return waiter
+
+    def _settle(self, name: str, waiter: _Waiter, started: float):
+        """After a wait: admitted if a slot was handed over, otherwise shed"""
+        waited = time.perf_counter() - started
+        with self._lock:
+            state = self._states[name]
+            state.wait_seconds += waited
+            if not waiter.granted:
+                state.waiters.remove(waiter)
+                state.rejected['timeout'] += 1
+                # This waiter may have been holding back lower classes
+                self._dispatch()
+        if self.wait_observer is not None:
+            self.wait_observer(name, waited)
+        if not waiter.granted:
+            raise Overloaded(self.classes[name], 'timeout')
+
+    def _higher_waiting(self, name: str) -> bool:
+        for other in self.order:
+            if other == name:
+                return False
+            if self._states[other].waiters:
+                return True
+        return False
+
+    def _dispatch(self):
+        """Hand free slots to queued requests, highest class first (lock held)"""
+        for name in self.order:
+            state = self._states[name]
+            limit = self.classes[name].limit
+            while state.waiters and state.active < limit:
+                state.active += 1
+                state.admitted += 1
+                state.waiters.popleft().grant()
+            if state.waiters:
+                return
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                name: {
+                    'limit': self.classes[name].limit,
+                    'queue_size': self.classes[name].queue_size,
+                    'in_flight': state.active,
+                    'queued_now': len(state.waiters),
+                    'admitted': state.admitted,
+                    'queued': state.queued,
+                    'rejected_queue_full': state.rejected['queue_full'],
+                    'rejected_timeout': state.rejected['timeout'],
+                    'queue_wait_seconds': round(state.wait_seconds, 6)
+                }
+                for name, state in self._states.items()
+            }
+
+    def families(self) -> List:
+        """Per-class gauges and counters for the metrics registry"""
+        stats = self.stats()
+        gauges = (('in_flight', 'Requests running'), ('queued_now', 'Requests waiting for a slot'),
+                  ('limit', 'Concurrency limit'), ('queue_size', 'Queue capacity'))
+        families = [
+            (f'admission_{key}', 'gauge', f'Admission control: {text}',
+             [({'class': name}, values[key]) for name, values in stats.items()])
+            for key, text in gauges
+        ]
+        families.append(('admission_admitted_total', 'counter', 'Admission control: requests admitted',
+                         [({'class': name}, values['admitted']) for name, values in stats.items()]))
+        families.append(('admission_queued_total', 'counter', 'Admission control: requests that had to wait',
+                         [({'class': name}, values['queued']) for name, values in stats.items()]))
+        families.append(('admission_rejected_total', 'counter', 'Admission control: requests shed with a 503',
+                         [({'class': name, 'reason': reason}, values[f'rejected_{reason}'])
+                          for name, values in stats.items() for reason in ('queue_full', 'timeout')]))
+        return families
@@ -1,12 +1,44 @@
-from flask import Flask, render_template, request, jsonify
-import sqlite3
+from flask import Flask, Request, Response, abort, g, render_template, request, jsonify, send_file, stream_with_context, url_for
+from werkzeug.exceptions import HTTPException
 import os
+import hmac
 import json
+import time
+import asyncio
+import queue
+from collections import defaultdict
 from datetime import datetime
-import requests
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from math import isfinite, radians, sin, cos, sqrt, atan2
+from concurrent.futures import ThreadPoolExecutor
+
+from hospital_cache import HospitalTileCache
+from facility_index import FacilityIndex
+from road_graph import RoadGraph
+from facilities import FacilitySet
+from overpass_client import OverpassClient, DEFAULT_OVERPASS_URL
+from hospital_search import search_expanding_radii
+from storage import PartialInsertError, get_store, record_params, patient_key
+from scoring import calculate_health_score, score_batch
+from rule_engine import get_engine
+from write_behind import WriteBehindQueue
+from trends import TrendEngine
+from retention import RetentionManager
+from admission import SCOPE_KEY, AdmissionController, Overloaded, PriorityClass
+from assets import AssetPipeline
+from export import ExportQuery, encoder_for, export_filename, export_stream
+from triage_cache import CachedPayload, TriageResponseCache
+from metrics import REGISTRY, CONTENT_TYPE, Counter, Histogram, count_error, stats_families, timed
+
+class TimedRequest(Request):
+    """Request whose JSON body decoding shows up in the operation timings"""
+    
+    def get_json(self, *args, **kwargs):
+        with timed('request_json_parse'):
+            return super().get_json(*args, **kwargs)
 
 app = Flask(__name__)
+app.request_class = TimedRequest
 
 # Configuration
 GOOGLE_MAPS_API_KEY = os.environ.get('GOOGLE_MAPS_API_KEY', 'YOUR_API_KEY_HERE')
@@ -108,108 +140,295 @@ EMERGENCY_INSTRUCTIONS = {
     ]
 }
 
+# Every triage/classification response and the triage catalog are serialized once
+# at startup (see triage_cache.py) and served with ETags
+TRIAGE_CACHE_MAX_AGE = int(os.environ.get('TRIAGE_CACHE_MAX_AGE', 300))
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+triage_cache = TriageResponseCache(get_engine(), TRIAGE_QUESTIONS, EMERGENCY_INSTRUCTIONS)
+
+def cached_json(payload: CachedPayload, cache_control: str) -> Response:
+    """Serve pre-serialized JSON with its ETag, answering If-None-Match with 304"""
+    response = Response(payload.body, mimetype='application/json')
+    response.set_etag(payload.etag)
+    response.headers['Cache-Control'] = cache_control
+    return response.make_conditional(request)
+
+# Static asset pipeline (see assets.py): minified, content-hashed and precompressed
+# copies of static/css and static/js, served immutable from /assets/
+ASSET_BUILD_ON_START = os.environ.get('ASSET_BUILD_ON_START', '1') != '0'
+
+asset_pipeline = AssetPipeline()
+try:
+    if ASSET_BUILD_ON_START:
+        asset_pipeline.build()
+    else:
+        # Built ahead of time with `python assets.py`
+        asset_pipeline.load()
+except Exception as e:
+    # Fall back to the unprocessed files under /static
+    count_error('asset_build')
+    print(f"Error building static assets: {e}")
+
+@app.context_processor
+def asset_helpers():
+    def asset_url(name: str) -> str:
+        """Hashed /assets/ URL of a static file, or its plain /static/ URL when not built"""
+        path = asset_pipeline.url_path(name)
+        if path is None:
+            return url_for('static', filename=name)
+        return url_for('hashed_asset', path=path)
+    return {'asset_url': asset_url}
+
+# Health record durability: 'sync' commits inside the request, 'batched' hands rows
+# to the write-behind queue (see write_behind.py) and returns before they are stored
+HEALTH_WRITE_MODE = os.environ.get('HEALTH_WRITE_MODE', 'sync')
+WRITE_BATCH_SIZE = int(os.environ.get('WRITE_BATCH_SIZE', 200))
+WRITE_FLUSH_INTERVAL = float(os.environ.get('WRITE_FLUSH_INTERVAL', 0.05))
+WRITE_QUEUE_SIZE = int(os.environ.get('WRITE_QUEUE_SIZE', 10000))
+MAX_BATCH_RECORDS = int(os.environ.get('MAX_BATCH_RECORDS', 10000))
+WRITE_BACKPRESSURE_TIMEOUT = float(os.environ.get('WRITE_BACKPRESSURE_TIMEOUT', 5))
+MAX_STREAM_LINE_BYTES = int(os.environ.get('MAX_STREAM_LINE_BYTES', 16384))
+
+write_queue = WriteBehindQueue(
+    get_store(),
+    batch_size=WRITE_BATCH_SIZE,
+    flush_interval=WRITE_FLUSH_INTERVAL,
+    max_queue=WRITE_QUEUE_SIZE
+)
+
+# Per-patient trends (see trends.py); records carrying a patient_id get a trend penalty.
+# Windows are read from SQLite so every worker sees the same history; TREND_FROM_DB=0
+# keeps them in process instead (at most TREND_MAX_PATIENTS, per worker)
+TRENDS_ENABLED = os.environ.get('TRENDS_ENABLED', '1') != '0'
+TREND_MAX_PATIENTS = int(os.environ.get('TREND_MAX_PATIENTS', 10000))
+TREND_FROM_DB = os.environ.get('TREND_FROM_DB', '1') != '0'
+
+trend_engine = TrendEngine(
+    get_engine().trends,
+    max_patients=TREND_MAX_PATIENTS,
+    history=get_store().recent_readings if TREND_FROM_DB else None
+)
+
+# Retention (see retention.py): records older than RETENTION_DAYS move to the gzip archive;
+# 0 keeps everything in the hot table
+RETENTION_DAYS = float(os.environ.get('RETENTION_DAYS', 0))
+RETENTION_INTERVAL = float(os.environ.get('RETENTION_INTERVAL', 3600))
+RETENTION_CHUNK_SIZE = int(os.environ.get('RETENTION_CHUNK_SIZE', 500))
+
+retention = None
+if RETENTION_DAYS > 0:
+    retention = RetentionManager(get_store(), get_store().archive, RETENTION_DAYS, chunk_size=RETENTION_CHUNK_SIZE)
+
+# Bulk export (see export.py) of every record in a date range; disabled unless
+# EXPORT_TOKEN is set, then callers send it as `Authorization: Bearer <token>`
+EXPORT_TOKEN = os.environ.get('EXPORT_TOKEN', '')
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 5000))
+
+# Admission control (see admission.py), per worker: life-critical routes keep their
+# own capacity while analytics and bulk work queue briefly and are shed first
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', '1') != '0'
+ADMISSION_CLASSES = [
+    PriorityClass.from_env('critical', limit=32, queue_size=64, queue_timeout=5.0, retry_after=1),
+    PriorityClass.from_env('standard', limit=8, queue_size=16, queue_timeout=2.0, retry_after=2),
+    PriorityClass.from_env('low', limit=4, queue_size=8, queue_timeout=0.5, retry_after=5),
+]
+# Endpoint -> class; endpoints not listed (/metrics and the stats pages) are never queued or shed
+ADMISSION_ROUTES = {
+    'index': 'critical',
+    'static': 'critical',
+    'hashed_asset': 'critical',
+    'get_triage_questions': 'critical',
+    'classify_emergency': 'critical',
+    'triage_catalog': 'critical',
+    'triage_catalog_version': 'critical',
+    'find_hospitals': 'critical',
+    'check_health': 'standard',
+    'check_health_batch': 'standard',
+    'check_health_stream': 'standard',
+    'patient_trends': 'standard',
+    'health_history': 'low',
+    'stats': 'low',
+    'export_records': 'low'
+}
+
+# Metrics (see metrics.py), exposed on /metrics in Prometheus text format
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Request latency by route', ['method', 'route'])
+REQUESTS = Counter('http_requests_total', 'Requests by route and status code', ['method', 'route', 'status'])
+HOSPITAL_FALLBACKS = Counter('hospital_search_fallback_total',
+                             'Hospital searches answered from a wider radius than the first (e.g. 10 km)')
+HOSPITAL_TIMEOUTS = Counter('hospital_search_timeouts_total',
+                            'Hospital searches that hit their deadline and returned a partial result')
+WRITE_QUEUE_FULL = Counter('health_write_queue_full_total',
+                           'Health records inserted synchronously because the write queue was full')
+EXPORTED_ROWS = Counter('health_export_rows_total', 'Health records streamed by /export', ['format'])
+ADMISSION_WAIT_SECONDS = Histogram('admission_queue_wait_seconds',
+                                   'Time queued requests waited for a slot, by priority class', ['class'])
+
+admission = None
+if ADMISSION_ENABLED:
+    admission = AdmissionController(
+        ADMISSION_CLASSES,
+        wait_observer=lambda name, seconds: ADMISSION_WAIT_SECONDS.labels(name).observe(seconds)
+    )
+    REGISTRY.register_collector(admission.families)
+
+def endpoint_priority(endpoint: Optional[str]) -> Optional[str]:
+    """Priority class of a Flask endpoint, or None when it isn't admission-controlled"""
+    if admission is None or endpoint is None:
+        return None
+    return ADMISSION_ROUTES.get(endpoint)
+
+def route_priority(method: str, path: str) -> Optional[Tuple[str, str]]:
+    """
+    endpoint_priority for a raw method and path (the ASGI router has no Flask request)
+    Returns: (priority class, URL rule) or None
+    """
+    if admission is None:
+        return None
+    try:
+        rule, _ = app.url_map.bind('localhost').match(path, method, return_rule=True)
+    except HTTPException:
+        return None
+    priority = endpoint_priority(rule.endpoint)
+    return (priority, rule.rule) if priority is not None else None
+
+def overloaded_payload(error: Overloaded) -> Dict:
+    return {
+        'success': False,
+        'error': 'Server is busy, please retry shortly',
+        'retry_after': error.retry_after
+    }
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.before_request
+def admit_request():
+    """Hold a slot of the route's priority class until the response is finished"""
+    priority = endpoint_priority(request.endpoint)
+    if priority is None or (request.environ.get('asgi.scope') or {}).get(SCOPE_KEY):
+        # Not controlled, or already admitted by asgi.py
+        return None
+    try:
+        admission.acquire(priority)
+    except Overloaded as e:
+        response = jsonify(overloaded_payload(e))
+        response.status_code = 503
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    g.admission_class = priority
+
+@app.teardown_request
+def release_admission(exc):
+    # Streamed responses (stream_with_context) tear down once the body is sent
+    priority = g.pop('admission_class', None)
+    if priority is not None:
+        admission.release(priority)
+
+@app.after_request
+def record_request_metrics(response):
+    """Per-route latency (time to response headers for streamed bodies) and status counts"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_SECONDS.labels(request.method, route).observe(time.perf_counter() - started)
+        REQUESTS.labels(request.method, route, response.status_code).inc()
+    return response
+
 # Database setup
 def init_db():
     """Initialize the SQLite database with health records table"""
-    conn = sqlite3.connect('database/health_records.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS health_records (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            age INTEGER,
-            temperature REAL,
-            heart_rate INTEGER,
-            bp_sys INTEGER,
-            bp_dia INTEGER,
-            spo2 INTEGER,
-            symptoms TEXT,
-            status TEXT,
-            score INTEGER,
-            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
-
-def calculate_health_score(data: Dict) -> Tuple[int, str]:
-    """
-    Calculate health stability score based on input parameters
-    Returns: (score, status)
-    Score: 0-100 (higher is better)
-    Status: 'Stable', 'Monitor', 'Emergency'
-    """
-    score = 100
-    temperature = data.get('temperature', 0)
-    heart_rate = data.get('heart_rate', 0)
-    bp_sys = data.get('bp_sys', 0)
-    bp_dia = data.get('bp_dia', 0)
-    spo2 = data.get('spo2', 0)
-    age = data.get('age', 30)
-    symptoms = data.get('symptoms', '').lower()
-    
-    # Temperature scoring (normal: 36.1-37.2°C)
-    if temperature < 35 or temperature > 40:
-        score -= 30  # Critical
-    elif temperature < 36 or temperature > 38.5:
-        score -= 20  # Concerning
-    elif temperature < 36.5 or temperature > 37.5:
-        score -= 10   # Slightly off
-    
-    # Heart rate scoring (normal: 60-100 bpm)
-    if heart_rate < 40 or heart_rate > 150:
-        score -= 25  # Critical
-    elif heart_rate < 50 or heart_rate > 120:
-        score -= 10  # Concerning
-    elif heart_rate < 55 or heart_rate > 105:
-        score -= 5   # Slightly off
-    
-    # Blood pressure scoring (normal: 90-140/60-90)
-    if bp_sys < 80 or bp_sys > 180 or bp_dia < 50 or bp_dia > 110:
-        score -= 20  # Critical
-    elif bp_sys < 90 or bp_sys > 160 or bp_dia < 60 or bp_dia > 100:
-        score -= 10  # Concerning
-    elif bp_sys < 95 or bp_sys > 150 or bp_dia < 65 or bp_dia > 95:
-        score -= 5   # Slightly off
-    
-    # SpO2 scoring (normal: 95-100%)
-    if spo2 < 90:
-        score -= 30  # Critical
-    elif spo2 < 95:
-        score -= 15  # Concerning
-    elif spo2 < 97:
-        score -= 5   # Slightly off
-    
-    # Age factor
-    if age > 65:
-        score -= 5
-    elif age < 18:
-        score -= 3
-    
-    # Symptoms scoring
-    critical_symptoms = ['chest pain', 'difficulty breathing', 'severe headache', 'loss of consciousness', 'severe bleeding']
-    concerning_symptoms = ['dizziness', 'nausea', 'fever', 'fatigue', 'pain', 'headache']
-    
-    for symptom in critical_symptoms:
-        if symptom in symptoms:
-            score -= 20
-            break
-    
-    for symptom in concerning_symptoms:
-        if symptom in symptoms:
-            score -= 10
-            break
-    
-    # Determine status
-    if score >= 85:
-        status = 'Stable'
-    elif score >= 60:
-        status = 'Monitor'
-    else:
-        status = 'Emergency'
+    get_store().init_schema()
+
+def save_health_record(params: Tuple, block: bool = False, fallback: bool = True) -> bool:
+    """
+    Persist a health record according to HEALTH_WRITE_MODE.
+    With block=True a full write queue stalls the caller (up to WRITE_BACKPRESSURE_TIMEOUT)
+    instead of falling back to a synchronous insert straight away.
+    With fallback=False nothing is inserted synchronously; the caller must insert
+    the record itself when this returns False (async callers do it off the event loop).
+    Returns: whether the record was queued
+    """
+    if HEALTH_WRITE_MODE == 'batched':
+        try:
+            write_queue.submit(params, block=block, timeout=WRITE_BACKPRESSURE_TIMEOUT if block else None)
+            return True
+        except queue.Full:
+            # Writer is behind; insert synchronously rather than drop the record
+            WRITE_QUEUE_FULL.inc()
+    if fallback:
+        get_store().insert_record(params)
+    return False
+
+def apply_trend(data: Dict, score: int, status: str, pending: Iterable[Dict] = ()) -> Tuple[int, str, Optional[Dict]]:
+    """
+    Fold a reading into its patient's rolling trends and subtract the trend penalty.
+    `pending` are earlier readings of the same patient in this request, not stored yet.
+    Returns: (score, status, trend) - trend is None for records without a patient_id
+    """
+    patient_id = patient_key(data)
+    if patient_id is None or not TRENDS_ENABLED:
+        return score, status, None
+    
+    trend = trend_engine.update(patient_id, data, pending=pending)
+    if trend['penalty']:
+        adjusted = score - trend['penalty']
+        score, status = max(0, adjusted), get_engine().status_for(adjusted)
+    return score, status, trend
+
+def request_json(body: bytes):
+    """
+    A request body parsed as JSON, for routes served by both Flask and asgi.py,
+    so a bad body gets the same 400 in either mode. Raises ValueError.
+    """
+    try:
+        return json.loads(body or b'null')
+    except ValueError:
+        raise ValueError('Request body must be valid JSON') from None
+
+def health_check_result(data: Dict) -> Tuple[Dict, Tuple]:
+    """
+    Score one submitted health check (with its trend penalty)
+    Returns: (response payload, INSERT_HEALTH_RECORD parameters)
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object')
+    # Calculate health score
+    score, status = calculate_health_score(data)
+    # Reject values the database cannot store before they reach the trends or the write queue
+    record_params(data, status, score)
+    score, status, trend = apply_trend(data, score, status)
+    
+    # Generate advice
+    advice = get_health_advice(status, score)
     
-    return max(0, score), status
+    result = {
+        'success': True,
+        'score': score,
+        'status': status,
+        'advice': advice,
+        'timestamp': datetime.now().isoformat()
+    }
+    if trend is not None:
+        result['trend'] = trend
+    return result, record_params(data, status, score)
+
+def history_query(args) -> Dict:
+    """history_page() arguments from /health_history query parameters"""
+    try:
+        limit = int(args.get('limit', 10))
+    except ValueError:
+        limit = 10
+    return {
+        'limit': limit,
+        'cursor': args.get('cursor'),
+        'statuses': [s for s in args.get('status', '').split(',') if s],
+        'patient_id': args.get('patient'),
+        'date_from': args.get('from'),
+        'date_to': args.get('to')
+    }
 
 def get_health_advice(status: str, score: int) -> str:
     """Generate health advice based on status and score"""
@@ -238,139 +457,294 @@ def get_health_advice(status: str, score: int) -> str:
     
     return advice.get(status, ["Please consult a healthcare professional."])
 
-def find_nearby_hospitals(latitude: float, longitude: float, radius: int = 5000) -> List[Dict]:
+# Overpass HTTP client (see overpass_client.py)
+OVERPASS_URL = os.environ.get('OVERPASS_URL', DEFAULT_OVERPASS_URL)
+OVERPASS_POOL_SIZE = int(os.environ.get('OVERPASS_POOL_SIZE', 10))
+OVERPASS_RETRIES = int(os.environ.get('OVERPASS_RETRIES', 2))
+OVERPASS_BACKOFF = float(os.environ.get('OVERPASS_BACKOFF', 0.5))
+OVERPASS_TIMEOUT = float(os.environ.get('OVERPASS_TIMEOUT', 10))
+
+# Hospital lookup cache (see hospital_cache.py)
+HOSPITAL_CACHE_PRECISION = int(os.environ.get('HOSPITAL_CACHE_PRECISION', 5))
+HOSPITAL_CACHE_TTL = float(os.environ.get('HOSPITAL_CACHE_TTL', 900))
+HOSPITAL_CACHE_STALE_TTL = float(os.environ.get('HOSPITAL_CACHE_STALE_TTL', 3600))
+HOSPITAL_CACHE_MAX_TILES = int(os.environ.get('HOSPITAL_CACHE_MAX_TILES', 512))
+HOSPITAL_CACHE_SWR = os.environ.get('HOSPITAL_CACHE_SWR', '1') != '0'
+
+# Offline facility index (see facility_index.py); Overpass is only a fallback when it is present
+FACILITY_INDEX_PATH = os.environ.get('FACILITY_INDEX_PATH', 'database/facilities.idx')
+OVERPASS_FALLBACK = os.environ.get('OVERPASS_FALLBACK', '1') != '0'
+
+# Drive-time ranking over a local road graph (see road_graph.py); 'distance' ranks by straight line
+HOSPITAL_RANKING = os.environ.get('HOSPITAL_RANKING', 'distance')
+ROAD_GRAPH_PATH = os.environ.get('ROAD_GRAPH_PATH', 'database/roads.graph')
+HOSPITAL_ETA_CANDIDATES = int(os.environ.get('HOSPITAL_ETA_CANDIDATES', 25))
+
+# Hospital search latency budget (see hospital_search.py)
+HOSPITAL_SEARCH_RADII = (5000, 10000)
+HOSPITAL_SEARCH_DEADLINE = float(os.environ.get('HOSPITAL_SEARCH_DEADLINE', 8))
+HOSPITAL_SEARCH_MAX_DEADLINE = 20
+HOSPITAL_SEARCH_HEDGE_DELAY = float(os.environ.get('HOSPITAL_SEARCH_HEDGE_DELAY', 1.0))
+
+overpass_client = OverpassClient(
+    OVERPASS_URL,
+    pool_size=OVERPASS_POOL_SIZE,
+    retries=OVERPASS_RETRIES,
+    backoff_factor=OVERPASS_BACKOFF,
+    timeout=OVERPASS_TIMEOUT
+)
+
+def fetch_medical_facilities(latitude: float, longitude: float, radius: int) -> FacilitySet:
     """
-    Find nearby hospitals using OpenStreetMap Overpass API (FREE - no API key needed)
-    Returns list of real hospital information
+    Fetch hospitals and clinics around a point from the OpenStreetMap Overpass API
+    (FREE - no API key needed) over the pooled client; concurrent identical
+    queries (e.g. cache misses on the same tile) share one upstream request.
+    Raises on network or decoding errors.
+    Returns the parsed facilities ({'name', 'lat', 'lon', 'tags'}) with coordinate arrays
     """
+    data = overpass_client.query(hospital_query(latitude, longitude, radius))
+    return FacilitySet.from_elements(data.get('elements', []))
+
+def hospital_query(latitude: float, longitude: float, radius: int) -> str:
+    """Overpass QL for hospitals and clinics around a point"""
+    # `out center` gives ways a real center point and avoids dumping every node
+    # of every building outline
+    return f"""
+    [out:json];
+    (
+      node["amenity"="hospital"](around:{radius},{latitude},{longitude});
+      way["amenity"="hospital"](around:{radius},{latitude},{longitude});
+      node["amenity"="clinic"](around:{radius},{latitude},{longitude});
+      way["amenity"="clinic"](around:{radius},{latitude},{longitude});
+    );
+    out center;
+    """
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in km"""
+    R = 6371  # Earth's radius in km
+    lat1, lon1, lat2, lon2 = radians(lat1), radians(lon1), radians(lat2), radians(lon2)
+    
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    
+    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1-a))
+    return R * c
+
+def build_hospital_entry(facility: Dict, distance: float, eta_seconds: Optional[float] = None) -> Dict:
+    """Format a raw facility as the hospital dict returned to the frontend"""
+    tags = facility['tags']
+    
+    # Build address
+    addr_parts = []
+    if tags.get('addr:street'):
+        if tags.get('addr:housenumber'):
+            addr_parts.append(f"{tags.get('addr:housenumber')} {tags.get('addr:street')}")
+        else:
+            addr_parts.append(tags.get('addr:street'))
+    if tags.get('addr:city'):
+        addr_parts.append(tags.get('addr:city'))
+    if tags.get('addr:postcode'):
+        addr_parts.append(tags.get('addr:postcode'))
+    
+    address = ', '.join(addr_parts) if addr_parts else 'Address not available'
+    
+    # Get opening hours
+    opening_hours = tags.get('opening_hours', '24/7' if tags.get('emergency') == 'yes' else 'Unknown')
+    
+    # Determine if open now (simple check)
+    is_open = None
+    if opening_hours == '24/7' or opening_hours == 'Mo-Su 00:00-24:00':
+        is_open = True
+    elif opening_hours == 'Unknown':
+        is_open = None
+    else:
+        # For other formats, assume open during daytime
+        current_hour = datetime.now().hour
+        is_open = 8 <= current_hour < 20  # Simple heuristic
+    
+    entry = {
+        'name': facility['name'],
+        'address': address,
+        'phone': tags.get('phone', tags.get('contact:phone', 'Call for info')),
+        'rating': None,  # OSM doesn't have ratings
+        'distance': f"{distance:.1f} km",
+        'distance_km': round(distance, 3),
+        'lat': facility['lat'],
+        'lon': facility['lon'],
+        'amenity': tags.get('amenity', 'hospital'),
+        'emergency': tags.get('emergency', 'unknown'),
+        'opening_hours': opening_hours,
+        'is_open': is_open
+    }
+    if road_graph is not None:
+        # Drive time when ranking by travel time; None when the road graph can't reach it
+        entry['eta'] = None if eta_seconds is None else f"{max(1, round(eta_seconds / 60))} min"
+        entry['eta_minutes'] = None if eta_seconds is None else round(eta_seconds / 60, 1)
+    return entry
+
+def rank_hospitals(facilities: Sequence[Dict], latitude: float, longitude: float,
+                   radius: int, limit: int = 5) -> List[Dict]:
+    """Closest (or, with a road graph, quickest to reach) facilities within `radius` metres of the caller"""
+    if not isinstance(facilities, FacilitySet):
+        facilities = FacilitySet(facilities)
+    
+    with timed('distance'):
+        nearest = facilities.nearest(latitude, longitude, radius, k=candidate_count(limit))
+    return rank_by_travel_time(nearest, latitude, longitude, limit)
+
+def candidate_count(limit: int) -> int:
+    """Facilities to take by straight-line distance before ranking them by drive time"""
+    return max(limit, HOSPITAL_ETA_CANDIDATES) if road_graph is not None else limit
+
+def rank_by_travel_time(nearest: Sequence[Tuple[float, Dict]], latitude: float, longitude: float,
+                        limit: int = 5) -> List[Dict]:
+    """
+    Hospital entries for (distance, facility) candidates, the quickest to drive to
+    first when a road graph is loaded; unreachable ones keep distance order at the end
+    """
+    if road_graph is None:
+        return [build_hospital_entry(facility, distance) for distance, facility in nearest[:limit]]
+    
+    with timed('travel_time'):
+        etas = road_graph.travel_times(latitude, longitude, [(f['lat'], f['lon']) for _, f in nearest])
+    ranked = sorted(zip(etas, nearest), key=lambda item: (item[0] is None, item[0] or 0))
+    return [build_hospital_entry(facility, distance, eta) for eta, (distance, facility) in ranked[:limit]]
+
+hospital_cache = HospitalTileCache(
+    fetch_medical_facilities,
+    precision=HOSPITAL_CACHE_PRECISION,
+    ttl=HOSPITAL_CACHE_TTL,
+    max_tiles=HOSPITAL_CACHE_MAX_TILES,
+    stale_while_revalidate=HOSPITAL_CACHE_SWR,
+    stale_ttl=HOSPITAL_CACHE_STALE_TTL
+)
+
+def load_facility_index(path: str = FACILITY_INDEX_PATH):
+    """Load the offline facility index if one has been imported"""
+    if not os.path.exists(path):
+        return None
     try:
-        # Use Overpass API to find hospitals near the location
-        # This is completely free and doesn't require any API key
-        overpass_url = "https://overpass-api.de/api/interpreter"
-        
-        # Search radius in meters
-        radius_km = radius / 1000
-        
-        # Overpass QL query to find hospitals
-        query = f"""
-        [out:json];
-        (
-          node["amenity"="hospital"](around:{radius},{latitude},{longitude});
-          way["amenity"="hospital"](around:{radius},{latitude},{longitude});
-          node["amenity"="clinic"](around:{radius},{latitude},{longitude});
-          way["amenity"="clinic"](around:{radius},{latitude},{longitude});
-        );
-        out body;
-        >;
-        out skel qt;
-        """
-        
-        response = requests.post(overpass_url, data={'data': query}, timeout=10)
-        data = response.json()
-        
-        hospitals = []
-        seen_names = set()  # Avoid duplicates
-        
-        for element in data.get('elements', []):
-            if element.get('type') in ['node', 'way']:
-                tags = element.get('tags', {})
-                name = tags.get('name', tags.get('operator', 'Unnamed Medical Facility'))
-                
-                # Skip duplicates
-                if name in seen_names:
-                    continue
-                seen_names.add(name)
-                
-                # Get coordinates
-                if element.get('type') == 'node':
-                    lat = element.get('lat')
-                    lon = element.get('lon')
-                elif element.get('type') == 'way':
-                    # For ways, we need to calculate center (use first node for simplicity)
-                    lat = element.get('center', {}).get('lat') or element.get('lat')
-                    lon = element.get('center', {}).get('lon') or element.get('lon')
-                else:
-                    continue
-                
-                if not lat or not lon:
-                    continue
-                
-                # Calculate distance
-                from math import radians, sin, cos, sqrt, atan2
-                
-                R = 6371  # Earth's radius in km
-                lat1, lon1 = radians(latitude), radians(longitude)
-                lat2, lon2 = radians(lat), radians(lon)
-                
-                dlat = lat2 - lat1
-                dlon = lon2 - lon1
-                
-                a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-                c = 2 * atan2(sqrt(a), sqrt(1-a))
-                distance = R * c
-                
-                # Build address
-                addr_parts = []
-                if tags.get('addr:street'):
-                    if tags.get('addr:housenumber'):
-                        addr_parts.append(f"{tags.get('addr:housenumber')} {tags.get('addr:street')}")
-                    else:
-                        addr_parts.append(tags.get('addr:street'))
-                if tags.get('addr:city'):
-                    addr_parts.append(tags.get('addr:city'))
-                if tags.get('addr:postcode'):
-                    addr_parts.append(tags.get('addr:postcode'))
-                
-                address = ', '.join(addr_parts) if addr_parts else 'Address not available'
-                
-                # Get opening hours
-                opening_hours = tags.get('opening_hours', '24/7' if tags.get('emergency') == 'yes' else 'Unknown')
-                
-                # Determine if open now (simple check)
-                from datetime import datetime
-                now = datetime.now()
-                is_open = None
-                if opening_hours == '24/7' or opening_hours == 'Mo-Su 00:00-24:00':
-                    is_open = True
-                elif opening_hours == 'Unknown':
-                    is_open = None
-                else:
-                    # For other formats, assume open during daytime
-                    current_hour = now.hour
-                    is_open = 8 <= current_hour < 20  # Simple heuristic
-                
-                hospital = {
-                    'name': name,
-                    'address': address,
-                    'phone': tags.get('phone', tags.get('contact:phone', 'Call for info')),
-                    'rating': None,  # OSM doesn't have ratings
-                    'distance': f"{distance:.1f} km",
-                    'lat': lat,
-                    'lon': lon,
-                    'amenity': tags.get('amenity', 'hospital'),
-                    'emergency': tags.get('emergency', 'unknown'),
-                    'opening_hours': opening_hours,
-                    'is_open': is_open
-                }
-                
-                hospitals.append(hospital)
-                
-                # Limit to 10 closest hospitals
-                if len(hospitals) >= 10:
-                    break
-        
-        # Sort by distance (extract number from distance string)
-        hospitals.sort(key=lambda x: float(x['distance'].split()[0]))
-        
-        # If no hospitals found nearby, try a larger radius
-        if not hospitals:
-            print(f"No hospitals found within {radius}m, trying 10km radius...")
-            return find_nearby_hospitals(latitude, longitude, radius=10000)
-        
-        return hospitals[:5]  # Return top 5 closest
+        return FacilityIndex.load(path)
+    except Exception as e:
+        print(f"Error loading facility index {path}: {e}")
+        count_error('facility_index_load')
+        return None
+
+facility_index = load_facility_index()
+
+def load_road_graph(path: str = ROAD_GRAPH_PATH):
+    """Load the road graph when hospitals are ranked by travel time"""
+    if HOSPITAL_RANKING != 'travel_time':
+        return None
+    if not os.path.exists(path):
+        print(f"HOSPITAL_RANKING=travel_time but {path} is missing; ranking by distance")
+        return None
+    try:
+        return RoadGraph.load(path)
+    except Exception as e:
+        print(f"Error loading road graph {path}: {e}")
+        count_error('road_graph_load')
+        return None
+
+road_graph = load_road_graph()
+
+hospital_search_executor = ThreadPoolExecutor(max_workers=OVERPASS_POOL_SIZE * 2,
+                                              thread_name_prefix='hospital-search')
+
+def lookup_hospitals(latitude: float, longitude: float, radius: int) -> List[Dict]:
+    """
+    Closest hospitals within one radius: the offline facility index first, then the
+    OpenStreetMap Overpass API (FREE - no API key needed) through the tile cache when
+    no index is loaded or it has nothing in range. Raises on upstream errors.
+    """
+    hospitals = index_hospitals(latitude, longitude, radius)
+    if hospitals is not None:
+        return hospitals
+    
+    facilities = hospital_cache.get(latitude, longitude, radius)
+    return rank_hospitals(facilities, latitude, longitude, radius)
+
+def index_hospitals(latitude: float, longitude: float, radius: int) -> Optional[List[Dict]]:
+    """Closest hospitals from the offline index, or None when Overpass should be asked"""
+    if facility_index is None:
+        return None
+    with timed('facility_index_lookup'):
+        nearest = facility_index.nearest(latitude, longitude, radius, k=candidate_count(5))
+    hospitals = rank_by_travel_time(nearest, latitude, longitude)
+    if hospitals or not OVERPASS_FALLBACK:
+        return hospitals
+    return None
+
+def search_nearby_hospitals(latitude: float, longitude: float, radius: int = 5000,
+                            deadline: float = HOSPITAL_SEARCH_DEADLINE) -> Tuple[List[Dict], Dict]:
+    """
+    Search expanding radii (e.g. 5 km, then 10 km) speculatively within a latency budget
+    Returns: (hospitals, search metadata) - a partial answer if the deadline expired
+    """
+    radii = search_radii(radius)
+    hospitals, search = asyncio.run(search_expanding_radii(
+        lookup_hospitals, latitude, longitude, radii, deadline,
+        executor=hospital_search_executor,
+        hedge_delay=HOSPITAL_SEARCH_HEDGE_DELAY
+    ))
+    record_search(radii, search)
+    return hospitals, search
+
+def search_radii(radius: int) -> List[int]:
+    return [radius] + [r for r in HOSPITAL_SEARCH_RADII if r > radius]
+
+def record_search(radii: List[int], search: Dict):
+    """Count searches answered from a wider radius or cut off by their deadline"""
+    if search['radius'] is not None and search['radius'] > radii[0]:
+        HOSPITAL_FALLBACKS.inc()
+    if search['timed_out']:
+        HOSPITAL_TIMEOUTS.inc()
+
+def request_number(data: Dict, field: str, default: float, low: float, high: float) -> float:
+    """A finite number in [low, high] from a JSON body; raises ValueError otherwise"""
+    value = data.get(field, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"'{field}' must be a number")
+    try:
+        number = float(value)
+    except ValueError:
+        number = None
+    if number is None or not isfinite(number):
+        raise ValueError(f"'{field}' must be a number")
+    if not low <= number <= high:
+        raise ValueError(f"'{field}' must be between {low:g} and {high:g}")
+    return number
+
+def hospital_search_request(data: Dict) -> Tuple[float, float, float]:
+    """
+    (latitude, longitude, deadline) from a /find_hospitals body
+    Raises ValueError (a 400) for a missing body or a bad coordinate or deadline
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object')
+    latitude = request_number(data, 'latitude', 0, -90, 90)
+    longitude = request_number(data, 'longitude', 0, -180, 180)
+    
+    # Overall latency budget in seconds; the best partial result is returned when it expires
+    deadline = request_number(data, 'deadline', HOSPITAL_SEARCH_DEADLINE, 0, float('inf'))
+    deadline = min(max(deadline, 0.5), HOSPITAL_SEARCH_MAX_DEADLINE)
+    return latitude, longitude, deadline
+
+def find_nearby_hospitals(latitude: float, longitude: float, radius: int = 5000,
+                          deadline: float = HOSPITAL_SEARCH_DEADLINE) -> List[Dict]:
+    """
+    Find nearby hospitals, widening the search to 10km if nothing is found
+    Returns list of real hospital information (top 5 closest)
+    """
+    try:
+        hospitals, _ = search_nearby_hospitals(latitude, longitude, radius, deadline)
+        return hospitals
     
     except Exception as e:
         print(f"Error fetching hospitals from OpenStreetMap: {e}")
+        count_error('find_hospitals')
         # Return empty list so frontend shows appropriate message
         return []
 
@@ -379,19 +753,35 @@ def index():
     """Main page"""
     return render_template('index.html')
 
-@app.route('/get_triage_questions', methods=['POST'])
+@app.route('/assets/<path:path>')
+def hashed_asset(path):
+    """A built asset in the best encoding the client accepts, cacheable forever"""
+    resolved = asset_pipeline.resolve(path, request.accept_encodings)
+    if resolved is None:
+        abort(404)
+    
+    filename, encoding, mimetype = resolved
+    response = send_file(filename, mimetype=mimetype, download_name=os.path.basename(path),
+                         etag=f"{path}-{encoding or 'identity'}", conditional=True, max_age=31536000)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/get_triage_questions', methods=['GET', 'POST'])
 def get_triage_questions():
-    """Get triage questions for a specific symptom"""
+    """Get triage questions for a specific symptom (GET ?symptom= is cacheable)"""
     try:
-        data = request.get_json()
-        symptom = data.get('symptom', 'other')
-        
-        questions = TRIAGE_QUESTIONS.get(symptom, TRIAGE_QUESTIONS['other'])
+        if request.method == 'GET':
+            symptom = request.args.get('symptom', 'other')
+        else:
+            symptom = request.get_json().get('symptom', 'other')
         
-        return jsonify({
-            'success': True,
-            'questions': questions
-        })
+        return cached_json(
+            triage_cache.questions_response(symptom),
+            f'public, max-age={TRIAGE_CACHE_MAX_AGE}'
+        )
     
     except Exception as e:
         return jsonify({
@@ -412,47 +802,15 @@ def classify_emergency():
         # Count YES answers (indicates more severe condition)
         yes_count = sum(1 for answer in answers if answer.get('answer') == 'yes')
         
-        # Determine severity
-        severity = 'stable'
-        instructions_key = 'stable'
-        
-        # Critical symptoms always emergency if ANY yes answer
-        critical_symptoms = ['chest_pain', 'breathing', 'unconscious', 'accident']
-        
-        if symptom in critical_symptoms:
-            if yes_count >= 1:
-                severity = 'emergency'
-                instructions_key = f"{symptom}_emergency"
-            else:
-                severity = 'warning'
-                instructions_key = f"{symptom}_warning" if f"{symptom}_warning" in EMERGENCY_INSTRUCTIONS else 'stable'
-        elif symptom == 'fever':
-            if yes_count >= 2:
-                severity = 'emergency'
-                instructions_key = 'fever_emergency'
-            elif yes_count >= 1:
-                severity = 'warning'
-                instructions_key = 'stable'
-        else:  # other
-            if yes_count >= 2:
-                severity = 'warning'
-            else:
-                severity = 'stable'
-        
-        # If person is unconscious (from caretaker mode), always emergency
-        if is_caretaker and caretaker_data.get('conscious') == 'no':
-            severity = 'emergency'
-            instructions_key = 'unconscious_emergency'
-        
-        # Get appropriate instructions
-        instructions = EMERGENCY_INSTRUCTIONS.get(instructions_key, EMERGENCY_INSTRUCTIONS['stable'])
+        # Severity and instructions come from the triage rule table (see rules/health_rules.json),
+        # pre-rendered per (symptom, yes-count); a caretaker reporting an unconscious person
+        # is always an emergency
+        unconscious = bool(is_caretaker) and caretaker_data.get('conscious') == 'no'
         
-        return jsonify({
-            'success': True,
-            'severity': severity,
-            'instructions': instructions,
-            'symptom': symptom
-        })
+        return cached_json(
+            triage_cache.classify_response(symptom, yes_count, unconscious),
+            f'public, max-age={TRIAGE_CACHE_MAX_AGE}'
+        )
     
     except Exception as e:
         return jsonify({
@@ -460,48 +818,115 @@ def classify_emergency():
             'error': str(e)
         }), 500
 
+@app.route('/triage_catalog')
+def triage_catalog():
+    """
+    Questions, instructions and triage tables in one payload for offline classification.
+    Revalidate with If-None-Match, or fetch /triage_catalog/<version> and cache it forever.
+    """
+    return cached_json(triage_cache.catalog, 'no-cache')
+
+@app.route('/triage_catalog/<version>')
+def triage_catalog_version(version):
+    """Immutable, versioned copy of the triage catalog"""
+    if version != triage_cache.version:
+        return jsonify({
+            'success': False,
+            'error': 'Unknown catalog version',
+            'version': triage_cache.version
+        }), 404
+    return cached_json(triage_cache.catalog, IMMUTABLE_CACHE_CONTROL)
+
 @app.route('/check_health', methods=['POST'])
 def check_health():
     """Process health check request"""
+    try:
+        data = request_json(request.get_data())
+        result, params = health_check_result(data)
+        
+        # Save to database
+        save_health_record(params)
+        
+        return jsonify(result)
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/check_health/batch', methods=['POST'])
+def check_health_batch():
+    """
+    Score many health records in one call (wards, wearable gateways).
+    Body: {"records": [{...}, ...]} or a bare list; all rows are saved in one transaction
+    (one per partition with HEALTH_PARTITIONS, answered with 207 when only some commit).
+    """
     try:
         data = request.get_json()
+        records = data.get('records', []) if isinstance(data, dict) else data
         
-        # Calculate health score
-        score, status = calculate_health_score(data)
+        if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+            raise ValueError('records must be a list of objects')
+        if len(records) > MAX_BATCH_RECORDS:
+            raise ValueError(f'At most {MAX_BATCH_RECORDS} records per batch')
         
-        # Generate advice
-        advice = get_health_advice(status, score)
+        scores, statuses = score_batch(records)
+        scores = scores.tolist()
+        rows = [record_params(record, status, score) for record, score, status in zip(records, scores, statuses)]
         
-        # Save to database
-        conn = sqlite3.connect('database/health_records.db')
-        cursor = conn.cursor()
+        # Trend penalties depend on arrival order, so they are folded in record by record;
+        # a patient's earlier records in this batch count before they are stored
+        trends = [None] * len(records)
+        earlier = defaultdict(list)
+        for i, record in enumerate(records):
+            patient_id = patient_key(record)
+            if patient_id is not None:
+                scores[i], statuses[i], trends[i] = apply_trend(record, scores[i], statuses[i], earlier[patient_id])
+                rows[i] = record_params(record, statuses[i], scores[i])
+                earlier[patient_id].append(record)
         
-        cursor.execute('''
-            INSERT INTO health_records 
-            (age, temperature, heart_rate, bp_sys, bp_dia, spo2, symptoms, status, score)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            data.get('age', 0),
-            data.get('temperature', 0),
-            data.get('heart_rate', 0),
-            data.get('bp_sys', 0),
-            data.get('bp_dia', 0),
-            data.get('spo2', 0),
-            data.get('symptoms', ''),
-            status,
-            score
-        ))
+        results = [
+            {'score': score, 'status': status, **({'trend': trend} if trend is not None else {})}
+            for score, status, trend in zip(scores, statuses, trends)
+        ]
         
-        conn.commit()
-        conn.close()
+        # Save to database. With partitions some rows may be written and others not;
+        # a patient's rows share a partition, so trends only ever counted stored rows.
+        # Failed rows are marked so that the client resends those alone.
+        failed = []
+        if rows:
+            try:
+                get_store().insert_records(rows)
+            except PartialInsertError as e:
+                failed = e.indices
+                for i in failed:
+                    results[i].update(stored=False, error=str(e.error))
         
-        return jsonify({
-            'success': True,
-            'score': score,
-            'status': status,
-            'advice': advice,
+        payload = {
+            'success': not failed,
+            'count': len(records),
+            'stored': len(records) - len(failed),
+            'results': results,
+            'advice': {status: get_health_advice(status, 0) for status in set(statuses)},
             'timestamp': datetime.now().isoformat()
-        })
+        }
+        if failed:
+            payload['error'] = f'{len(failed)} records were not stored; resend those marked "stored": false'
+            return jsonify(payload), 207
+        return jsonify(payload)
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     
     except Exception as e:
         return jsonify({
@@ -509,63 +934,271 @@ def check_health():
             'error': str(e)
         }), 500
 
+def ndjson_line(payload: Dict) -> bytes:
+    """Serialize one newline-delimited JSON result"""
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8') + b'\n'
+
+@app.route('/check_health/stream', methods=['POST'])
+def check_health_stream():
+    """
+    Streaming ingestion for bedside monitors: the (chunked) body is newline-delimited
+    JSON, one health record per line. Lines are parsed as they arrive with bounded
+    memory, and one result line is streamed back per record, followed by a summary.
+    When the database writer falls behind, reading pauses until the queue drains.
+    """
+    stream = request.stream
+    
+    def generate():
+        accepted = 0
+        rejected = 0
+        line_number = 0
+        
+        while True:
+            line = stream.readline(MAX_STREAM_LINE_BYTES + 1)
+            if not line:
+                break
+            line_number += 1
+            
+            if len(line) > MAX_STREAM_LINE_BYTES:
+                # Skip the rest of an oversized record without buffering it
+                while line and not line.endswith(b'\n'):
+                    line = stream.readline(MAX_STREAM_LINE_BYTES)
+                rejected += 1
+                yield ndjson_line({'line': line_number, 'success': False, 'error': 'Record too large'})
+                continue
+            
+            line = line.strip()
+            if not line:
+                continue
+            
+            try:
+                with timed('request_json_parse'):
+                    record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError('Each line must be a JSON object')
+                score, status = calculate_health_score(record)
+                record_params(record, status, score)
+                score, status, trend = apply_trend(record, score, status)
+                save_health_record(record_params(record, status, score), block=True)
+            except Exception as e:
+                rejected += 1
+                yield ndjson_line({'line': line_number, 'success': False, 'error': str(e)})
+                continue
+            
+            accepted += 1
+            result = {'line': line_number, 'success': True, 'score': score, 'status': status}
+            if 'id' in record:
+                result['id'] = record['id']
+            if trend is not None:
+                result['trend'] = trend
+            yield ndjson_line(result)
+        
+        yield ndjson_line({'done': True, 'accepted': accepted, 'rejected': rejected})
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/find_hospitals', methods=['POST'])
 def find_hospitals():
     """Find nearby hospitals"""
     try:
-        data = request.get_json()
-        latitude = data.get('latitude', 0)
-        longitude = data.get('longitude', 0)
-        
-        hospitals = find_nearby_hospitals(latitude, longitude)
+        latitude, longitude, deadline = hospital_search_request(request_json(request.get_data()))
+        hospitals, search = search_nearby_hospitals(latitude, longitude, deadline=deadline)
         
         return jsonify({
             'success': True,
-            'hospitals': hospitals
+            'hospitals': hospitals,
+            'partial': search['timed_out'],
+            'search': search
         })
     
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@app.route('/hospital_cache_stats')
+def hospital_cache_stats():
+    """Hit/miss counters of the hospital tile cache and the Overpass client"""
+    return jsonify({
+        'success': True,
+        'cache': hospital_cache.stats(),
+        'overpass': overpass_client.stats()
+    })
+
+@app.route('/write_queue_stats')
+def write_queue_stats():
+    """Queue depth and flush latency of the health record write-behind queue"""
+    return jsonify({
+        'success': True,
+        'mode': HEALTH_WRITE_MODE,
+        'queue': write_queue.stats()
+    })
+
+def component_metrics():
+    """Fold the components' own counters into /metrics"""
+    families = []
+    families += stats_families(
+        'hospital_cache', 'Hospital tile cache', hospital_cache.stats(),
+        counters=('hits', 'stale_hits', 'misses', 'refreshes', 'refresh_errors', 'evictions')
+    )
+    families += stats_families(
+        'overpass', 'Overpass client', overpass_client.stats(),
+        counters=('upstream_requests', 'coalesced_requests', 'errors')
+    )
+    families += stats_families(
+        'health_write_queue', 'Health record write-behind queue', write_queue.stats(),
+        counters=('enqueued', 'flushed_rows', 'batches', 'failed_rows')
+    )
+    families += stats_families('trends', 'Trend engine', {'patients': trend_engine.patients()})
+    if retention is not None:
+        families += stats_families(
+            'retention', 'Health record retention', retention.stats(),
+            counters=('runs', 'archived_rows', 'chunks', 'vacuumed_pages', 'skipped_runs', 'errors')
+        )
+    return families
+
+REGISTRY.register_collector(component_metrics)
+
+@app.route('/metrics')
+def metrics():
+    """All counters and latency histograms in Prometheus text format"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
 @app.route('/health_history')
 def health_history():
-    """Get health check history"""
+    """
+    Get health check history, newest first.
+    Query params: limit (max 100), cursor (from next_cursor), status (comma-separated),
+    patient, from / to (YYYY-MM-DD or ISO timestamp)
+    """
     try:
-        conn = sqlite3.connect('database/health_records.db')
-        cursor = conn.cursor()
+        history, next_cursor = get_store().history_page(**history_query(request.args))
         
-        cursor.execute('''
-            SELECT * FROM health_records 
-            ORDER BY date DESC 
-            LIMIT 10
-        ''')
-        
-        records = cursor.fetchall()
-        conn.close()
+        return jsonify({
+            'success': True,
+            'history': history,
+            'next_cursor': next_cursor
+        })
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/stats')
+def stats():
+    """
+    Status counts and score/vital mean, min and max per hour or day, from the rollup tables.
+    Query params: granularity (hour | day), from / to (YYYY-MM-DD or ISO timestamp, UTC),
+    status (comma-separated)
+    """
+    try:
+        result = get_store().rollup_stats(
+            granularity=request.args.get('granularity', 'hour'),
+            date_from=request.args.get('from'),
+            date_to=request.args.get('to'),
+            statuses=[s for s in request.args.get('status', '').split(',') if s]
+        )
         
-        # Convert to list of dictionaries
-        history = []
-        for record in records:
-            history.append({
-                'id': record[0],
-                'age': record[1],
-                'temperature': record[2],
-                'heart_rate': record[3],
-                'bp_sys': record[4],
-                'bp_dia': record[5],
-                'spo2': record[6],
-                'symptoms': record[7],
-                'status': record[8],
-                'score': record[9],
-                'date': record[10]
-            })
+        return jsonify({
+            'success': True,
+            **result
+        })
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/export')
+def export_records():
+    """
+    Stream health records, oldest first, as a file download.
+    Query params: format (csv | ndjson | parquet), from / to (YYYY-MM-DD or ISO timestamp, UTC),
+    status (comma-separated), patient, archive (1 to include archived records)
+    """
+    if not EXPORT_TOKEN:
+        return jsonify({
+            'success': False,
+            'error': 'Export is disabled'
+        }), 403
+    
+    supplied = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(supplied.encode('utf-8'), f'Bearer {EXPORT_TOKEN}'.encode('utf-8')):
+        return jsonify({
+            'success': False,
+            'error': 'Invalid export token'
+        }), 401
+    
+    try:
+        format_name = request.args.get('format', 'csv')
+        query = ExportQuery(
+            date_from=request.args.get('from'),
+            date_to=request.args.get('to'),
+            statuses=[s for s in request.args.get('status', '').split(',') if s],
+            patient_id=request.args.get('patient'),
+            include_archive=request.args.get('archive', '0') not in ('0', 'false', ''),
+            chunk_size=EXPORT_CHUNK_SIZE
+        )
+        encoder = encoder_for(format_name)
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    store = get_store()
+    
+    def generate():
+        try:
+            yield from export_stream(store, query, encoder, progress=EXPORTED_ROWS.labels(format_name).inc)
+        except Exception as e:
+            # Headers are already sent; the client sees a truncated file
+            count_error('export')
+            print(f"Error streaming export: {e}")
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype=encoder.mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{export_filename(encoder)}"'}
+    )
+
+@app.route('/trends/<patient_id>')
+def patient_trends(patient_id):
+    """Rolling mean, slope, EWMA and min/max of each vital for one patient"""
+    try:
+        report = trend_engine.report(patient_id)
+        if report is None:
+            return jsonify({
+                'success': False,
+                'error': 'No readings for this patient'
+            }), 404
         
         return jsonify({
             'success': True,
-            'history': history
+            **report
         })
     
     except Exception as e:
@@ -574,9 +1207,11 @@ def health_history():
             'error': str(e)
         }), 500
 
+# Create the database and apply migrations in every worker, not only under `python app.py`
+os.makedirs(os.path.dirname(get_store().path) or '.', exist_ok=True)
+init_db()
+if retention is not None:
+    retention.start(RETENTION_INTERVAL)
+
 if __name__ == '__main__':
-    # Create database directory if it doesn't exist
-    os.makedirs('database', exist_ok=True)
-    init_db()
-    
     app.run(debug=True, host='0.0.0.0', port=5000)
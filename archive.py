@@ -0,0 +1,189 @@
+"""
+Compressed archive of health records moved out of the hot table.
+
+Records are stored as gzip NDJSON, one file per UTC day:
+<root>/YYYY/MM/health_records-YYYY-MM-DD.ndjson.gz. Each archiving pass
+appends a new gzip member and fsyncs it before the rows are deleted from
+SQLite. If a pass is interrupted between the append and the delete, the next
+pass writes the same rows again, so readers de-duplicate by record id.
+`page()` answers the same keyset query as HealthStore.history_page (newest
+first by (date, id), with the same filters) by reading day files from the
+newest down.
+
+Readers keep the list of days, each day's statuses and patient ids, and the
+records of the last few days read in memory, so a history page neither walks
+the directory tree nor decompresses days it cannot match. Every append
+replaces a small `.updated` stamp file; readers in any process stat it and
+drop their caches when it changes.
+"""
+import gzip
+import json
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+DAY_FILE = re.compile(r'^health_records-(\d{4}-\d{2}-\d{2})\.ndjson\.gz$')
+STAMP_FILE = '.updated'
+
+
+class RecordArchive:
+    """Day-partitioned gzip NDJSON files under `root`"""
+
+    def __init__(self, root: str, cached_days: int = 8):
+        self.root = root
+        self.cached_days = cached_days
+        self._lock = threading.Lock()
+
+        self._cache_lock = threading.Lock()
+        self._stamp = None
+        self._days: Optional[List[str]] = None
+        self._summaries: Dict[str, Tuple[frozenset, frozenset]] = {}
+        self._records: 'OrderedDict[str, List[Dict]]' = OrderedDict()
+
+    def path_for(self, day: str) -> str:
+        return os.path.join(self.root, day[:4], day[5:7], f'health_records-{day}.ndjson.gz')
+
+    def append(self, day: str, records: Iterable[Dict]) -> int:
+        """Append records (all dated `day`) durably; returns the number written"""
+        path = self.path_for(day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        lines = [json.dumps(record, separators=(',', ':')) + '\n' for record in records]
+        with self._lock, open(path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='ab') as f:
+                f.write(''.join(lines).encode('utf-8'))
+            raw.flush()
+            os.fsync(raw.fileno())
+            self._touch()
+        return len(lines)
+
+    def _touch(self):
+        """Replace the stamp file so every reader's caches are dropped"""
+        temporary = os.path.join(self.root, f'{STAMP_FILE}.{uuid.uuid4().hex}')
+        with open(temporary, 'w', encoding='utf-8'):
+            pass
+        os.replace(temporary, os.path.join(self.root, STAMP_FILE))
+        with self._cache_lock:
+            self._stamp = None
+            self._days = None
+
+    def _fresh(self):
+        """Drop cached days, summaries and records when the archive changed (caller holds _cache_lock)"""
+        try:
+            info = os.stat(os.path.join(self.root, STAMP_FILE))
+            stamp = (info.st_ino, info.st_mtime_ns)
+        except FileNotFoundError:
+            stamp = 'none'
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self._days = None
+            self._summaries.clear()
+            self._records.clear()
+
+    def days(self) -> List[str]:
+        """Archived days, oldest first"""
+        with self._cache_lock:
+            self._fresh()
+            if self._days is None:
+                self._days = self._scan_days()
+            return list(self._days)
+
+    def _scan_days(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        days = []
+        for year in os.scandir(self.root):
+            if not year.is_dir():
+                continue
+            for month in os.scandir(year.path):
+                if not month.is_dir():
+                    continue
+                for entry in os.scandir(month.path):
+                    match = DAY_FILE.match(entry.name)
+                    if match:
+                        days.append(match.group(1))
+        return sorted(days)
+
+    def newest(self) -> Optional[str]:
+        """Latest 'YYYY-MM-DD HH:MM:SS' an archived record can have, or None when empty"""
+        days = self.days()
+        return f'{days[-1]} 23:59:59' if days else None
+
+    def read_day(self, day: str) -> List[Dict]:
+        """One day's records, de-duplicated by id, newest first"""
+        records = {}
+        with gzip.open(self.path_for(day), 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    records[record['id']] = record
+        return sorted(records.values(), key=lambda r: (r['date'], r['id']), reverse=True)
+
+    def _day(self, day: str) -> Tuple[List[Dict], Tuple[frozenset, frozenset]]:
+        """read_day() through the cache, plus the day's statuses and patient ids"""
+        with self._cache_lock:
+            records = self._records.get(day)
+            if records is not None:
+                self._records.move_to_end(day)
+                return records, self._summaries[day]
+            stamp = self._stamp
+
+        records = self.read_day(day)
+        summary = (frozenset(r.get('status') for r in records), frozenset(r.get('patient_id') for r in records))
+        with self._cache_lock:
+            if stamp == self._stamp:
+                self._summaries[day] = summary
+                self._records[day] = records
+                while len(self._records) > self.cached_days:
+                    self._records.popitem(last=False)
+        return records, summary
+
+    def _may_match(self, day: str, wanted: Optional[set], patient_id: Optional[str]) -> bool:
+        """False when the day's cached summary rules out every record (True when not known yet)"""
+        if wanted is None and not patient_id:
+            return True
+        with self._cache_lock:
+            summary = self._summaries.get(day)
+        if summary is None:
+            return True
+        statuses, patients = summary
+        return (wanted is None or not wanted.isdisjoint(statuses)) and (not patient_id or patient_id in patients)
+
+    def page(self, limit: int, before: Optional[Tuple[str, int]] = None,
+             statuses: Optional[Sequence[str]] = None,
+             date_from: Optional[str] = None,
+             date_to: Optional[str] = None,
+             patient_id: Optional[str] = None) -> List[Dict]:
+        """
+        Up to `limit` archived records, newest first, strictly after the keyset
+        position `before` = (date, id). Dates are normalized 'YYYY-MM-DD HH:MM:SS'.
+        """
+        wanted = set(statuses) if statuses else None
+        upper = min([v for v in (date_to, before[0] if before else None) if v], default=None)
+        records: List[Dict] = []
+        for day in reversed(self.days()):
+            if upper is not None and day > upper[:10]:
+                continue
+            if date_from is not None and day < date_from[:10]:
+                break
+            if not self._may_match(day, wanted, patient_id):
+                continue
+            records_of_day, _ = self._day(day)
+            for record in records_of_day:
+                key = (record['date'], record['id'])
+                if before is not None and key >= tuple(before):
+                    continue
+                if date_to is not None and record['date'] > date_to:
+                    continue
+                if date_from is not None and record['date'] < date_from:
+                    continue
+                if wanted is not None and record.get('status') not in wanted:
+                    continue
+                if patient_id and record.get('patient_id') != patient_id:
+                    continue
+                records.append(record)
+                if len(records) >= limit:
+                    return records
+        return records
@@ -0,0 +1,310 @@
+"""
+ASGI entry point for the async serving mode:
+
+    gunicorn -c gunicorn_asgi.conf.py asgi:app
+
+The routes that wait on I/O are served natively on the event loop:
+/find_hospitals awaits Overpass through `AsyncOverpassClient`, so a slow
+upstream parks a coroutine instead of a whole worker, and ranks the results
+(distances, road-graph drive times) on a small thread pool. /check_health and
+/health_history reach SQLite through `AsyncHealthStore`'s small thread pool.
+Every other route (triage, batch/stream ingestion, stats, /metrics, the UI)
+is handed to the Flask app through a2wsgi's thread pool unchanged. Both paths
+share app.py's caches, write-behind queue, trend engine and metrics, and the
+native handlers produce the same JSON bodies as their Flask counterparts.
+Admission control (admission.py) runs before either path, so a request
+queued for its priority class waits on the event loop and holds no thread.
+Critical Flask routes (triage, the UI) get their own a2wsgi thread pool, so
+long batch, stream, stats or export requests cannot take every thread.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Tuple
+from urllib.parse import parse_qsl
+
+from a2wsgi import WSGIMiddleware
+
+import app as wsgi
+from admission import SCOPE_KEY, Overloaded
+from facilities import FacilitySet
+from hospital_search import search_expanding_radii
+from metrics import count_error
+from overpass_client import AsyncOverpassClient
+from storage import AsyncHealthStore, get_store, patient_key
+
+# Threads for the routes still served by Flask (critical routes have their own),
+# for SQLite calls from async handlers, and for ranking hospitals off the event loop
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 10))
+ASGI_CRITICAL_THREADS = int(os.environ.get('ASGI_CRITICAL_THREADS', 4))
+ASGI_DB_THREADS = int(os.environ.get('ASGI_DB_THREADS', 4))
+ASGI_RANK_THREADS = int(os.environ.get('ASGI_RANK_THREADS', 2))
+
+# Concurrent upstream requests per worker; unlike a sync worker, one event loop
+# can have many Overpass lookups outstanding at once
+OVERPASS_ASYNC_POOL_SIZE = int(os.environ.get('OVERPASS_ASYNC_POOL_SIZE', 100))
+
+# (status, JSON payload)
+Result = Tuple[int, Dict]
+Handler = Callable[[Dict, bytes], Awaitable[Result]]
+
+overpass_client = AsyncOverpassClient(
+    wsgi.OVERPASS_URL,
+    pool_size=OVERPASS_ASYNC_POOL_SIZE,
+    retries=wsgi.OVERPASS_RETRIES,
+    backoff_factor=wsgi.OVERPASS_BACKOFF,
+    timeout=wsgi.OVERPASS_TIMEOUT
+)
+health_store = AsyncHealthStore(get_store(), max_workers=ASGI_DB_THREADS)
+# Distance ranking and road-graph sweeps are CPU work; they would stall every other request on the loop
+rank_executor = ThreadPoolExecutor(max_workers=ASGI_RANK_THREADS, thread_name_prefix='hospital-rank')
+
+
+class StreamInput:
+    """
+    wsgi.input with a working `readline(limit)`. a2wsgi's returns whatever is
+    buffered (b'' before the first chunk arrives, which reads as end of body)
+    when no newline is buffered yet.
+    """
+
+    def __init__(self, body):
+        self.body = body
+
+    def read(self, size: int = -1) -> bytes:
+        return self.body.read(size)
+
+    def readline(self, limit: int = -1) -> bytes:
+        if limit is None or limit < 0:
+            return self.body.readline()
+        parts = []
+        size = 0
+        while size < limit:
+            part = self.body.readline(limit - size)
+            if not part:
+                # Nothing buffered: wait for the next chunk (b'' at the end of the body)
+                part = self.body.read(1)
+                if not part:
+                    break
+            parts.append(part)
+            size += len(part)
+            if part.endswith(b'\n'):
+                break
+        return b''.join(parts)
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+
+def terminated_input(wsgi_app):
+    """
+    Let Flask read chunked uploads (no Content-Length) through a2wsgi.
+    a2wsgi's body stream ends where the ASGI server's framing does, but it never
+    sets `wsgi.input_terminated`, so Werkzeug would treat such a body as empty
+    and /check_health/stream would read nothing.
+    """
+    def application(environ, start_response):
+        if not environ.get('CONTENT_LENGTH'):
+            environ['wsgi.input_terminated'] = True
+        environ['wsgi.input'] = StreamInput(environ['wsgi.input'])
+        return wsgi_app(environ, start_response)
+    return application
+
+
+def json_body(payload: Dict) -> bytes:
+    """Serialize like Flask's jsonify (sorted keys, compact, trailing newline)"""
+    return (wsgi.app.json.dumps(payload, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+async def fetch_medical_facilities(latitude: float, longitude: float, radius: int) -> FacilitySet:
+    """app.fetch_medical_facilities over the async client"""
+    data = await overpass_client.query(wsgi.hospital_query(latitude, longitude, radius))
+    return FacilitySet.from_elements(data.get('elements', []))
+
+
+async def lookup_hospitals(latitude: float, longitude: float, radius: int) -> List[Dict]:
+    """app.lookup_hospitals with cache misses awaited on the event loop and ranking on rank_executor"""
+    loop = asyncio.get_running_loop()
+    if wsgi.facility_index is not None:
+        hospitals = await loop.run_in_executor(rank_executor, wsgi.index_hospitals, latitude, longitude, radius)
+        if hospitals is not None:
+            return hospitals
+
+    facilities = await wsgi.hospital_cache.get_async(latitude, longitude, radius, fetch_medical_facilities)
+    return await loop.run_in_executor(rank_executor, wsgi.rank_hospitals, facilities, latitude, longitude, radius)
+
+
+async def find_hospitals(scope: Dict, body: bytes) -> Result:
+    try:
+        latitude, longitude, deadline = wsgi.hospital_search_request(wsgi.request_json(body))
+        radii = wsgi.search_radii(5000)
+        hospitals, search = await search_expanding_radii(
+            lookup_hospitals, latitude, longitude, radii, deadline,
+            hedge_delay=wsgi.HOSPITAL_SEARCH_HEDGE_DELAY
+        )
+        wsgi.record_search(radii, search)
+        return 200, {
+            'success': True,
+            'hospitals': hospitals,
+            'partial': search['timed_out'],
+            'search': search
+        }
+    except ValueError as e:
+        return 400, {'success': False, 'error': str(e)}
+    except Exception as e:
+        return 500, {'success': False, 'error': str(e)}
+
+
+async def check_health(scope: Dict, body: bytes) -> Result:
+    try:
+        data = wsgi.request_json(body)
+        if wsgi.TRENDS_ENABLED and isinstance(data, dict) and patient_key(data) is not None:
+            # The patient's trend window is read from SQLite
+            result, params = await health_store.call(wsgi.health_check_result, data)
+        else:
+            result, params = wsgi.health_check_result(data)
+
+        if not wsgi.save_health_record(params, fallback=False):
+            await health_store.insert_record(params)
+        return 200, result
+    except ValueError as e:
+        return 400, {'success': False, 'error': str(e)}
+    except Exception as e:
+        return 500, {'success': False, 'error': str(e)}
+
+
+async def health_history(scope: Dict, body: bytes) -> Result:
+    # Like request.args.get: the first value of a repeated parameter wins
+    args = {}
+    for key, value in parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True):
+        args.setdefault(key, value)
+    try:
+        history, next_cursor = await health_store.history_page(**wsgi.history_query(args))
+        return 200, {'success': True, 'history': history, 'next_cursor': next_cursor}
+    except ValueError as e:
+        return 400, {'success': False, 'error': str(e)}
+    except Exception as e:
+        return 500, {'success': False, 'error': str(e)}
+
+
+ROUTES: Dict[Tuple[str, str], Handler] = {
+    ('POST', '/find_hospitals'): find_hospitals,
+    ('POST', '/check_health'): check_health,
+    ('GET', '/health_history'): health_history,
+}
+
+
+async def send_json(send, status: int, payload: Dict, headers: List[Tuple[bytes, bytes]] = ()):
+    body = json_body(payload)
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('latin-1')),
+            *headers
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            break
+    return b''.join(chunks)
+
+
+class HealthASGI:
+    """
+    Routes I/O-bound endpoints to async handlers and everything else to Flask;
+    critical-class Flask requests go to `critical_fallback` when given
+    """
+
+    def __init__(self, routes: Dict[Tuple[str, str], Handler], fallback, critical_fallback=None):
+        self.routes = routes
+        self.fallback = fallback
+        self.critical_fallback = critical_fallback or fallback
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+
+        if scope['type'] != 'http':
+            await self.fallback(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        admission = wsgi.route_priority(scope['method'], scope['path'])
+        if admission is None:
+            await self.dispatch(scope, receive, send, started)
+            return
+
+        # Queue here, before a Flask route takes one of a2wsgi's threads
+        priority, rule = admission
+        try:
+            await wsgi.admission.acquire_async(priority)
+        except Overloaded as e:
+            await send_json(send, 503, wsgi.overloaded_payload(e),
+                            [(b'retry-after', str(e.retry_after).encode('latin-1'))])
+            wsgi.REQUEST_SECONDS.labels(scope['method'], rule).observe(time.perf_counter() - started)
+            wsgi.REQUESTS.labels(scope['method'], rule, 503).inc()
+            return
+        try:
+            await self.dispatch({**scope, SCOPE_KEY: priority}, receive, send, started)
+        finally:
+            wsgi.admission.release(priority)
+
+    async def dispatch(self, scope, receive, send, started: float):
+        handler = self.routes.get((scope['method'], scope['path']))
+        if handler is None:
+            fallback = self.critical_fallback if scope.get(SCOPE_KEY) == 'critical' else self.fallback
+            await fallback(scope, receive, send)
+            return
+
+        status, payload = await handler(scope, await read_body(receive))
+        await send_json(send, status, payload)
+        wsgi.REQUEST_SECONDS.labels(scope['method'], scope['path']).observe(time.perf_counter() - started)
+        wsgi.REQUESTS.labels(scope['method'], scope['path'], status).inc()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                try:
+                    await overpass_client.aclose()
+                    health_store.close()
+                    rank_executor.shutdown(wait=False)
+                    wsgi.write_queue.stop()
+                    if wsgi.retention is not None:
+                        wsgi.retention.stop()
+                except Exception as e:
+                    count_error('asgi_shutdown')
+                    print(f"Error shutting down: {e}")
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def async_metrics():
+    """The async Overpass client's counters on /metrics"""
+    return wsgi.stats_families(
+        'overpass_async', 'Async Overpass client', overpass_client.stats(),
+        counters=('upstream_requests', 'coalesced_requests', 'errors')
+    )
+
+
+wsgi.REGISTRY.register_collector(async_metrics)
+
+app = HealthASGI(
+    ROUTES,
+    WSGIMiddleware(terminated_input(wsgi.app), workers=ASGI_WSGI_THREADS),
+    WSGIMiddleware(terminated_input(wsgi.app), workers=ASGI_CRITICAL_THREADS)
+)
@@ -0,0 +1,365 @@
+"""
+Static asset pipeline: minify, fingerprint, precompress.
+
+    python assets.py            # build static/dist and print the size report
+
+Each entry of ASSETS is minified (conservative comment/whitespace removal,
+no renaming). It is then written as `<name>.<sha256[:12]>.<ext>` next to
+`.gz` and, when the optional `brotli` package is installed, `.br` variants
+compressed at maximum level. `manifest.json` maps each logical name to its
+hashed file and records the source hash, so a startup build only rewrites
+assets whose source changed. Files are written atomically; workers starting
+at the same time may build concurrently. The app serves the hashed files
+from /assets/ with the best encoding the client accepts and
+`Cache-Control: immutable`, since a changed file gets a new URL.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+
+ASSETS = ('css/style.css', 'js/main.js')
+
+# Content-Encoding -> file suffix, most preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+MIMETYPES = {'.css': 'text/css', '.js': 'text/javascript'}  # send_file adds the charset
+
+
+# --- Minifiers ---------------------------------------------------------------
+
+def minify_css(source: str) -> str:
+    """Drop comments and insignificant whitespace; strings are kept verbatim"""
+    out: List[str] = []
+    i, n = 0, len(source)
+    pending_space = False
+    while i < n:
+        ch = source[i]
+        if ch == '/' and source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = n if end < 0 else end + 2
+            pending_space = True
+            continue
+        if ch in '"\'':
+            end = _string_end(source, i)
+            if pending_space and out and out[-1] not in '{};:,>(':
+                out.append(' ')
+            pending_space = False
+            out.append(source[i:end])
+            i = end
+            continue
+        if ch.isspace():
+            pending_space = True
+            i += 1
+            continue
+        if ch in '{};,>)':
+            if ch == '}' and out and out[-1] == ';':
+                out.pop()
+            out.append(ch)
+        else:
+            if pending_space and out and out[-1] not in '{};:,>(':
+                out.append(' ')
+            out.append(ch)
+        pending_space = False
+        i += 1
+    return ''.join(out).strip() + '\n'
+
+
+# Tokens after which a `/` starts a regex literal rather than a division
+_REGEX_PREFIX_CHARS = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_PREFIX_WORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete',
+                       'void', 'throw', 'yield', 'await', 'instanceof'}
+_PUNCTUATION = set('{}()[];,:=<>+-*/%&|!?~^.')
+# A newline after these can't end a statement, so it can go
+_JOINING = set('{([;,=:&|?+-*/%<>!')
+_WORD = re.compile(r'[A-Za-z0-9_$]+$')
+
+
+def _string_end(source: str, start: int) -> int:
+    """Index after the string literal starting at `start`"""
+    quote = source[start]
+    i = start + 1
+    while i < len(source):
+        if source[i] == '\\':
+            i += 2
+            continue
+        if source[i] == quote or (source[i] == '\n' and quote != '`'):
+            return i + 1
+        i += 1
+    return i
+
+
+def minify_js(source: str) -> str:
+    """
+    Remove comments, indentation, blank lines and spaces next to punctuation.
+    Newlines that could end a statement are kept, so automatic semicolon
+    insertion behaves exactly as in the source. Identifiers are not renamed.
+    """
+    out: List[str] = []
+    # Open template literals: brace depth of each `${ ... }` we are inside
+    template_depths: List[int] = []
+    depth = 0
+    i, n = 0, len(source)
+    space = newline = False
+
+    def last_significant() -> str:
+        return out[-1][-1] if out else ''
+
+    def emit(token: str):
+        nonlocal space, newline
+        prev = last_significant()
+        if newline and prev and prev not in _JOINING:
+            out.append('\n')
+        elif (space or newline) and prev and not (prev in _PUNCTUATION or token[0] in _PUNCTUATION):
+            out.append(' ')
+        elif (space or newline) and prev in '+-/' and token[0] == prev:
+            out.append(' ')  # a + +b, a - -b, a / /re/
+        out.append(token)
+        space = newline = False
+
+    def scan_template(start: int) -> int:
+        """Copy template text from `start` up to the closing backtick or a `${`"""
+        j = start
+        while j < n:
+            if source[j] == '\\':
+                j += 2
+                continue
+            if source[j] == '`':
+                template_depths.pop()
+                return j + 1
+            if source.startswith('${', j):
+                return j + 2
+            j += 1
+        return j
+
+    while i < n:
+        ch = source[i]
+        if ch == '/' and source.startswith('//', i):
+            end = source.find('\n', i)
+            i = n if end < 0 else end
+            continue
+        if ch == '/' and source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            comment = source[i:n if end < 0 else end + 2]
+            i = n if end < 0 else end + 2
+            if '\n' in comment:
+                newline = True
+            else:
+                space = True
+            continue
+        if ch == '\n':
+            newline = True
+            i += 1
+            continue
+        if ch.isspace():
+            space = True
+            i += 1
+            continue
+        if ch in '"\'':
+            end = _string_end(source, i)
+            emit(source[i:end])
+            i = end
+            continue
+        if ch == '`':
+            template_depths.append(depth)
+            end = scan_template(i + 1)
+            emit(source[i:end])
+            i = end
+            continue
+        if ch == '}' and template_depths and template_depths[-1] == depth:
+            # End of a `${ ... }` expression: back into the template text
+            end = scan_template(i + 1)
+            emit(source[i:end])
+            i = end
+            continue
+        if ch == '/':
+            prev = last_significant()
+            word = _WORD.search(''.join(out[-3:])) if out else None
+            if not prev or prev in _REGEX_PREFIX_CHARS or (word and word.group(0) in _REGEX_PREFIX_WORDS):
+                end = _regex_end(source, i)
+                emit(source[i:end])
+                i = end
+                continue
+        if ch in '{(':
+            depth += 1
+        elif ch in '})':
+            depth -= 1
+        if _WORD.match(ch):
+            end = i
+            while end < n and _WORD.match(source[end]):
+                end += 1
+            emit(source[i:end])
+            i = end
+            continue
+        emit(ch)
+        i += 1
+    return ''.join(out).strip() + '\n'
+
+
+def _regex_end(source: str, start: int) -> int:
+    """Index after the regex literal (and its flags) starting at `start`"""
+    i, in_class = start + 1, False
+    while i < len(source):
+        ch = source[i]
+        if ch == '\\':
+            i += 2
+            continue
+        if ch == '[':
+            in_class = True
+        elif ch == ']':
+            in_class = False
+        elif ch == '/' and not in_class:
+            i += 1
+            while i < len(source) and source[i].isalpha():
+                i += 1
+            return i
+        elif ch == '\n':
+            return i
+        i += 1
+    return i
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+# --- Build -------------------------------------------------------------------
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def compress(data: bytes) -> Dict[str, bytes]:
+    """Precompressed variants by Content-Encoding"""
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    return variants
+
+
+class AssetPipeline:
+    """Builds the hashed/precompressed assets and resolves them for serving"""
+
+    def __init__(self, static_dir: str = STATIC_DIR, dist_dir: str = DIST_DIR, assets=ASSETS):
+        self.static_dir = static_dir
+        self.dist_dir = dist_dir
+        self.assets = tuple(assets)
+        self.manifest: Dict[str, Dict] = {}
+        self._files: Dict[str, str] = {}  # hashed path -> logical name
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.dist_dir, 'manifest.json')
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                return json.load(f).get('assets', {})
+        except (OSError, ValueError):
+            return {}
+
+    def build(self, force: bool = False) -> Dict[str, Dict]:
+        """Build changed assets (all with force=True) and write the manifest"""
+        previous = {} if force else self._load_manifest()
+        manifest = {}
+        for name in self.assets:
+            with open(os.path.join(self.static_dir, name), 'rb') as f:
+                source = f.read()
+            source_hash = hashlib.sha256(source).hexdigest()
+            entry = previous.get(name)
+            if entry and entry.get('source_sha256') == source_hash and self._complete(entry):
+                manifest[name] = entry
+                continue
+            manifest[name] = self._build_one(name, source, source_hash)
+
+        if manifest != previous:
+            _write_atomic(self.manifest_path,
+                          json.dumps({'version': 1, 'assets': manifest}, indent=2, sort_keys=True).encode('utf-8'))
+        self._use(manifest)
+        return manifest
+
+    def load(self) -> Dict[str, Dict]:
+        """Use an existing manifest without building (assets missing from it aren't served)"""
+        manifest = {name: entry for name, entry in self._load_manifest().items() if self._complete(entry)}
+        self._use(manifest)
+        return manifest
+
+    def _build_one(self, name: str, source: bytes, source_hash: str) -> Dict:
+        stem, ext = os.path.splitext(name)
+        minified = MINIFIERS[ext](source.decode('utf-8')).encode('utf-8')
+        content_hash = hashlib.sha256(minified).hexdigest()[:12]
+        path = f'{stem}.{content_hash}{ext}'
+        _write_atomic(os.path.join(self.dist_dir, path), minified)
+        sizes = {'source': len(source), 'identity': len(minified)}
+        for encoding, data in compress(minified).items():
+            _write_atomic(os.path.join(self.dist_dir, path + dict(ENCODINGS)[encoding]), data)
+            sizes[encoding] = len(data)
+        return {'path': path, 'hash': content_hash, 'source_sha256': source_hash, 'bytes': sizes}
+
+    def _complete(self, entry: Dict) -> bool:
+        """All files of a manifest entry still exist (e.g. brotli installed since)"""
+        encodings = [e for e, _ in ENCODINGS if e != 'br' or brotli is not None]
+        return (os.path.exists(os.path.join(self.dist_dir, entry['path'])) and
+                all(e in entry['bytes'] and
+                    os.path.exists(os.path.join(self.dist_dir, entry['path'] + dict(ENCODINGS)[e]))
+                    for e in encodings))
+
+    def _use(self, manifest: Dict[str, Dict]):
+        self.manifest = manifest
+        self._files = {entry['path']: name for name, entry in manifest.items()}
+
+    def url_path(self, name: str) -> Optional[str]:
+        """Hashed path of a logical asset name, or None when it wasn't built"""
+        entry = self.manifest.get(name)
+        return entry['path'] if entry else None
+
+    def resolve(self, path: str, accept_encoding) -> Optional[Tuple[str, Optional[str], str]]:
+        """
+        File to send for a hashed path, given a werkzeug Accept-Encoding header object
+        Returns: (file path, Content-Encoding or None, mimetype), or None for unknown paths
+        """
+        name = self._files.get(path)
+        if name is None:
+            return None
+        entry = self.manifest[name]
+        mimetype = MIMETYPES.get(os.path.splitext(path)[1], 'application/octet-stream')
+        for encoding, suffix in ENCODINGS:
+            if encoding in entry['bytes'] and accept_encoding.quality(encoding) > 0:
+                return os.path.join(self.dist_dir, path + suffix), encoding, mimetype
+        return os.path.join(self.dist_dir, path), None, mimetype
+
+
+def main():
+    pipeline = AssetPipeline()
+    manifest = pipeline.build(force=True)
+    print(f"Built {len(manifest)} assets into {pipeline.dist_dir}"
+          f"{'' if brotli is not None else ' (brotli not installed: gzip only)'}")
+    for name, entry in manifest.items():
+        sizes = entry['bytes']
+        variants = '  '.join(f"{encoding} {sizes[encoding]:>7,}" for encoding in ('identity', 'gzip', 'br')
+                             if encoding in sizes)
+        print(f"  {name:<16} -> {entry['path']:<28} source {sizes['source']:>7,}  {variants}")
+
+
+if __name__ == '__main__':
+    main()
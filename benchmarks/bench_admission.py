@@ -0,0 +1,202 @@
+"""
+Life-critical routes under a flood of low-priority work, with and without
+admission control.
+
+    python benchmarks/bench_admission.py --flood 48 --duration 20
+
+Seeds a temporary database with --rows synthetic records, then runs the
+same load against the ASGI deployment (or --server sync, threaded gunicorn
+workers) with ADMISSION_ENABLED=0 and =1. --flood clients loop over
+/health_history, /stats and a one-day /export as fast as they can. After a
+503 they sleep for Retry-After, unless --ignore-retry-after is given. At the
+same time, --probes clients loop over /classify_emergency and a cached
+/find_hospitals. Reports latency and errors
+of the critical probes, how much low-priority work completed or was shed
+(with its Retry-After), and the per-class admission metrics.
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+import requests  # noqa: E402
+
+from bench_async_serving import search_points, start_server, stub_response, summarize  # noqa: E402
+from bench_export import populate  # noqa: E402
+from run_suite import free_port, start_app  # noqa: E402
+from stub_overpass import start_stub_server  # noqa: E402
+
+EXPORT_TOKEN = 'bench-admission'
+
+LOW_REQUESTS = [
+    ('GET', '/health_history?limit=100&status=Stable,Monitor', {}),
+    ('GET', '/stats?granularity=hour&from=2024-01-01&to=2024-01-07', {}),
+    ('GET', '/export?format=csv&from=2024-01-02&to=2024-01-02',
+     {'headers': {'Authorization': f'Bearer {EXPORT_TOKEN}'}}),
+]
+
+
+def flood(base_url: str, done: threading.Event, results: Dict, lock: threading.Lock, offset: int,
+          honor_retry_after: bool):
+    session = requests.Session()
+    for method, path, kwargs in itertools.islice(itertools.cycle(LOW_REQUESTS), offset, None):
+        if done.is_set():
+            return
+        start = time.perf_counter()
+        try:
+            response = session.request(method, base_url + path, timeout=60, **kwargs)
+            response.content
+            status = response.status_code
+            retry_after = response.headers.get('Retry-After')
+        except requests.RequestException:
+            status, retry_after = 'error', None
+        with lock:
+            if status == 200:
+                results['latencies'].append(time.perf_counter() - start)
+            results['status'][status] = results['status'].get(status, 0) + 1
+            if retry_after is not None:
+                results['retry_after'].add(retry_after)
+        if retry_after is not None and honor_retry_after:
+            session.close()  # the server drops idle keep-alive connections after 5 s
+            done.wait(float(retry_after))
+
+
+def probe(base_url: str, done: threading.Event, point: Dict, results: Dict, lock: threading.Lock):
+    session = requests.Session()
+    requests_ = itertools.cycle([
+        ('classify_emergency', '/classify_emergency', {'symptom': 'chest_pain', 'answers': [True, False, True]}),
+        ('find_hospitals', '/find_hospitals', point),
+    ])
+    for name, path, body in requests_:
+        if done.is_set():
+            return
+        start = time.perf_counter()
+        try:
+            ok = session.post(base_url + path, json=body, timeout=60).status_code == 200
+        except requests.RequestException:
+            ok = False
+        with lock:
+            results[name]['latencies'].append(time.perf_counter() - start)
+            results[name]['errors'] += not ok
+
+
+def admission_metrics(base_url: str) -> List[str]:
+    text = requests.get(base_url + '/metrics', timeout=10).text
+    return [line for line in text.splitlines()
+            if line.startswith(('admission_admitted_total', 'admission_rejected_total', 'admission_queued_total'))
+            and not line.endswith(' 0')]
+
+
+def run(enabled: bool, db_path: str, stub_url: str, point: Dict, args) -> Dict:
+    port = free_port()
+    tmp = tempfile.mkdtemp(prefix='health-admission-')
+    db_copy = os.path.join(tmp, 'bench.db')
+    shutil.copy(db_path, db_copy)
+    env = {
+        'HEALTH_DB_PATH': db_copy,
+        'HEALTH_ARCHIVE_DIR': os.path.join(tmp, 'archive'),
+        'OVERPASS_URL': stub_url,
+        'FACILITY_INDEX_PATH': os.path.join(tmp, 'missing.idx'),
+        'EXPORT_TOKEN': EXPORT_TOKEN,
+        'ADMISSION_ENABLED': '1' if enabled else '0',
+        'ASSET_BUILD_ON_START': '0'
+    }
+    if args.server == 'sync':
+        server = start_app(port, env, args.workers, args.threads)
+    else:
+        server = start_server(args.server, port, args.workers, env)
+    base_url = f'http://127.0.0.1:{port}'
+    lock = threading.Lock()
+    done = threading.Event()
+    low = {'latencies': [], 'status': {}, 'retry_after': set()}
+    critical = {name: {'latencies': [], 'errors': 0} for name in ('classify_emergency', 'find_hospitals')}
+    try:
+        requests.post(base_url + '/find_hospitals', json=point, timeout=60)  # fill the tile cache
+        threads = [threading.Thread(target=flood, args=(base_url, done, low, lock, i, not args.ignore_retry_after),
+                                    daemon=True)
+                   for i in range(args.flood)]
+        threads += [threading.Thread(target=probe, args=(base_url, done, point, critical, lock), daemon=True)
+                    for _ in range(args.probes)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        done.set()
+        for thread in threads:
+            thread.join(60)
+        wall = time.perf_counter() - started
+        metrics = admission_metrics(base_url) if enabled else []
+    finally:
+        server.terminate()
+        server.wait(10)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    return {
+        'admission': enabled,
+        'wall_s': round(wall, 2),
+        **{name: summarize(r['latencies'], r['errors'], wall) for name, r in critical.items()},
+        'low_priority': {
+            'completed': low['status'].get(200, 0),
+            'shed_503': low['status'].get(503, 0),
+            'other': {str(k): v for k, v in low['status'].items() if k not in (200, 503)},
+            'completed_per_s': round(low['status'].get(200, 0) / wall, 2),
+            'retry_after': sorted(low['retry_after'])
+        },
+        'metrics': metrics
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Admission control under a low-priority flood')
+    parser.add_argument('--rows', type=int, default=200000, help='Seeded health records (3 s apart from 2024-01-01)')
+    parser.add_argument('--flood', type=int, default=48, help='Clients looping over low-priority routes')
+    parser.add_argument('--probes', type=int, default=2, help='Clients looping over critical routes')
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--ignore-retry-after', action='store_true', help='Flood clients retry a 503 immediately')
+    parser.add_argument('--server', choices=('async', 'sync'), default='async')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=8, help='Threads per sync worker')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='health-admission-seed-')
+    db_path = os.path.join(tmp, 'seed.db')
+    populate(db_path, args.rows)
+    point = search_points(1)[0]
+    stub = start_stub_server(response=stub_response([point]))
+    results = []
+    try:
+        for enabled in (False, True):
+            result = run(enabled, db_path, stub.url, point, args)
+            results.append(result)
+            low = result['low_priority']
+            print(f"admission {'on' if enabled else 'off'} ({args.server}, {args.workers} worker, "
+                  f"{args.flood} flood clients, {args.probes} probes, {result['wall_s']}s)")
+            for name in ('classify_emergency', 'find_hospitals'):
+                r = result[name]
+                print(f"  {name:<20} {r['requests']:>6} req  p50 {r.get('p50_ms', 0):>8.1f}  "
+                      f"p99 {r.get('p99_ms', 0):>8.1f}  max {r.get('max_ms', 0):>8.1f} ms  errors {r['errors']}")
+            print(f"  {'low priority':<20} {low['completed']:>6} done ({low['completed_per_s']}/s)  "
+                  f"{low['shed_503']} shed (Retry-After {', '.join(low['retry_after']) or '-'})  other {low['other']}")
+            for line in result['metrics']:
+                print(f"    {line}")
+    finally:
+        stub.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Sync vs. async serving under a slow Overpass upstream.
+
+    python benchmarks/bench_async_serving.py --delay 2 --requests 40 --concurrency 40
+
+Starts the stub Overpass server with a fixed delay, then runs the same load
+against two deployments on temporary databases: the old `gunicorn app:app`
+(sync workers) and `gunicorn -c gunicorn_asgi.conf.py asgi:app` (uvicorn workers),
+with the same worker count. Each /find_hospitals request targets a different
+far-apart cache tile, so every one waits on the upstream. While they run, a
+probe sends /classify_emergency one after another to show whether fast routes
+still get served. Reports throughput and p50/p99 for both. Before the load,
+each deployment must accept a chunked /check_health/stream upload (no
+Content-Length) record for record.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import requests  # noqa: E402
+
+from run_suite import free_port, percentile  # noqa: E402
+from stub_overpass import start_stub_server, synthetic_response  # noqa: E402
+
+MODES = {
+    'sync': lambda port, workers: [sys.executable, '-m', 'gunicorn', '-w', str(workers),
+                                   '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app'],
+    'async': lambda port, workers: [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_asgi.conf.py',
+                                    '--log-level', 'warning', 'asgi:app'],
+}
+
+
+def search_points(count: int) -> List[Dict]:
+    """Points 0.5 degrees apart, so no two share a hospital cache tile"""
+    return [{'latitude': 10 + (i // 20) * 0.5, 'longitude': 70 + (i % 20) * 0.5} for i in range(count)]
+
+
+def stub_response(points: List[Dict]) -> Dict:
+    """One Overpass body with a few facilities next to every search point"""
+    elements = []
+    for i, point in enumerate(points):
+        nearby = synthetic_response((point['latitude'], point['longitude']), count=5, span=0.01, seed=i)
+        for element in nearby['elements']:
+            element['id'] = len(elements) + 1
+            element['tags']['name'] = f"Stub Facility {i}-{element['tags']['name'].split()[-1]}"
+            elements.append(element)
+    return {'elements': elements}
+
+
+def start_server(mode: str, port: int, workers: int, env: Dict) -> subprocess.Popen:
+    process = subprocess.Popen(MODES[mode](port, workers), cwd=ROOT,
+                               env={**os.environ, **env, 'PORT': str(port), 'WEB_CONCURRENCY': str(workers)})
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{mode} server exited during startup')
+        try:
+            requests.get(f'http://127.0.0.1:{port}/write_queue_stats', timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+def check_chunked_stream(base_url: str, records: int = 20):
+    """A chunked NDJSON upload must be read line by line, not treated as an empty body"""
+    def body():
+        for i in range(records):
+            yield (json.dumps({'id': i, 'age': 40, 'temperature': 36.8, 'heart_rate': 80, 'bp_sys': 120,
+                               'bp_dia': 80, 'spo2': 98}) + '\n').encode('utf-8')
+
+    response = requests.post(base_url + '/check_health/stream', data=body(), timeout=30,
+                             headers={'Content-Type': 'application/x-ndjson'})
+    lines = [json.loads(line) for line in response.text.splitlines() if line]
+    summary = lines[-1] if lines else {}
+    if response.status_code != 200 or summary.get('accepted') != records:
+        raise SystemExit(f'Chunked /check_health/stream upload lost records: {response.status_code} {summary}')
+
+
+def summarize(latencies: List[float], errors: int, wall: float) -> Dict:
+    if not latencies:
+        return {'requests': 0, 'errors': errors}
+    return {
+        'requests': len(latencies),
+        'req_per_s': round(len(latencies) / wall, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'max_ms': round(max(latencies) * 1000, 1),
+        'errors': errors
+    }
+
+
+def run_mode(mode: str, points: List[Dict], stub_url: str, args) -> Dict:
+    port = free_port()
+    tmp = tempfile.mkdtemp(prefix=f'health-{mode}-')
+    env = {
+        'HEALTH_DB_PATH': os.path.join(tmp, 'bench.db'),
+        'OVERPASS_URL': stub_url,
+        'FACILITY_INDEX_PATH': os.path.join(tmp, 'missing.idx')
+    }
+    server = start_server(mode, port, args.workers, env)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        check_chunked_stream(base_url)
+    except BaseException:
+        server.terminate()
+        server.wait(10)
+        raise
+
+    searches: List[float] = []
+    probes: List[float] = []
+    errors = {'searches': 0, 'probes': 0}
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def search(point):
+        start = time.perf_counter()
+        try:
+            response = requests.post(base_url + '/find_hospitals', json=point, timeout=args.timeout)
+            ok = response.status_code == 200 and response.json()['hospitals']
+        except requests.RequestException:
+            ok = False
+        with lock:
+            searches.append(time.perf_counter() - start)
+            errors['searches'] += not ok
+
+    def probe():
+        session = requests.Session()
+        while not done.is_set():
+            start = time.perf_counter()
+            try:
+                ok = session.post(base_url + '/classify_emergency', timeout=args.timeout,
+                                  json={'symptom': 'chest_pain', 'answers': [True, False, True]}).ok
+            except requests.RequestException:
+                ok = False
+            probes.append(time.perf_counter() - start)
+            errors['probes'] += not ok
+            time.sleep(args.probe_interval)
+
+    try:
+        prober = threading.Thread(target=probe, daemon=True)
+        started = time.perf_counter()
+        prober.start()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(search, points))
+        wall = time.perf_counter() - started
+        done.set()
+        prober.join()
+    finally:
+        server.terminate()
+        server.wait(10)
+
+    return {
+        'mode': mode,
+        'wall_s': round(wall, 2),
+        'find_hospitals': summarize(searches, errors['searches'], wall),
+        'classify_probe': summarize(probes, errors['probes'], wall)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync vs. async serving with a slow Overpass upstream')
+    parser.add_argument('--delay', type=float, default=2.0, help='Stub Overpass response delay (s)')
+    parser.add_argument('--requests', type=int, default=40, help='/find_hospitals requests, one tile each')
+    parser.add_argument('--concurrency', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers in both modes')
+    parser.add_argument('--probe-interval', type=float, default=0.1)
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=['sync', 'async'])
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    points = search_points(args.requests)
+    stub = start_stub_server(response=stub_response(points), delay=args.delay)
+    results = []
+    try:
+        for mode in args.modes:
+            result = run_mode(mode, points, stub.url, args)
+            results.append(result)
+            print(f"{mode} ({args.workers} workers, Overpass delay {args.delay}s, wall {result['wall_s']}s)")
+            for name in ('find_hospitals', 'classify_probe'):
+                r = result[name]
+                print(f"  {name:<16} {r['requests']:>5} req  {r.get('req_per_s', 0):>8.2f} req/s  "
+                      f"p50 {r.get('p50_ms', 0):>9.1f}  p99 {r.get('p99_ms', 0):>9.1f} ms  errors {r['errors']}")
+    finally:
+        stub.shutdown()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Batch scoring: equivalence with calculate_health_score and throughput.
+
+    python benchmarks/bench_batch_scoring.py --records 10000 --trials 200
+
+First generates random records biased towards every threshold boundary
+(plus missing fields and symptom keyword mixes) and checks that score_batch
+returns exactly the scalar (score, status) for each one, and that strings,
+nulls, bools and non-finite values are rejected by both; then times both.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rule_engine import get_engine  # noqa: E402
+from scoring import calculate_health_score, score_batch  # noqa: E402
+
+BOUNDARIES = {
+    'temperature': (35, 36, 36.5, 37.5, 38.5, 40),
+    'heart_rate': (40, 50, 55, 105, 120, 150),
+    'bp_sys': (80, 90, 95, 150, 160, 180),
+    'bp_dia': (50, 60, 65, 95, 100, 110),
+    'spo2': (90, 95, 97),
+    'age': (18, 65)
+}
+RANGES = {
+    'temperature': (30.0, 43.0),
+    'heart_rate': (20, 200),
+    'bp_sys': (60, 220),
+    'bp_dia': (30, 140),
+    'spo2': (70, 100),
+    'age': (0, 100)
+}
+# Values both paths must reject rather than score (None would become NaN in np.array)
+INVALID = [(field, value) for field in RANGES
+           for value in ('36.8', '', None, True, False, float('nan'), float('inf'), float('-inf'), 10 ** 400)]
+INVALID += [('symptoms', None), ('symptoms', 42), ('symptoms', ['chest pain'])]
+NOISE = ['', 'feeling ok', 'CHEST PAIN', 'mild', 'since morning', 'Severe', 'painful knee']
+
+
+def random_value(rng, field):
+    low, high = RANGES[field]
+    choice = rng.random()
+    if choice < 0.5:
+        edge = rng.choice(BOUNDARIES[field])
+        return edge + rng.choice((-1, -0.1, 0, 0, 0.1, 1))
+    if field == 'temperature':
+        return round(rng.uniform(low, high), 1)
+    return rng.randint(low, high)
+
+
+def random_record(rng, symptom_rate=0.9):
+    record = {}
+    for field in RANGES:
+        if rng.random() < 0.9:
+            record[field] = random_value(rng, field)
+    if rng.random() < symptom_rate:
+        words = rng.sample(get_engine().symptom_keywords + NOISE, rng.randint(0, 3))
+        record['symptoms'] = ' '.join(w.upper() if rng.random() < 0.2 else w for w in words)
+    return record
+
+
+def check_equivalence(rng, trials, batch_size):
+    checked = 0
+    for _ in range(trials):
+        records = [random_record(rng) for _ in range(batch_size)]
+        scores, statuses = score_batch(records)
+        for record, score, status in zip(records, scores.tolist(), statuses):
+            expected = calculate_health_score(record)
+            if (score, status) != expected:
+                raise AssertionError(f"Mismatch for {record}: batch={(score, status)} scalar={expected}")
+            checked += 1
+    return checked
+
+
+def check_rejections(rng, trials, batch_size):
+    """Values calculate_health_score rejects must fail score_batch, naming the record"""
+    for _ in range(trials):
+        records = [random_record(rng) for _ in range(batch_size)]
+        bad = rng.randrange(batch_size)
+        field, value = rng.choice(INVALID)
+        records[bad][field] = value
+        try:
+            calculate_health_score(records[bad])
+            raise AssertionError(f"calculate_health_score accepted {field}={value!r}")
+        except ValueError:
+            pass
+        try:
+            score_batch(records)
+            raise AssertionError(f"score_batch accepted {field}={value!r}")
+        except ValueError as e:
+            if not str(e).startswith(f"Record {bad}:"):
+                raise AssertionError(f"score_batch rejected the wrong record for {field}={value!r}: {e}")
+    return trials
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vectorized batch scoring benchmark')
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--trials', type=int, default=200, help='Random batches to check for equivalence')
+    parser.add_argument('--symptom-rate', type=float, default=0.1,
+                        help='Share of timed records with free-text symptoms (device feeds rarely have any)')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    checked = check_equivalence(rng, args.trials, 100)
+    print(f"Equivalence: {checked} random records identical to calculate_health_score")
+    rejected = check_rejections(rng, args.trials, 20)
+    print(f"Rejections: {rejected} batches with a string, null, bool or non-finite value fail like the scalar path")
+
+    records = [random_record(rng, args.symptom_rate) for _ in range(args.records)]
+    start = time.perf_counter()
+    for record in records:
+        calculate_health_score(record)
+    scalar = time.perf_counter() - start
+
+    start = time.perf_counter()
+    score_batch(records)
+    batch = time.perf_counter() - start
+
+    print(f"scalar loop: {args.records / scalar:>12,.0f} records/s")
+    print(f"score_batch: {args.records / batch:>12,.0f} records/s ({scalar / batch:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+Bulk export throughput and peak memory over tens of millions of synthetic rows.
+
+    python benchmarks/bench_export.py --rows 20000000 --max-heap-mb 200
+
+Fills a temporary database with a recursive-CTE INSERT ... SELECT, which is
+much faster than executemany at this size, then applies the migrations
+(indexes, rollup backfill). Each format is exported by running
+`python export.py` in its own process, writing to a temporary file. Two
+figures are sampled from /proc for each child. Peak heap is the most
+anonymous memory (RssAnon) seen, which includes pyarrow's buffers.
+Peak RSS (VmHWM) also counts the database pages that SQLite memory-maps (up
+to SQLITE_MMAP_SIZE) and shared libraries. Those are page cache the kernel
+can reclaim. wait4()'s ru_maxrss is used only where /proc is missing, because
+it carries over this process's own peak through fork and exec. The benchmark
+exits non-zero when an export's peak heap goes over --max-heap-mb. For
+comparison, a child loads the first --baseline-rows rows with fetchall() into
+dicts, the way /health_history builds a page. --db reuses an already
+generated database between runs.
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from storage import CREATE_HEALTH_RECORDS, HealthStore  # noqa: E402
+
+FORMATS = ('csv', 'ndjson', 'parquet')
+
+# Rows land every 3 s from 2024-01-01 (20M rows span ~2 years)
+POPULATE = '''
+WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i + 1 < ?)
+INSERT INTO health_records
+(age, temperature, heart_rate, bp_sys, bp_dia, spo2, symptoms, status, score, date)
+SELECT 1 + abs(random()) % 95, 35 + (abs(random()) % 61) / 10.0, 40 + abs(random()) % 120,
+       80 + abs(random()) % 100, 50 + abs(random()) % 60, 85 + abs(random()) % 16,
+       CASE i % 5 WHEN 0 THEN 'chest_pain,fever' WHEN 1 THEN 'breathing' ELSE '' END,
+       CASE WHEN i % 33 = 0 THEN 'Emergency' WHEN i % 6 = 0 THEN 'Monitor' ELSE 'Stable' END,
+       abs(random()) % 101, datetime(1704067200 + i * 3, 'unixepoch')
+FROM n
+'''
+
+BASELINE = '''
+import sqlite3, sys
+from storage import HISTORY_COLUMNS
+conn = sqlite3.connect(sys.argv[1])
+rows = conn.execute(f"SELECT {', '.join(HISTORY_COLUMNS)} FROM health_records ORDER BY date, id LIMIT ?",
+                    (int(sys.argv[2]),)).fetchall()
+history = [dict(zip(HISTORY_COLUMNS, row)) for row in rows]
+print(len(history))
+'''
+
+
+def populate(path: str, rows: int):
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute(CREATE_HEALTH_RECORDS)
+    conn.execute(POPULATE, (rows,))
+    conn.commit()
+    conn.close()
+    store = HealthStore(path)
+    store.init_schema()
+    # Leave no migration WAL behind; the first export would otherwise checkpoint it on close
+    store.connection().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+
+def row_count(path: str) -> int:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT count(*) FROM health_records').fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        conn.close()
+
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    """RssAnon and VmHWM of a running process from /proc (empty elsewhere)"""
+    usage = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(('RssAnon:', 'VmHWM:')):
+                    usage[line.split(':')[0]] = int(line.split()[1])
+    except OSError:
+        pass
+    return usage
+
+
+def run_child(command, env: Dict) -> Dict:
+    """Run a child to completion; wall time, peak heap and peak RSS in MB, sampled from /proc"""
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env={**os.environ, **env}, stdout=subprocess.DEVNULL)
+    peak = {'RssAnon': 0, 'VmHWM': 0}
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.05):
+            for key, kb in memory_kb(process.pid).items():
+                peak[key] = max(peak[key], kb)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    _, status, usage = os.wait4(process.pid, 0)
+    done.set()
+    sampler.join()
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(f'{command} exited with {process.returncode}')
+    max_rss_mb = (peak['VmHWM'] or usage.ru_maxrss) / 1024
+    return {'seconds': time.perf_counter() - start, 'max_rss_mb': max_rss_mb,
+            'max_heap_mb': peak['RssAnon'] / 1024 if peak['RssAnon'] else max_rss_mb}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Streaming export benchmark')
+    parser.add_argument('--rows', type=int, default=10000000)
+    parser.add_argument('--db', help='Database to (re)use; generated when it has fewer than --rows rows')
+    parser.add_argument('--formats', default=','.join(FORMATS))
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--max-heap-mb', type=float, default=200, help='Fail when a streamed export peaks above this')
+    parser.add_argument('--baseline-rows', type=int, default=1000000, help='Rows for the fetchall() comparison (0 skips)')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='health-export-')
+    path = args.db or os.path.join(tmp, 'health_records.db')
+    rows = row_count(path)
+    if rows < args.rows:
+        if rows:
+            raise SystemExit(f'{path} has {rows:,} rows, fewer than --rows; use a new --db')
+        start = time.perf_counter()
+        populate(path, args.rows)
+        rows = args.rows
+        print(f"Populated {rows:,} rows in {time.perf_counter() - start:.1f}s "
+              f"({os.path.getsize(path) / 1e9:.2f} GB)")
+
+    env = {'HEALTH_DB_PATH': path, 'HEALTH_ARCHIVE_DIR': os.path.join(tmp, 'archive')}
+    results = {}
+    for format_name in [f for f in args.formats.split(',') if f]:
+        output = os.path.join(tmp, f'export.{format_name}')
+        result = run_child([sys.executable, 'export.py', '--format', format_name, '--output', output,
+                            '--chunk-size', str(args.chunk_size)], env)
+        result.update(rows_per_second=rows / result['seconds'], output_mb=os.path.getsize(output) / 1e6)
+        os.remove(output)
+        results[format_name] = result
+        print(f"{format_name:<8} {rows:>12,} rows {result['seconds']:>8.1f}s {result['rows_per_second']:>10,.0f} rows/s "
+              f"{result['output_mb']:>9,.0f} MB out  peak heap {result['max_heap_mb']:>6.1f} MB  RSS {result['max_rss_mb']:>6.1f} MB")
+
+    if args.baseline_rows:
+        baseline = run_child([sys.executable, '-c', BASELINE, path, str(args.baseline_rows)], env)
+        results['fetchall_baseline'] = {'rows': args.baseline_rows, **baseline}
+        print(f"fetchall() of {args.baseline_rows:,} rows into dicts: peak heap {baseline['max_heap_mb']:.1f} MB "
+              f"(~{baseline['max_heap_mb'] * rows / args.baseline_rows / 1024:.1f} GB at {rows:,} rows)")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'rows': rows, 'chunk_size': args.chunk_size, 'results': results}, f, indent=2)
+
+    shutil.rmtree(tmp)
+    over = [name for name in args.formats.split(',') if name and results[name]['max_heap_mb'] > args.max_heap_mb]
+    if over:
+        raise SystemExit(f"Peak heap over {args.max_heap_mb} MB: {', '.join(over)}")
+
+
+if __name__ == '__main__':
+    main()
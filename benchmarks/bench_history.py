@@ -0,0 +1,118 @@
+"""
+/health_history query cost over a synthetic multi-million-row table.
+
+    python benchmarks/bench_history.py --rows 3000000
+
+Compares the original `SELECT * ... ORDER BY date DESC LIMIT 10` without
+indexes against the indexed keyset-paginated query (first page, a page deep
+in the history, a status filter and a date range), plus OFFSET pagination at
+the same depth for reference.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import CREATE_HEALTH_RECORDS, HealthStore  # noqa: E402
+
+STATUSES = ('Stable', 'Monitor', 'Emergency')
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def populate(path, rows, seed):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute(CREATE_HEALTH_RECORDS)
+
+    def generate():
+        for i in range(rows):
+            date = start + timedelta(seconds=i * 15 + rng.randint(0, 14))
+            yield (rng.randint(1, 95), round(rng.uniform(35, 41), 1), rng.randint(40, 160),
+                   rng.randint(80, 180), rng.randint(50, 110), rng.randint(85, 100), '',
+                   rng.choices(STATUSES, weights=(80, 17, 3))[0], rng.randint(0, 100),
+                   date.strftime('%Y-%m-%d %H:%M:%S'))
+
+    conn.executemany('''
+        INSERT INTO health_records
+        (age, temperature, heart_rate, bp_sys, bp_dia, spo2, symptoms, status, score, date)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', generate())
+    conn.commit()
+    conn.close()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {'p50_ms': round(percentile(samples, 50) * 1000, 3),
+            'p99_ms': round(percentile(samples, 99) * 1000, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='health_records history query benchmark')
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--depth', type=int, default=1000, help='Page number for deep pagination')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'health_records.db')
+        start = time.perf_counter()
+        populate(path, args.rows, args.seed)
+        print(f"Populated {args.rows} rows in {time.perf_counter() - start:.1f}s")
+
+        conn = sqlite3.connect(path)
+        results['original (no index)'] = timed(
+            lambda: conn.execute('SELECT * FROM health_records ORDER BY date DESC LIMIT 10').fetchall(),
+            max(3, args.repeat // 5))
+
+        start = time.perf_counter()
+        store = HealthStore(path)
+        store.init_schema()
+        print(f"Migrations (index build) took {time.perf_counter() - start:.1f}s")
+
+        results['keyset first page'] = timed(lambda: store.history_page(10), args.repeat)
+
+        cursor = None
+        for _ in range(args.depth):
+            _, cursor = store.history_page(10, cursor)
+        results[f'keyset page {args.depth}'] = timed(lambda: store.history_page(10, cursor), args.repeat)
+        results[f'offset page {args.depth}'] = timed(
+            lambda: store.connection().execute(
+                'SELECT * FROM health_records ORDER BY date DESC, id DESC LIMIT 10 OFFSET ?',
+                (args.depth * 10,)).fetchall(),
+            args.repeat)
+        results['status=Emergency'] = timed(lambda: store.history_page(10, statuses=['Emergency']), args.repeat)
+        results['date range (1 day)'] = timed(
+            lambda: store.history_page(10, date_from='2024-03-01', date_to='2024-03-01'), args.repeat)
+
+    for name, r in results.items():
+        print(f"{name:<24} p50={r['p50_ms']:>10.3f} ms  p99={r['p99_ms']:>10.3f} ms")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'rows': args.rows, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
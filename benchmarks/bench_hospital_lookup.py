@@ -0,0 +1,112 @@
+"""
+Nearest-hospital latency: offline facility index vs. live Overpass.
+
+    python benchmarks/bench_hospital_lookup.py --facilities 50000 --queries 5000
+    python benchmarks/bench_hospital_lookup.py --overpass 20   # also sample the live API
+
+The index path is measured on a synthetic city-sized facility set; the
+Overpass path issues real requests (uncached) so it needs network access.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from facility_index import FacilityIndex  # noqa: E402
+
+CITY_CENTER = (28.6139, 77.2090)  # New Delhi
+CITY_SPAN = 0.5  # degrees
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(name, samples):
+    return {
+        'path': name,
+        'samples': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 4),
+        'p99_ms': round(percentile(samples, 99) * 1000, 4),
+        'max_ms': round(max(samples) * 1000, 4)
+    }
+
+
+def random_point(rng):
+    return (CITY_CENTER[0] + rng.uniform(-CITY_SPAN, CITY_SPAN),
+            CITY_CENTER[1] + rng.uniform(-CITY_SPAN, CITY_SPAN))
+
+
+def bench_index(facility_count, queries, radius, seed):
+    rng = random.Random(seed)
+    facilities = []
+    for i in range(facility_count):
+        lat, lon = random_point(rng)
+        facilities.append({'name': f'Facility {i}', 'lat': lat, 'lon': lon,
+                           'tags': {'amenity': rng.choice(['hospital', 'clinic'])}})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'facilities.idx')
+        FacilityIndex.build(facilities).save(path)
+        index = FacilityIndex.load(path)
+
+    samples = []
+    for _ in range(queries):
+        lat, lon = random_point(rng)
+        start = time.perf_counter()
+        index.nearest(lat, lon, radius, k=5)
+        samples.append(time.perf_counter() - start)
+    return summarize(f'index ({facility_count} facilities)', samples)
+
+
+def bench_overpass(queries, radius, seed):
+    import app
+
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(queries):
+        lat, lon = random_point(rng)
+        start = time.perf_counter()
+        try:
+            facilities = app.fetch_medical_facilities(lat, lon, radius)
+        except Exception as e:
+            print(f"Overpass request failed: {e}")
+            continue
+        app.rank_hospitals(facilities, lat, lon, radius)
+        samples.append(time.perf_counter() - start)
+    return summarize('overpass', samples) if samples else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--facilities', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--radius', type=int, default=5000)
+    parser.add_argument('--overpass', type=int, default=0, help='Live Overpass samples (0 to skip)')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    results = [bench_index(args.facilities, args.queries, args.radius, args.seed)]
+    if args.overpass:
+        overpass = bench_overpass(args.overpass, args.radius, args.seed)
+        if overpass:
+            results.append(overpass)
+
+    for result in results:
+        print(f"{result['path']:<32} n={result['samples']:<6} "
+              f"p50={result['p50_ms']:.3f} ms  p99={result['p99_ms']:.3f} ms  max={result['max_ms']:.3f} ms")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
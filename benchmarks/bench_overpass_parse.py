@@ -0,0 +1,178 @@
+"""
+Overpass result pipeline: previous parse + per-element haversine + full sort
+vs. `out center` parsing, vectorized distances and nearest-k selection.
+
+    python benchmarks/bench_overpass_parse.py --facilities 5000 --way-share 0.6 --way-nodes 30
+
+Builds a large urban response in both shapes: the old `out body; >; out skel qt;`
+form (ways with node refs plus a dump of every outline node) and the
+`out center;` form. Each is timed from raw bytes to the top 5 hospitals. The
+new ranking is checked against a brute-force sort. (The old parser also
+dropped every way, because `out body` ways carry no coordinates.)
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+import sys
+import time
+from math import atan2, cos, radians, sin, sqrt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from facilities import FacilitySet  # noqa: E402
+
+CITY_CENTER = (28.6139, 77.2090)
+
+
+def urban_responses(count, way_share, way_nodes, span, seed):
+    """The same facilities as an old-style (body + skel) and an `out center` response"""
+    rng = random.Random(seed)
+    old_elements, skel, new_elements = [], [], []
+    node_id = 10 ** 9
+    for i in range(count):
+        lat = CITY_CENTER[0] + rng.uniform(-span, span)
+        lon = CITY_CENTER[1] + rng.uniform(-span, span)
+        tags = {'amenity': rng.choice(['hospital', 'clinic']), 'name': f'Facility {i}',
+                'addr:street': 'Ring Road', 'addr:city': 'New Delhi', 'emergency': rng.choice(['yes', 'no'])}
+        if rng.random() < way_share:
+            refs = []
+            for _ in range(way_nodes):
+                node_id += 1
+                refs.append(node_id)
+                skel.append({'type': 'node', 'id': node_id,
+                             'lat': lat + rng.uniform(-0.0005, 0.0005), 'lon': lon + rng.uniform(-0.0005, 0.0005)})
+            old_elements.append({'type': 'way', 'id': i, 'nodes': refs, 'tags': tags})
+            new_elements.append({'type': 'way', 'id': i, 'center': {'lat': lat, 'lon': lon},
+                                 'nodes': refs, 'tags': tags})
+        else:
+            node = {'type': 'node', 'id': i, 'lat': lat, 'lon': lon, 'tags': tags}
+            old_elements.append(node)
+            new_elements.append(node)
+    old = json.dumps({'elements': old_elements + skel}).encode('utf-8')
+    new = json.dumps({'elements': new_elements}).encode('utf-8')
+    return old, new
+
+
+def old_pipeline(body, latitude, longitude, radius, limit=5):
+    """The parse/rank code this pipeline replaces"""
+    data = json.loads(body)
+    facilities = []
+    seen_names = set()
+    for element in data.get('elements', []):
+        if element.get('type') in ['node', 'way']:
+            tags = element.get('tags', {})
+            name = tags.get('name', tags.get('operator', 'Unnamed Medical Facility'))
+            if name in seen_names:
+                continue
+            seen_names.add(name)
+            if element.get('type') == 'node':
+                lat, lon = element.get('lat'), element.get('lon')
+            else:
+                lat = element.get('center', {}).get('lat') or element.get('lat')
+                lon = element.get('center', {}).get('lon') or element.get('lon')
+            if not lat or not lon:
+                continue
+            facilities.append({'name': name, 'lat': lat, 'lon': lon, 'tags': tags})
+
+    candidates = []
+    for facility in facilities:
+        lat1, lon1, lat2, lon2 = radians(latitude), radians(longitude), radians(facility['lat']), radians(facility['lon'])
+        a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+        distance = 6371 * 2 * atan2(sqrt(a), sqrt(1 - a))
+        if distance <= radius / 1000:
+            candidates.append((distance, facility))
+    candidates.sort(key=lambda c: c[0])
+    return candidates[:limit]
+
+
+def new_pipeline(body, latitude, longitude, radius, limit=5):
+    return FacilitySet.from_elements(json.loads(body).get('elements', [])).nearest(latitude, longitude, radius, limit)
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Overpass parse + nearest-k benchmark')
+    parser.add_argument('--facilities', type=int, default=5000)
+    parser.add_argument('--way-share', type=float, default=0.6, help='Fraction of facilities mapped as buildings')
+    parser.add_argument('--way-nodes', type=int, default=30, help='Outline nodes per building')
+    parser.add_argument('--span', type=float, default=0.15, help='Degrees around the city center')
+    parser.add_argument('--radius', type=int, default=10000)
+    parser.add_argument('--queries', type=int, default=200, help='Ranking queries against a cached set')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    old_body, new_body = urban_responses(args.facilities, args.way_share, args.way_nodes, args.span, args.seed)
+    lat, lon = CITY_CENTER
+
+    # Correctness: true k nearest, ways included
+    facility_set = FacilitySet.from_elements(json.loads(new_body)['elements'])
+    rng = random.Random(args.seed)
+    for _ in range(200):
+        q_lat, q_lon = lat + rng.uniform(-args.span, args.span), lon + rng.uniform(-args.span, args.span)
+        expected = heapq.nsmallest(5, ((d, f['name']) for d, f in
+                                       zip(facility_set.distances_km(q_lat, q_lon), facility_set)
+                                       if d <= args.radius / 1000))
+        got = [(d, f['name']) for d, f in facility_set.nearest(q_lat, q_lon, args.radius, 5)]
+        assert [n for _, n in got] == [n for _, n in expected], (got, expected)
+    old_found = len(old_pipeline(old_body, lat, lon, args.radius, limit=10 ** 9))
+    print(f"Facilities in radius: old parser {old_found}, new parser "
+          f"{len(facility_set.nearest(lat, lon, args.radius, 10 ** 9))} (of {args.facilities})")
+
+    results = {
+        'facilities': args.facilities,
+        'old_response_bytes': len(old_body),
+        'new_response_bytes': len(new_body),
+        'old_fetch_parse_rank_ms': round(best_of(lambda: old_pipeline(old_body, lat, lon, args.radius),
+                                                 args.repeat) * 1000, 2),
+        'new_fetch_parse_rank_ms': round(best_of(lambda: new_pipeline(new_body, lat, lon, args.radius),
+                                                 args.repeat) * 1000, 2),
+    }
+
+    # Cache hits: only ranking runs per request
+    old_facilities = [{'name': f['name'], 'lat': f['lat'], 'lon': f['lon'], 'tags': f['tags']} for f in facility_set]
+    points = [(lat + rng.uniform(-args.span, args.span), lon + rng.uniform(-args.span, args.span))
+              for _ in range(args.queries)]
+
+    def old_rank():
+        for q_lat, q_lon in points:
+            candidates = []
+            for facility in old_facilities:
+                lat1, lon1 = radians(q_lat), radians(q_lon)
+                lat2, lon2 = radians(facility['lat']), radians(facility['lon'])
+                a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+                distance = 6371 * 2 * atan2(sqrt(a), sqrt(1 - a))
+                if distance <= args.radius / 1000:
+                    candidates.append((distance, facility))
+            candidates.sort(key=lambda c: c[0])
+
+    def new_rank():
+        for q_lat, q_lon in points:
+            facility_set.nearest(q_lat, q_lon, args.radius, 5)
+
+    results['old_rank_per_query_ms'] = round(best_of(old_rank, args.repeat) / args.queries * 1000, 3)
+    results['new_rank_per_query_ms'] = round(best_of(new_rank, args.repeat) / args.queries * 1000, 3)
+
+    for key, value in results.items():
+        print(f"  {key:<28} {value:>12,}")
+    print(f"  speedup (fetch path)         {results['old_fetch_parse_rank_ms'] / results['new_fetch_parse_rank_ms']:>12.1f}x")
+    print(f"  speedup (cached ranking)     {results['old_rank_per_query_ms'] / results['new_rank_per_query_ms']:>12.1f}x")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
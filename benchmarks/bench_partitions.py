@@ -0,0 +1,159 @@
+"""
+Ingest throughput of health_records as partitions and writer processes grow.
+
+    python benchmarks/bench_partitions.py --partitions 1,2,4,8 --workers 1,2,4,8
+
+For every (partitions, workers) pair, a fresh set of databases is created.
+--workers processes, one per gunicorn worker, insert records for --duration
+seconds through get_store(). Each request is one transaction of --batch rows
+(1 = HEALTH_WRITE_MODE=sync, ~200 = a write-behind flush), for --patients
+random patients. Reports committed rows/s, p50/p99 commit latency and how
+many inserts failed with `database is locked`. Then it times /health_history
+pages (first page, a status filter and one patient) as they fan out over the
+partitions. --synchronous FULL makes every commit wait for its fsync, which
+is where separate write locks help the most.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from storage import HealthStore, PartitionedHealthStore, record_params  # noqa: E402
+
+STATUSES = ('Stable', 'Stable', 'Stable', 'Monitor', 'Emergency')
+
+
+def open_store(path: str, partitions: int, synchronous: str):
+    if partitions > 1:
+        return PartitionedHealthStore(path, partitions, synchronous=synchronous)
+    return HealthStore(path, synchronous=synchronous)
+
+
+def writer(path: str, partitions: int, args, start_at: float, results):
+    store = open_store(path, partitions, args.synchronous)
+    rng = random.Random(os.getpid())
+    rows = errors = 0
+    latencies: List[float] = []
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = time.perf_counter() + args.duration
+    while time.perf_counter() < deadline:
+        batch = [record_params({'age': rng.randint(1, 95), 'heart_rate': rng.randint(40, 160),
+                                'spo2': rng.randint(85, 100), 'temperature': round(rng.uniform(35, 41), 1),
+                                'patient_id': f'patient-{rng.randrange(args.patients)}'},
+                               rng.choice(STATUSES), rng.randint(0, 100))
+                 for _ in range(args.batch)]
+        started = time.perf_counter()
+        try:
+            if args.batch == 1:
+                store.insert_record(batch[0])
+            else:
+                store.insert_records(batch)
+            rows += len(batch)
+            latencies.append(time.perf_counter() - started)
+        except sqlite3.OperationalError:
+            errors += 1
+    store.close()
+    results.put({'rows': rows, 'errors': errors, 'latencies': latencies})
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def ingest(partitions: int, workers: int, args) -> Dict:
+    tmp = tempfile.mkdtemp(prefix='health-partitions-')
+    path = os.path.join(tmp, 'health_records.db')
+    store = open_store(path, partitions, args.synchronous)
+    store.init_schema()
+    store.close()
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    start_at = time.time() + 0.5
+    processes = [context.Process(target=writer, args=(path, partitions, args, start_at, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    latencies = [latency for outcome in outcomes for latency in outcome['latencies']]
+    rows = sum(outcome['rows'] for outcome in outcomes)
+    result = {
+        'partitions': partitions,
+        'workers': workers,
+        'rows_per_s': round(rows / args.duration),
+        'commit_p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'commit_p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'locked_errors': sum(outcome['errors'] for outcome in outcomes)
+    }
+    result['history'] = history_latency(path, partitions, args)
+    shutil.rmtree(tmp, ignore_errors=True)
+    return result
+
+
+def history_latency(path: str, partitions: int, args) -> Dict:
+    """p50 ms of history pages on the databases just written"""
+    store = open_store(path, partitions, args.synchronous)
+    pages = {
+        'first_page': {'limit': 50},
+        'status_filter': {'limit': 50, 'statuses': ['Emergency']},
+        'one_patient': {'limit': 50, 'patient_id': 'patient-7'}
+    }
+    timings = {}
+    for name, kwargs in pages.items():
+        samples = []
+        for _ in range(args.history_samples):
+            started = time.perf_counter()
+            store.history_page(**kwargs)
+            samples.append(time.perf_counter() - started)
+        timings[name] = round(percentile(samples, 50) * 1000, 2)
+    store.close()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Partitioned health_records ingest benchmark')
+    parser.add_argument('--partitions', default='1,2,4,8')
+    parser.add_argument('--workers', default='1,2,4,8')
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--batch', type=int, default=1, help='Rows per transaction')
+    parser.add_argument('--patients', type=int, default=10000)
+    parser.add_argument('--synchronous', default='NORMAL', choices=('OFF', 'NORMAL', 'FULL'))
+    parser.add_argument('--history-samples', type=int, default=50)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    print(f"{args.batch} row(s) per transaction, synchronous={args.synchronous}, {os.cpu_count()} CPU(s)")
+    results = []
+    for partitions in [int(p) for p in args.partitions.split(',') if p]:
+        for workers in [int(w) for w in args.workers.split(',') if w]:
+            result = ingest(partitions, workers, args)
+            results.append(result)
+            history = result['history']
+            print(f"{partitions:>2} partitions {workers:>2} workers  {result['rows_per_s']:>8,} rows/s  "
+                  f"commit p50 {result['commit_p50_ms']:>7.2f} p99 {result['commit_p99_ms']:>8.2f} ms  "
+                  f"locked {result['locked_errors']:>3}  |  history p50 {history['first_page']:.2f} / "
+                  f"{history['status_filter']:.2f} / {history['one_patient']:.2f} ms")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'batch': args.batch, 'synchronous': args.synchronous, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+Drive-time query latency of road_graph.py on a city-sized synthetic network.
+
+    python benchmarks/bench_road_graph.py --size 550 --candidates 10,25,50
+
+Generates a --size x --size street grid (blocks of --block-m metres,
+~300k nodes at 550). Residential streets are 25 km/h, with some one-way.
+Every 8th street is a 50 km/h arterial, and two 90 km/h expressways cross
+the city, reachable only where they meet an arterial. A river runs across
+the middle with a bridge every 24 streets. The graph is contracted, saved
+and loaded back, and its ETAs are checked against a plain Dijkstra over the
+original edges. Then, for --queries random callers, the nearest N of
+--hospitals random facilities (by straight line, as /find_hospitals picks
+candidates) are timed with one `travel_times` call. That is compared with
+a Dijkstra that stops once all N are settled, and it reports how often the
+closest hospital by drive time is not the closest by distance. --graph
+reuses a saved graph between runs.
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from math import cos, radians
+from typing import Dict, List, Sequence, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from road_graph import RoadGraph, _flat_km  # noqa: E402
+
+ORIGIN = (28.50, 77.05)
+METRES_PER_DEGREE = 111320
+
+
+def synthetic_city(size: int, block_m: float, seed: int) -> Tuple[List[float], List[float], List[Tuple[int, int, float]]]:
+    """(latitudes, longitudes, timed edges) of a grid city with arterials, expressways and a river"""
+    rng = random.Random(seed)
+    lat_step = block_m / METRES_PER_DEGREE
+    lon_step = block_m / (METRES_PER_DEGREE * cos(radians(ORIGIN[0])))
+    latitudes, longitudes = [], []
+    for row in range(size):
+        for col in range(size):
+            # A little jitter so that snapping and straight-line ranking aren't grid-aligned
+            latitudes.append(ORIGIN[0] + (row + rng.uniform(-0.15, 0.15)) * lat_step)
+            longitudes.append(ORIGIN[1] + (col + rng.uniform(-0.15, 0.15)) * lon_step)
+
+    river = size // 2
+    expressways = (size // 3, 2 * size // 3)
+    edges = []
+
+    def connect(a: int, b: int, kmh: float, oneway: int = 0):
+        seconds = _flat_km(latitudes[a], longitudes[a], latitudes[b], longitudes[b]) / kmh * 3600
+        if oneway >= 0:
+            edges.append((a, b, seconds))
+        if oneway <= 0:
+            edges.append((b, a, seconds))
+
+    def street_speed(line: int) -> float:
+        return 50 if line % 8 == 0 else 25
+
+    for row in range(size):
+        # Eastbound/westbound streets; every 8th is an arterial, some residential ones are one-way
+        speed = street_speed(row)
+        oneway = 0 if speed > 25 or rng.random() > 0.3 else rng.choice((-1, 1))
+        for col in range(size - 1):
+            connect(row * size + col, row * size + col + 1, speed, oneway)
+    for col in range(size):
+        # Northbound/southbound streets cross the river only on bridges
+        speed = street_speed(col)
+        oneway = 0 if speed > 25 or rng.random() > 0.3 else rng.choice((-1, 1))
+        for row in range(size - 1):
+            if row == river and col % 24 != 0:
+                continue
+            connect(row * size + col, (row + 1) * size + col, speed, oneway)
+
+    # Expressways are separate carriageways joined to the grid at arterial crossings
+    for line in expressways:
+        for horizontal in (True, False):
+            ramps = []
+            for step in range(size):
+                node = line * size + step if horizontal else step * size + line
+                latitudes.append(latitudes[node] + 0.3 * lat_step)
+                longitudes.append(longitudes[node] + 0.3 * lon_step)
+                ramps.append((len(latitudes) - 1, node, step))
+            for (a, _, _), (b, _, _) in zip(ramps, ramps[1:]):
+                connect(a, b, 90)
+            for express, street, step in ramps:
+                if step % 8 == 0:
+                    connect(express, street, 40)
+    return latitudes, longitudes, edges
+
+
+def dijkstra_to_targets(adjacency: List[List[Tuple[int, float]]], source: int, targets: Sequence[int]) -> Dict[int, float]:
+    """Plain Dijkstra from `source`, stopped once every target is settled"""
+    remaining = set(targets)
+    settled: Dict[int, float] = {}
+    best = {source: 0.0}
+    heap = [(0.0, source)]
+    while heap and remaining:
+        seconds, node = heapq.heappop(heap)
+        if node in settled:
+            continue
+        settled[node] = seconds
+        remaining.discard(node)
+        for head, weight in adjacency[node]:
+            candidate = seconds + weight
+            if candidate < best.get(head, float('inf')):
+                best[head] = candidate
+                heapq.heappush(heap, (candidate, head))
+    return {t: settled[t] for t in targets if t in settled}
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Road graph drive-time benchmark')
+    parser.add_argument('--size', type=int, default=550, help='Streets per side of the grid')
+    parser.add_argument('--block-m', type=float, default=100)
+    parser.add_argument('--hospitals', type=int, default=300)
+    parser.add_argument('--candidates', default='10,25,50')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--graph', help='Graph file to (re)use; built when missing')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    latitudes, longitudes, edges = synthetic_city(args.size, args.block_m, args.seed)
+    path = args.graph or os.path.join(tempfile.mkdtemp(prefix='health-roads-'), 'roads.graph')
+    results = {'nodes': len(latitudes), 'edges': len(edges)}
+    if not os.path.exists(path):
+        start = time.perf_counter()
+        RoadGraph.build(latitudes, longitudes, edges).save(path)
+        results['build_seconds'] = round(time.perf_counter() - start, 1)
+        print(f"Contracted {len(latitudes):,} nodes / {len(edges):,} edges in {results['build_seconds']}s")
+    start = time.perf_counter()
+    graph = RoadGraph.load(path)
+    results.update(load_seconds=round(time.perf_counter() - start, 3), file_mb=round(os.path.getsize(path) / 1e6, 1),
+                   stored_edges=graph.edge_count)
+    print(f"Loaded {len(graph):,} nodes, {graph.edge_count:,} upward edges incl. shortcuts "
+          f"({results['file_mb']} MB) in {results['load_seconds']}s")
+
+    adjacency: List[List[Tuple[int, float]]] = [[] for _ in latitudes]
+    for tail, head, seconds in edges:
+        adjacency[tail].append((head, seconds))
+
+    rng = random.Random(args.seed)
+    street_nodes = args.size * args.size
+    hospitals = rng.sample(range(street_nodes), args.hospitals)
+    results['queries'] = {}
+    for count in [int(c) for c in args.candidates.split(',') if c]:
+        ch_times, dijkstra_times, mismatches, reordered = [], [], 0, 0
+        for _ in range(args.queries):
+            caller = rng.randrange(street_nodes)
+            lat, lon = latitudes[caller], longitudes[caller]
+            candidates = sorted(hospitals, key=lambda h: _flat_km(lat, lon, latitudes[h], longitudes[h]))[:count]
+            destinations = [(latitudes[h], longitudes[h]) for h in candidates]
+
+            start = time.perf_counter()
+            etas = graph.travel_times(lat, lon, destinations)
+            ch_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            exact = dijkstra_to_targets(adjacency, caller, candidates)
+            dijkstra_times.append(time.perf_counter() - start)
+
+            # Both start and end on graph nodes here, so there is no off-road connector time
+            for h, eta in zip(candidates, etas):
+                if (eta is None) != (h not in exact) or (eta is not None and abs(eta - exact[h]) > 0.5):
+                    mismatches += 1
+            reachable = [(eta, i) for i, eta in enumerate(etas) if eta is not None]
+            if reachable and min(reachable)[1] != 0:
+                reordered += 1
+
+        result = {
+            'ch_p50_ms': round(percentile(ch_times, 50) * 1000, 2),
+            'ch_p99_ms': round(percentile(ch_times, 99) * 1000, 2),
+            'dijkstra_p50_ms': round(percentile(dijkstra_times, 50) * 1000, 2),
+            'dijkstra_p99_ms': round(percentile(dijkstra_times, 99) * 1000, 2),
+            'eta_mismatches': mismatches,
+            'nearest_by_distance_not_fastest_pct': round(100 * reordered / args.queries, 1)
+        }
+        results['queries'][count] = result
+        print(f"{count:>3} candidates  travel_times p50 {result['ch_p50_ms']:>7.2f} ms  p99 {result['ch_p99_ms']:>7.2f} ms  |  "
+              f"Dijkstra p50 {result['dijkstra_p50_ms']:>8.2f} ms  p99 {result['dijkstra_p99_ms']:>8.2f} ms  |  "
+              f"{result['nearest_by_distance_not_fastest_pct']}% reordered  {mismatches} ETA mismatches")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if any(r['eta_mismatches'] for r in results['queries'].values()):
+        raise SystemExit('travel_times disagrees with Dijkstra')
+
+
+if __name__ == '__main__':
+    main()
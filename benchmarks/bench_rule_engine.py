@@ -0,0 +1,195 @@
+"""
+Rule engine: equivalence with the original hard-coded ladders and cost as
+the symptom keyword list grows.
+
+    python benchmarks/bench_rule_engine.py --records 20000
+
+The reference functions below are the branch ladders the rule table
+replaced; with rules/health_rules.json the engine must agree with them on
+every scoring record and every triage input, and reject non-finite vitals.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_batch_scoring import random_record  # noqa: E402
+from rule_engine import RULES_PATH, RuleEngine  # noqa: E402
+
+INSTRUCTION_KEYS = {
+    'chest_pain_emergency', 'chest_pain_warning', 'breathing_emergency', 'fever_emergency',
+    'accident_emergency', 'unconscious_emergency', 'stable'
+}
+
+
+def reference_score(data):
+    """The original calculate_health_score ladder"""
+    score = 100
+    temperature = data.get('temperature', 0)
+    heart_rate = data.get('heart_rate', 0)
+    bp_sys = data.get('bp_sys', 0)
+    bp_dia = data.get('bp_dia', 0)
+    spo2 = data.get('spo2', 0)
+    age = data.get('age', 30)
+    symptoms = data.get('symptoms', '').lower()
+
+    if temperature < 35 or temperature > 40:
+        score -= 30
+    elif temperature < 36 or temperature > 38.5:
+        score -= 20
+    elif temperature < 36.5 or temperature > 37.5:
+        score -= 10
+
+    if heart_rate < 40 or heart_rate > 150:
+        score -= 25
+    elif heart_rate < 50 or heart_rate > 120:
+        score -= 10
+    elif heart_rate < 55 or heart_rate > 105:
+        score -= 5
+
+    if bp_sys < 80 or bp_sys > 180 or bp_dia < 50 or bp_dia > 110:
+        score -= 20
+    elif bp_sys < 90 or bp_sys > 160 or bp_dia < 60 or bp_dia > 100:
+        score -= 10
+    elif bp_sys < 95 or bp_sys > 150 or bp_dia < 65 or bp_dia > 95:
+        score -= 5
+
+    if spo2 < 90:
+        score -= 30
+    elif spo2 < 95:
+        score -= 15
+    elif spo2 < 97:
+        score -= 5
+
+    if age > 65:
+        score -= 5
+    elif age < 18:
+        score -= 3
+
+    critical_symptoms = ['chest pain', 'difficulty breathing', 'severe headache', 'loss of consciousness', 'severe bleeding']
+    concerning_symptoms = ['dizziness', 'nausea', 'fever', 'fatigue', 'pain', 'headache']
+    for symptom in critical_symptoms:
+        if symptom in symptoms:
+            score -= 20
+            break
+    for symptom in concerning_symptoms:
+        if symptom in symptoms:
+            score -= 10
+            break
+
+    if score >= 85:
+        status = 'Stable'
+    elif score >= 60:
+        status = 'Monitor'
+    else:
+        status = 'Emergency'
+    return max(0, score), status
+
+
+def reference_classify(symptom, yes_count, caretaker_unconscious):
+    """The original /classify_emergency ladder"""
+    severity = 'stable'
+    instructions_key = 'stable'
+    if symptom in ['chest_pain', 'breathing', 'unconscious', 'accident']:
+        if yes_count >= 1:
+            severity = 'emergency'
+            instructions_key = f"{symptom}_emergency"
+        else:
+            severity = 'warning'
+            instructions_key = f"{symptom}_warning" if f"{symptom}_warning" in INSTRUCTION_KEYS else 'stable'
+    elif symptom == 'fever':
+        if yes_count >= 2:
+            severity = 'emergency'
+            instructions_key = 'fever_emergency'
+        elif yes_count >= 1:
+            severity = 'warning'
+            instructions_key = 'stable'
+    else:
+        severity = 'warning' if yes_count >= 2 else 'stable'
+    if caretaker_unconscious:
+        severity = 'emergency'
+        instructions_key = 'unconscious_emergency'
+    return severity, instructions_key
+
+
+def check_equivalence(engine, rng, records):
+    for _ in range(records):
+        record = random_record(rng)
+        if engine.score(record) != reference_score(record):
+            raise AssertionError(f"Score mismatch for {record}: {engine.score(record)} != {reference_score(record)}")
+
+    # The ladders scored NaN as in range; the engine rejects non-finite vitals instead
+    for field in engine.vital_fields:
+        for value in (float('nan'), float('inf'), float('-inf')):
+            try:
+                engine.score({field: value})
+            except ValueError:
+                continue
+            raise AssertionError(f"{field}={value} was scored instead of rejected")
+
+    symptoms = ['chest_pain', 'breathing', 'fever', 'accident', 'unconscious', 'other', 'unknown', None]
+    for symptom in symptoms:
+        for yes_count in range(5):
+            for unconscious in (False, True):
+                got = engine.classify(symptom, yes_count, unconscious)
+                expected = reference_classify(symptom, yes_count, unconscious)
+                if got != expected:
+                    raise AssertionError(f"Triage mismatch for {(symptom, yes_count, unconscious)}: {got} != {expected}")
+
+
+def keyword_scaling(rng, sizes, texts):
+    """Time symptom matching with N keywords: engine vs. a list of `in` scans"""
+    alphabet = 'abcdefghijklmnopqrstuvwxyz'
+    rows = []
+    for size in sizes:
+        keywords = [''.join(rng.choice(alphabet) for _ in range(rng.randint(5, 14))) for _ in range(size)]
+        engine = RuleEngine({'symptoms': [
+            {'name': 'critical', 'penalty': 20, 'keywords': keywords[:size // 2]},
+            {'name': 'concerning', 'penalty': 10, 'keywords': keywords[size // 2:]}
+        ]})
+
+        start = time.perf_counter()
+        for text in texts:
+            engine.symptom_mask(text)
+        compiled = (time.perf_counter() - start) / len(texts)
+
+        start = time.perf_counter()
+        for text in texts:
+            lowered = text.lower()
+            any(k in lowered for k in keywords[:size // 2])
+            any(k in lowered for k in keywords[size // 2:])
+        naive = (time.perf_counter() - start) / len(texts)
+        rows.append((size, compiled, naive))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rule engine equivalence and scaling benchmark')
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    engine = RuleEngine.load(RULES_PATH)
+    check_equivalence(engine, rng, args.records)
+    print(f"Equivalence: {args.records} records and all triage inputs match the original ladders")
+
+    records = [random_record(rng) for _ in range(args.records)]
+    for name, fn in (('original ladder', reference_score), ('rule engine', engine.score)):
+        start = time.perf_counter()
+        for record in records:
+            fn(record)
+        print(f"{name:<16} {args.records / (time.perf_counter() - start):>12,.0f} records/s")
+
+    texts = [' '.join(''.join(rng.choice('abcdefghijklmnopqrstuvwxyz ') for _ in range(rng.randint(20, 120))).split())
+             for _ in range(2000)]
+    print("keywords   compiled (us/text)   in-scans (us/text)")
+    for size, compiled, naive in keyword_scaling(rng, (10, 100, 500, 2000), texts):
+        print(f"{size:>8}   {compiled * 1e6:>18.2f}   {naive * 1e6:>18.2f}")
+
+
+if __name__ == '__main__':
+    main()
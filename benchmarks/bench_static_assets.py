@@ -0,0 +1,144 @@
+"""
+Bytes on the wire and cold/repeat page-load cost: plain /static files vs.
+the minified, precompressed, content-hashed /assets/ pipeline.
+
+    python benchmarks/bench_static_assets.py
+
+Starts the app under gunicorn on a temporary database and loads the page the
+way a browser does. It fetches `/` first, then the stylesheet and script in
+parallel, sending `Accept-Encoding: gzip, deflate, br`. This runs once
+through the old `/static/...` URLs and once through the hashed URLs that
+index.html now uses. Wire bytes are counted before decompression. A repeat
+visit counts what the cache headers still send over the network: /static
+files are revalidated (304), and immutable /assets/ files aren't requested.
+Load times over mobile links are modeled from the measured bytes and round
+trips (one for the connection, one for the HTML, one for the parallel
+assets), next to the measured loopback time. Third-party CDN files are the
+same in both setups and are left out.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+import requests  # noqa: E402
+
+from run_suite import free_port, start_app  # noqa: E402
+
+ACCEPT_ENCODING = 'gzip, deflate, br'
+STATIC_URLS = ['/static/css/style.css', '/static/js/main.js']
+
+# (name, downlink bits/s, round-trip seconds), Lighthouse/WebPageTest-style profiles
+LINKS = [
+    ('slow-3g', 400_000, 0.4),
+    ('fast-3g', 1_600_000, 0.15),
+    ('4g', 9_000_000, 0.07),
+]
+
+
+def fetch(session: requests.Session, url: str, headers: Dict = None) -> Dict:
+    start = time.perf_counter()
+    response = session.get(url, headers={'Accept-Encoding': ACCEPT_ENCODING, **(headers or {})}, stream=True)
+    body = response.raw.read(decode_content=False)
+    return {
+        'url': url,
+        'status': response.status_code,
+        'wire_bytes': len(body),
+        'encoding': response.headers.get('Content-Encoding', 'identity'),
+        'cache_control': response.headers.get('Cache-Control', ''),
+        'etag': response.headers.get('ETag'),
+        'elapsed_ms': (time.perf_counter() - start) * 1000
+    }
+
+
+def load_page(base_url: str, asset_urls: List[str], repeat_of: List[Dict] = None) -> Dict:
+    """HTML, then the assets in parallel; on a repeat visit only what the cache headers require"""
+    started = time.perf_counter()
+    with requests.Session() as session:
+        page = fetch(session, base_url + '/')
+        assets = []
+        with ThreadPoolExecutor(max_workers=len(asset_urls)) as pool:
+            futures = []
+            for i, url in enumerate(asset_urls):
+                cached = repeat_of[i] if repeat_of else None
+                if cached and 'immutable' in cached['cache_control']:
+                    continue  # served from the browser cache without a request
+                headers = {'If-None-Match': cached['etag']} if cached and cached['etag'] else None
+                futures.append(pool.submit(fetch, requests.Session(), base_url + url, headers))
+            assets = [future.result() for future in futures]
+    return {
+        'html_bytes': page['wire_bytes'],
+        'asset_bytes': sum(a['wire_bytes'] for a in assets),
+        'asset_requests': len(assets),
+        'assets': assets,
+        'loopback_ms': round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+def modeled_ms(result: Dict, bits_per_second: float, rtt: float) -> float:
+    """Connection + HTML round trips, HTML transfer, then one round trip for the parallel assets"""
+    seconds = 2 * rtt + result['html_bytes'] * 8 / bits_per_second
+    if result['asset_requests']:
+        seconds += rtt + result['asset_bytes'] * 8 / bits_per_second
+    return round(seconds * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Static asset pipeline benchmark')
+    parser.add_argument('--repeat', type=int, default=5, help='Loopback loads per setup (best is reported)')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    port = free_port()
+    tmp = tempfile.mkdtemp(prefix='health-assets-')
+    server = start_app(port, {'HEALTH_DB_PATH': os.path.join(tmp, 'bench.db')}, workers=1, threads=4)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        html = requests.get(base_url + '/').text
+        hashed_urls = sorted(set(re.findall(r'/assets/[^"\']+', html)))
+        if len(hashed_urls) != len(STATIC_URLS):
+            raise RuntimeError(f'Expected {len(STATIC_URLS)} hashed asset URLs in index.html, found {hashed_urls}')
+
+        results = {}
+        for name, urls in (('static', STATIC_URLS), ('pipeline', hashed_urls)):
+            cold = min((load_page(base_url, urls) for _ in range(args.repeat)), key=lambda r: r['loopback_ms'])
+            repeat = load_page(base_url, urls, repeat_of=cold['assets'])
+            results[name] = {'cold': cold, 'repeat': repeat}
+    finally:
+        server.terminate()
+        server.wait(10)
+
+    print(f"{'':<10} {'visit':<7} {'html B':>8} {'asset B':>9} {'asset req':>9} {'loopback':>9}  "
+          + '  '.join(f'{name:>8}' for name, _, _ in LINKS))
+    summary = {}
+    for name, visits in results.items():
+        for visit, result in visits.items():
+            modeled = {link: modeled_ms(result, bps, rtt) for link, bps, rtt in LINKS}
+            summary[f'{name}_{visit}'] = {
+                'html_bytes': result['html_bytes'], 'asset_bytes': result['asset_bytes'],
+                'asset_requests': result['asset_requests'], 'loopback_ms': result['loopback_ms'],
+                'modeled_ms': modeled,
+                'encodings': {a['url']: a['encoding'] for a in result['assets']}
+            }
+            print(f"{name:<10} {visit:<7} {result['html_bytes']:>8,} {result['asset_bytes']:>9,} "
+                  f"{result['asset_requests']:>9} {result['loopback_ms']:>7.1f}ms  "
+                  + '  '.join(f'{modeled[link]:>6}ms' for link, _, _ in LINKS))
+    before = summary['static_cold']['asset_bytes']
+    after = summary['pipeline_cold']['asset_bytes']
+    print(f"Asset bytes on a cold load: {before:,} -> {after:,} ({after / before:.1%})")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+health_records write/read load test: per-request connections with the
+default rollback journal (the original app) vs. the pooled WAL HealthStore.
+
+    python benchmarks/bench_storage.py --writers 4 --inserts 500
+
+Writers run as separate processes, like gunicorn workers, while one more
+process measures the latency of the /health_history query.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import CREATE_HEALTH_RECORDS, INSERT_HEALTH_RECORD, HealthStore  # noqa: E402
+
+# The original /health_history query
+BASELINE_HISTORY_QUERY = 'SELECT * FROM health_records ORDER BY date DESC LIMIT ?'
+
+ROW = (45, 37.2, 88, 128, 84, 97, 'mild headache', 'Monitor', 80, None, None)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def baseline_insert(path):
+    conn = sqlite3.connect(path)
+    conn.execute(INSERT_HEALTH_RECORD, ROW)
+    conn.commit()
+    conn.close()
+
+
+def baseline_read(path):
+    conn = sqlite3.connect(path)
+    conn.execute(BASELINE_HISTORY_QUERY, (10,)).fetchall()
+    conn.close()
+
+
+def writer(mode, path, inserts, results):
+    store = HealthStore(path) if mode == 'pooled' else None
+    errors = 0
+    start = time.perf_counter()
+    for _ in range(inserts):
+        try:
+            if store:
+                store.insert_record(ROW)
+            else:
+                baseline_insert(path)
+        except sqlite3.OperationalError:
+            errors += 1
+    results.put(('write', time.perf_counter() - start, errors))
+
+
+def reader(mode, path, stop, results):
+    store = HealthStore(path) if mode == 'pooled' else None
+    samples = []
+    errors = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            if store:
+                store.history_page(10)
+            else:
+                baseline_read(path)
+            samples.append(time.perf_counter() - start)
+        except sqlite3.OperationalError:
+            errors += 1
+        time.sleep(0.001)
+    results.put(('read', samples, errors))
+
+
+def run(mode, writers, inserts):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'health_records.db')
+        conn = sqlite3.connect(path)
+        conn.execute(CREATE_HEALTH_RECORDS)
+        conn.executemany(INSERT_HEALTH_RECORD, [ROW] * 10000)
+        conn.commit()
+        conn.close()
+        if mode == 'pooled':
+            HealthStore(path).init_schema()
+
+        results = multiprocessing.Queue()
+        stop = multiprocessing.Event()
+        read_proc = multiprocessing.Process(target=reader, args=(mode, path, stop, results))
+        read_proc.start()
+
+        start = time.perf_counter()
+        procs = [multiprocessing.Process(target=writer, args=(mode, path, inserts, results))
+                 for _ in range(writers)]
+        for proc in procs:
+            proc.start()
+        outcomes = [results.get() for _ in procs]
+        elapsed = time.perf_counter() - start
+        stop.set()
+        _, read_samples, read_errors = results.get()
+        for proc in procs + [read_proc]:
+            proc.join()
+
+    write_errors = sum(errors for _, _, errors in outcomes)
+    written = writers * inserts - write_errors
+    return {
+        'mode': mode,
+        'writers': writers,
+        'inserts_per_sec': round(written / elapsed, 1),
+        'write_errors': write_errors,
+        'read_p50_ms': round(percentile(read_samples, 50) * 1000, 3),
+        'read_p99_ms': round(percentile(read_samples, 99) * 1000, 3),
+        'read_errors': read_errors
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='health_records storage load test')
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--inserts', type=int, default=500, help='Inserts per writer')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    results = [run(mode, args.writers, args.inserts) for mode in ('baseline', 'pooled')]
+    for r in results:
+        print(f"{r['mode']:<9} writers={r['writers']} inserts/s={r['inserts_per_sec']:<9} "
+              f"write_errors={r['write_errors']:<4} read p50={r['read_p50_ms']} ms "
+              f"p99={r['read_p99_ms']} ms read_errors={r['read_errors']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
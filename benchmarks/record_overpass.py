@@ -0,0 +1,60 @@
+"""
+Record real Overpass API responses for replay by the stub server.
+
+    python benchmarks/record_overpass.py --points 5 --radius 5000
+    python benchmarks/stub_overpass.py --response benchmarks/recordings
+
+Issues the app's own hospital query (fetch_medical_facilities) around
+random points of a city and stores each raw JSON response in
+benchmarks/recordings/, so load tests replay realistic payload sizes and
+shapes without touching the live service. Needs network access.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('HEALTH_DB_PATH', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+import app  # noqa: E402
+
+RECORDINGS_DIR = os.path.join(ROOT, 'benchmarks', 'recordings')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record Overpass responses for the stub server')
+    parser.add_argument('--center', type=float, nargs=2, default=(28.6139, 77.2090), metavar=('LAT', 'LON'))
+    parser.add_argument('--span', type=float, default=0.1, help='Degrees around the center to sample')
+    parser.add_argument('--points', type=int, default=5)
+    parser.add_argument('--radius', type=int, default=5000)
+    parser.add_argument('--output', default=RECORDINGS_DIR)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    rng = random.Random(args.seed)
+    query = app.overpass_client.query
+    recorded = []
+
+    def recording_query(text):
+        data = query(text)
+        recorded.append(data)
+        return data
+
+    app.overpass_client.query = recording_query
+    for i in range(args.points):
+        lat = args.center[0] + rng.uniform(-args.span, args.span)
+        lon = args.center[1] + rng.uniform(-args.span, args.span)
+        facilities = app.fetch_medical_facilities(lat, lon, args.radius)
+        path = os.path.join(args.output, f'overpass_{i:03d}.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(recorded[-1], f)
+        print(f"{path}: {len(recorded[-1].get('elements', []))} elements, {len(facilities)} facilities")
+
+
+if __name__ == '__main__':
+    main()
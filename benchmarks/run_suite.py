@@ -0,0 +1,399 @@
+"""
+Reproducible benchmark suite: hot-function micro-benchmarks plus a load test
+of every Flask route.
+
+    python benchmarks/run_suite.py                       # micro + load, writes benchmarks/results/
+    python benchmarks/run_suite.py --only micro
+    python benchmarks/run_suite.py --requests 5000 --concurrency 32 --workers 2
+    python benchmarks/run_suite.py --compare benchmarks/results/<older>.json
+
+The load test starts the stub Overpass server (replaying
+benchmarks/recordings/ when present, synthetic facilities otherwise) and the
+app under gunicorn on a temporary database, then drives each route with
+keep-alive clients and reports req/s and p50/p95/p99. Results are written as
+JSON tagged with the git commit so runs can be compared across commits.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT, 'benchmarks')
+RECORDINGS_DIR = os.path.join(BENCH_DIR, 'recordings')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+import requests  # noqa: E402
+
+from stub_overpass import load_responses, start_stub_server, synthetic_response  # noqa: E402
+
+SYMPTOMS = ['chest_pain', 'breathing', 'fever', 'accident', 'unconscious', 'other']
+SYMPTOM_TEXTS = ['', 'mild headache', 'chest pain since morning', 'fever and cough', 'feeling dizzy']
+PATIENTS = [f'bench-{i}' for i in range(50)]
+EXPORT_TOKEN = 'bench-export'
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def random_record(rng: random.Random, patient: bool = True) -> Dict:
+    record = {
+        'age': rng.randint(1, 95),
+        'temperature': round(rng.uniform(35.0, 40.5), 1),
+        'heart_rate': rng.randint(45, 150),
+        'bp_sys': rng.randint(85, 180),
+        'bp_dia': rng.randint(50, 110),
+        'spo2': rng.randint(85, 100),
+        'symptoms': rng.choice(SYMPTOM_TEXTS)
+    }
+    if patient:
+        record['patient_id'] = rng.choice(PATIENTS)
+    return record
+
+
+def facilities_center(responses: List[Dict]) -> Tuple[float, float]:
+    """Mean position of the facilities in the replayed responses"""
+    points = [(e['lat'], e['lon']) for r in responses for e in r.get('elements', [])
+              if 'lat' in e and 'lon' in e]
+    if not points:
+        return 28.6139, 77.2090
+    return sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points)
+
+
+# --- Micro-benchmarks --------------------------------------------------------
+
+def time_call(fn: Callable, loops: int, repeat: int) -> Dict:
+    """Median/min per-call time over `repeat` runs of `loops` calls"""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        runs.append((time.perf_counter() - start) / loops)
+    runs.sort()
+    median = runs[len(runs) // 2]
+    return {
+        'loops': loops,
+        'repeat': repeat,
+        'median_us': round(median * 1e6, 3),
+        'min_us': round(runs[0] * 1e6, 3),
+        'ops_per_s': round(1 / median, 1) if median else None
+    }
+
+
+def run_micro(responses: List[Dict], scale: float, seed: int) -> List[Dict]:
+    import app
+    from rule_engine import get_engine
+    from scoring import calculate_health_score, score_batch
+    from facilities import FacilitySet
+    from trends import TrendEngine
+
+    rng = random.Random(seed)
+    records = [random_record(rng, patient=False) for _ in range(1000)]
+    engine = get_engine()
+    center = facilities_center(responses)
+
+    # Replay the recorded payloads through the app's own Overpass parsing
+    query = app.overpass_client.query
+    payloads = iter(responses * 1000000)
+    app.overpass_client.query = lambda text: next(payloads)
+    try:
+        # As the tile cache holds them
+        facilities = FacilitySet([f for _ in responses for f in app.fetch_medical_facilities(center[0], center[1], 5000)])
+    finally:
+        app.overpass_client.query = query
+
+    counter = iter(range(10 ** 12))
+    trends = TrendEngine(engine.trends)
+
+    def next_record():
+        return records[next(counter) % len(records)]
+
+    def loops(n):
+        return max(1, int(n * scale))
+
+    cases = [
+        ('calculate_health_score', lambda: calculate_health_score(next_record()), loops(20000)),
+        ('score_batch_1000', lambda: score_batch(records), loops(200)),
+        ('rule_engine_classify', lambda: engine.classify('chest_pain', 2), loops(50000)),
+        ('triage_classify_response', lambda: app.triage_cache.classify_response('fever', 1, False), loops(50000)),
+        ('haversine_km', lambda: app.haversine_km(center[0], center[1], center[0] + 0.03, center[1] - 0.02),
+         loops(50000)),
+        (f'rank_hospitals_{len(facilities)}', lambda: app.rank_hospitals(facilities, center[0], center[1], 5000),
+         loops(2000)),
+        ('trend_update', lambda: trends.update(PATIENTS[next(counter) % len(PATIENTS)], next_record()),
+         loops(20000)),
+    ]
+
+    app.overpass_client.query = lambda text: next(payloads)
+    try:
+        cases.append(('overpass_parse', lambda: app.fetch_medical_facilities(center[0], center[1], 5000),
+                      loops(1000)))
+        results = []
+        for name, fn, n in cases:
+            fn()  # warm up
+            result = {'name': name, **time_call(fn, n, repeat=5)}
+            results.append(result)
+            print(f"  {name:<28} {result['median_us']:>10.2f} us  ({result['ops_per_s']:,.0f}/s)")
+    finally:
+        app.overpass_client.query = query
+    return results
+
+
+# --- Load test ---------------------------------------------------------------
+
+def route_scenarios(center: Tuple[float, float], catalog_version: Optional[str]) -> List[Tuple]:
+    """(name, url rule, request factory) for every route; order matters (trends after check_health)"""
+    def point(rng):
+        return {'latitude': center[0] + rng.uniform(-0.05, 0.05), 'longitude': center[1] + rng.uniform(-0.05, 0.05)}
+
+    def stream_body(rng):
+        lines = [json.dumps({**random_record(rng), 'id': i}) for i in range(50)]
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    return [
+        ('index', '/', lambda rng: ('GET', '/', {})),
+        ('triage_questions_post', '/get_triage_questions',
+         lambda rng: ('POST', '/get_triage_questions', {'json': {'symptom': rng.choice(SYMPTOMS)}})),
+        ('triage_questions_get', '/get_triage_questions',
+         lambda rng: ('GET', f'/get_triage_questions?symptom={rng.choice(SYMPTOMS)}', {})),
+        ('classify_emergency', '/classify_emergency',
+         lambda rng: ('POST', '/classify_emergency', {'json': {
+             'symptom': rng.choice(SYMPTOMS),
+             'triageAnswers': [{'answer': rng.choice(['yes', 'no'])} for _ in range(3)],
+             'isCaretaker': rng.random() < 0.2,
+             'caretakerData': {'conscious': rng.choice(['yes', 'no'])}
+         }})),
+        ('triage_catalog', '/triage_catalog', lambda rng: ('GET', '/triage_catalog', {})),
+        ('triage_catalog_version', '/triage_catalog/<version>',
+         lambda rng: ('GET', f'/triage_catalog/{catalog_version}', {})),
+        ('check_health', '/check_health',
+         lambda rng: ('POST', '/check_health', {'json': random_record(rng)})),
+        ('check_health_batch_100', '/check_health/batch',
+         lambda rng: ('POST', '/check_health/batch', {'json': {'records': [random_record(rng) for _ in range(100)]}})),
+        ('check_health_stream_50', '/check_health/stream',
+         lambda rng: ('POST', '/check_health/stream', {
+             'data': stream_body(rng), 'headers': {'Content-Type': 'application/x-ndjson'}})),
+        ('trends', '/trends/<patient_id>', lambda rng: ('GET', f'/trends/{rng.choice(PATIENTS)}', {})),
+        ('find_hospitals', '/find_hospitals', lambda rng: ('POST', '/find_hospitals', {'json': point(rng)})),
+        ('health_history', '/health_history',
+         lambda rng: ('GET', f"/health_history?limit=20&status={rng.choice(['', 'Stable', 'Monitor,Emergency'])}", {})),
+        ('stats', '/stats',
+         lambda rng: ('GET', f"/stats?granularity={rng.choice(['hour', 'day'])}", {})),
+        ('export', '/export',
+         lambda rng: ('GET', f"/export?format={rng.choice(['csv', 'ndjson'])}",
+                      {'headers': {'Authorization': f'Bearer {EXPORT_TOKEN}'}})),
+        ('hospital_cache_stats', '/hospital_cache_stats', lambda rng: ('GET', '/hospital_cache_stats', {})),
+        ('write_queue_stats', '/write_queue_stats', lambda rng: ('GET', '/write_queue_stats', {})),
+        ('metrics', '/metrics', lambda rng: ('GET', '/metrics', {})),
+    ]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_app(port: int, env: Dict, workers: int, threads: int) -> subprocess.Popen:
+    command = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '--threads', str(threads),
+               '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app']
+    process = subprocess.Popen(command, cwd=ROOT, env={**os.environ, **env})
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('App server exited during startup')
+        try:
+            requests.get(f'http://127.0.0.1:{port}/write_queue_stats', timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('App server did not start')
+
+
+def drive(base_url: str, factory: Callable, total: int, concurrency: int, seed: int) -> Dict:
+    """Send `total` requests from `concurrency` keep-alive clients; latency per request"""
+    local = threading.local()
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    lock = threading.Lock()
+
+    def one(i):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+            local.rng = random.Random(seed * 1000 + threading.get_ident() % 1000)
+        method, path, kwargs = factory(local.rng)
+        start = time.perf_counter()
+        try:
+            response = session.request(method, base_url + path, timeout=30, **kwargs)
+            response.content  # read streamed bodies fully
+            status = response.status_code
+        except requests.RequestException:
+            status = 0
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    errors = sum(count for status, count in statuses.items() if status == 0 or status >= 400)
+    return {
+        'requests': total,
+        'concurrency': concurrency,
+        'req_per_s': round(total / wall, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(max(latencies) * 1000, 3),
+        'errors': errors,
+        'statuses': {str(k): v for k, v in sorted(statuses.items())}
+    }
+
+
+def run_load(responses: List[Dict], args) -> List[Dict]:
+    import app
+
+    stub = start_stub_server(responses=responses, delay=args.overpass_delay)
+    port = free_port()
+    tmp = tempfile.mkdtemp(prefix='health-bench-')
+    env = {
+        'HEALTH_DB_PATH': os.path.join(tmp, 'bench.db'),
+        'OVERPASS_URL': stub.url,
+        'FACILITY_INDEX_PATH': os.path.join(tmp, 'missing.idx'),
+        'EXPORT_TOKEN': EXPORT_TOKEN,
+        # Route cost, not overload behaviour: don't shed the suite's own concurrent requests
+        'ADMISSION_ENABLED': '0'
+    }
+    server = start_app(port, env, args.workers, args.threads)
+    base_url = f'http://127.0.0.1:{port}'
+
+    scenarios = route_scenarios(facilities_center(responses), app.triage_cache.version)
+    covered = {rule for _, rule, _ in scenarios}
+    missing = sorted(r.rule for r in app.app.url_map.iter_rules() if r.endpoint != 'static' and r.rule not in covered)
+    if missing:
+        print(f"  warning: no load scenario for {', '.join(missing)}")
+
+    results = []
+    try:
+        for name, rule, factory in scenarios:
+            if args.routes and name not in args.routes:
+                continue
+            total = max(args.concurrency, int(args.requests * (0.2 if 'batch' in name or 'stream' in name else 1)))
+            drive(base_url, factory, min(total, 50), args.concurrency, args.seed)  # warm up
+            result = {'name': name, 'route': rule, **drive(base_url, factory, total, args.concurrency, args.seed)}
+            results.append(result)
+            print(f"  {name:<26} {result['req_per_s']:>9,.1f} req/s  p50 {result['p50_ms']:>8.2f}  "
+                  f"p95 {result['p95_ms']:>8.2f}  p99 {result['p99_ms']:>8.2f} ms  errors {result['errors']}")
+    finally:
+        server.terminate()
+        server.wait(10)
+        stub.shutdown()
+    return results
+
+
+# --- Results -----------------------------------------------------------------
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict, baseline_path: str):
+    """Print per-benchmark changes against an earlier results file"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline['meta'].get('commit')} ({baseline_path}):")
+    for section, key, higher_is_better in (('micro', 'median_us', False), ('load', 'req_per_s', True),
+                                           ('load', 'p99_ms', False)):
+        before = {r['name']: r for r in baseline.get(section, [])}
+        for result in current.get(section, []):
+            old = before.get(result['name'])
+            if not old or not old.get(key):
+                continue
+            change = (result[key] - old[key]) / old[key] * 100
+            better = change > 0 if higher_is_better else change < 0
+            flag = '' if abs(change) < 5 else (' (better)' if better else ' (WORSE)')
+            print(f"  {section:<5} {result['name']:<28} {key:<10} {old[key]:>10} -> {result[key]:>10}  "
+                  f"{change:+6.1f}%{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks and per-route load test')
+    parser.add_argument('--only', choices=('micro', 'load'))
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplier for micro-benchmark loop counts')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per route')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--overpass-delay', type=float, default=0.0, help='Stub Overpass latency in seconds')
+    parser.add_argument('--routes', nargs='*', help='Only these load scenarios')
+    parser.add_argument('--recordings', default=RECORDINGS_DIR, help='Recorded Overpass responses to replay')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/<time>-<commit>.json)')
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    args = parser.parse_args()
+
+    # Micro-benchmarks import the app in-process: keep it off the real database
+    tmp = tempfile.mkdtemp(prefix='health-bench-')
+    os.environ['HEALTH_DB_PATH'] = os.path.join(tmp, 'micro.db')
+    os.environ['FACILITY_INDEX_PATH'] = os.path.join(tmp, 'missing.idx')
+
+    recorded = os.path.isdir(args.recordings) and load_responses([args.recordings])
+    responses = recorded or [synthetic_response()]
+    commit = git_commit()
+    results = {
+        'meta': {
+            'commit': commit,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'overpass_fixture': f'{len(responses)} recorded' if recorded else 'synthetic',
+            'args': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')}
+        }
+    }
+
+    if args.only in (None, 'micro'):
+        print('Micro-benchmarks:')
+        results['micro'] = run_micro(responses, args.scale, args.seed)
+    if args.only in (None, 'load'):
+        print(f"Load test ({args.requests} requests/route, concurrency {args.concurrency}, "
+              f"{args.workers}x{args.threads} gunicorn, Overpass fixture: {results['meta']['overpass_fixture']}):")
+        results['load'] = run_load(responses, args)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Local stub of the Overpass API for exercising the hospital lookup path
+without touching the real service.
+
+    python benchmarks/stub_overpass.py --port 8089 --delay 0.5
+    OVERPASS_URL=http://127.0.0.1:8089/api/interpreter python app.py
+
+Every POST returns a JSON body after `--delay` seconds: a synthetic set of
+facilities, or recorded Overpass responses (`--response file.json`, repeatable,
+or a directory such as benchmarks/recordings/ written by record_overpass.py)
+replayed round-robin. `--fail-every N` answers every Nth request with 503 to
+exercise client retries.
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Sequence, Tuple
+
+
+def synthetic_response(center: Tuple[float, float] = (28.6139, 77.2090), count: int = 50,
+                       span: float = 0.05, seed: int = 7) -> dict:
+    """Overpass-shaped JSON with `count` hospitals/clinics around `center`"""
+    rng = random.Random(seed)
+    elements = []
+    for i in range(count):
+        elements.append({
+            'type': 'node',
+            'id': i + 1,
+            'lat': center[0] + rng.uniform(-span, span),
+            'lon': center[1] + rng.uniform(-span, span),
+            'tags': {
+                'amenity': rng.choice(['hospital', 'clinic']),
+                'name': f'Stub Facility {i}',
+                'emergency': rng.choice(['yes', 'no'])
+            }
+        })
+    return {'elements': elements}
+
+
+def load_responses(paths: Sequence[str]) -> List[dict]:
+    """Recorded responses from JSON files and/or directories of them (sorted by name)"""
+    responses = []
+    for path in paths:
+        files = ([os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.json')]
+                 if os.path.isdir(path) else [path])
+        for file in files:
+            with open(file, encoding='utf-8') as f:
+                responses.append(json.load(f))
+    return responses
+
+
+class StubOverpassServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, bodies: List[bytes], delay: float = 0.0, fail_every: int = 0):
+        super().__init__(address, _Handler)
+        self.bodies = bodies
+        self.delay = delay
+        self.fail_every = fail_every
+        self.requests = 0
+        self.connections = set()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/interpreter"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with server._lock:
+            server.requests += 1
+            server.connections.add(self.client_address)
+            count = server.requests
+
+        if server.delay:
+            time.sleep(server.delay)
+
+        if server.fail_every and count % server.fail_every == 0:
+            status, body = 503, b'{"error": "stub overload"}'
+        else:
+            status, body = 200, server.bodies[(count - 1) % len(server.bodies)]
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port: int = 0, response: Optional[dict] = None, delay: float = 0.0,
+                      fail_every: int = 0, responses: Optional[Sequence[dict]] = None) -> StubOverpassServer:
+    """
+    Start a stub server on a background thread; use `.url` and `.shutdown()`.
+    `responses` are replayed round-robin; otherwise `response` (or synthetic facilities) is always served.
+    """
+    if not responses:
+        responses = [response if response is not None else synthetic_response()]
+    bodies = [json.dumps(r).encode('utf-8') for r in responses]
+    server = StubOverpassServer(('127.0.0.1', port), bodies, delay, fail_every)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Overpass API stub')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--delay', type=float, default=0.0, help='Seconds to wait before answering')
+    parser.add_argument('--response', action='append', default=[],
+                        help='Recorded JSON file or directory to replay instead of synthetic facilities (repeatable)')
+    parser.add_argument('--fail-every', type=int, default=0, help='Answer every Nth request with 503')
+    args = parser.parse_args()
+
+    responses = load_responses(args.response)
+    server = start_stub_server(args.port, delay=args.delay, fail_every=args.fail_every, responses=responses)
+    source = f"{len(responses)} recorded responses" if responses else 'synthetic facilities'
+    print(f"Stub Overpass listening on {server.url} ({source})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+"""
+Streaming bulk export of health_records as CSV, NDJSON or Parquet.
+
+    python export.py --format csv --from 2024-01-01 --to 2024-12-31 > records.csv
+    python export.py --format parquet --output records.parquet --archive
+
+Rows are read in keyset-paginated chunks on the (date, id) index, oldest
+first. Each chunk is a short read of `chunk_size` rows, so a long export
+never holds a read transaction that would keep the WAL from being
+checkpointed. Each chunk is encoded and handed on before the next is read,
+so memory stays the same whatever the table size. Parquet writes one row
+group per chunk and needs the optional `pyarrow` package. With
+`include_archive`, matching records from the retention archive (archive.py)
+come first, one day file at a time. A partitioned store is read partition
+by partition in the same chunks, merged on (date, id).
+"""
+import argparse
+import csv
+import heapq
+import io
+import itertools
+import json
+import sys
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # CSV and NDJSON only
+    pyarrow = None
+
+from storage import HealthStore, get_store, normalize_timestamp
+
+EXPORT_COLUMNS = ('id', 'date', 'patient_id', 'status', 'score', 'age', 'temperature',
+                  'heart_rate', 'bp_sys', 'bp_dia', 'spo2', 'symptoms')
+
+DEFAULT_CHUNK_SIZE = 10000
+
+class ExportQuery:
+    """Validated filters of one export; raises ValueError on bad input"""
+
+    def __init__(self, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                 statuses: Optional[Sequence[str]] = None, patient_id: Optional[str] = None,
+                 include_archive: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.date_from = normalize_timestamp(date_from) if date_from else None
+        self.date_to = normalize_timestamp(date_to, end_of_day=True) if date_to else None
+        self.statuses = list(statuses or [])
+        self.patient_id = patient_id or None
+        self.include_archive = include_archive
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be positive')
+        self.chunk_size = chunk_size
+
+    def matches(self, record: Dict) -> bool:
+        """Filter for archived records (the SQL WHERE clause does it for the hot table)"""
+        if self.date_from is not None and record['date'] < self.date_from:
+            return False
+        if self.date_to is not None and record['date'] > self.date_to:
+            return False
+        if self.statuses and record.get('status') not in self.statuses:
+            return False
+        return not self.patient_id or record.get('patient_id') == self.patient_id
+
+
+def iter_chunks(store: HealthStore, query: ExportQuery) -> Iterator[List[Tuple]]:
+    """Matching rows as EXPORT_COLUMNS tuples, oldest first, at most chunk_size per chunk"""
+    streams = [_partition_chunks(partition, query) for partition in store.partitions]
+    if len(streams) == 1:
+        hot = streams[0]
+    else:
+        # k-way merge of the partitions on (date, id), one chunk of each in memory
+        merged = heapq.merge(*(itertools.chain.from_iterable(stream) for stream in streams),
+                             key=lambda row: (row[1] or '', row[0]))
+        hot = iter(lambda: list(itertools.islice(merged, query.chunk_size)), [])
+
+    rows = next(hot, None)
+    if query.include_archive and store.archive is not None:
+        # Retention archives oldest first, so archived records precede the first hot row
+        yield from _archived_chunks(store, query, (rows[0][1], rows[0][0]) if rows else None)
+    if rows:
+        yield rows
+        yield from hot
+
+
+def _partition_chunks(partition: HealthStore, query: ExportQuery) -> Iterator[List[Tuple]]:
+    conn = partition.connection()
+    clauses: List[str] = []
+    params: List = []
+    if query.statuses:
+        clauses.append(f"status IN ({', '.join('?' * len(query.statuses))})")
+        params.extend(query.statuses)
+    if query.patient_id:
+        clauses.append('patient_id = ?')
+        params.append(query.patient_id)
+    if query.date_from:
+        clauses.append('date >= ?')
+        params.append(query.date_from)
+    if query.date_to:
+        clauses.append('date <= ?')
+        params.append(query.date_to)
+
+    # Several statuses on the (status, date, id) index would re-sort every chunk; walk (date, id) instead
+    table = 'health_records'
+    if len(query.statuses) > 1 and not query.patient_id:
+        table += ' INDEXED BY idx_health_records_date'
+    select = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM {table}"
+    where = ' AND '.join(clauses)
+    first_sql = f"{select} {'WHERE ' + where if where else ''} ORDER BY date, id LIMIT ?"
+    next_sql = f"{select} WHERE {where + ' AND ' if where else ''}(date, id) > (?, ?) ORDER BY date, id LIMIT ?"
+
+    rows = conn.execute(first_sql, params + [query.chunk_size]).fetchall()
+    while rows:
+        yield rows
+        if len(rows) < query.chunk_size:
+            return
+        last = rows[-1]
+        rows = conn.execute(next_sql, params + [last[1], last[0], query.chunk_size]).fetchall()
+
+
+def _archived_chunks(store: HealthStore, query: ExportQuery,
+                     hot_start: Optional[Tuple[str, int]]) -> Iterator[List[Tuple]]:
+    for day in store.archive.days():
+        if query.date_from is not None and day < query.date_from[:10]:
+            continue
+        if query.date_to is not None and day > query.date_to[:10]:
+            return
+        if hot_start is not None and day > hot_start[0][:10]:
+            return
+        records = [r for r in reversed(store.archive.read_day(day))
+                   if query.matches(r) and (hot_start is None or (r['date'], r['id']) < hot_start)]
+        for start in range(0, len(records), query.chunk_size):
+            yield [tuple(r.get(column) for column in EXPORT_COLUMNS) for r in records[start:start + query.chunk_size]]
+
+
+# --- Encoders ----------------------------------------------------------------
+
+class CsvEncoder:
+    mimetype = 'text/csv'
+    extension = 'csv'
+
+    def header(self) -> bytes:
+        return self._rows([EXPORT_COLUMNS])
+
+    def encode(self, rows: List[Tuple]) -> bytes:
+        return self._rows(rows)
+
+    def footer(self) -> bytes:
+        return b''
+
+    @staticmethod
+    def _rows(rows) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator='\n').writerows(rows)
+        return buffer.getvalue().encode('utf-8')
+
+
+class NdjsonEncoder:
+    mimetype = 'application/x-ndjson'
+    extension = 'ndjson'
+
+    def header(self) -> bytes:
+        return b''
+
+    _json = json.JSONEncoder(separators=(',', ':'))
+
+    def encode(self, rows: List[Tuple]) -> bytes:
+        encode = self._json.encode
+        return ''.join(encode(dict(zip(EXPORT_COLUMNS, row))) + '\n' for row in rows).encode('utf-8')
+
+    def footer(self) -> bytes:
+        return b''
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last drain"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+class ParquetEncoder:
+    """One Parquet row group per chunk; the footer is written at the end"""
+    mimetype = 'application/vnd.apache.parquet'
+    extension = 'parquet'
+
+    TYPES = {'id': 'int64', 'score': 'int64', 'age': 'int64', 'heart_rate': 'int64', 'bp_sys': 'int64',
+             'bp_dia': 'int64', 'spo2': 'int64', 'temperature': 'float64'}
+
+    def __init__(self):
+        if pyarrow is None:
+            raise ValueError('Parquet export needs the pyarrow package')
+        self.schema = pyarrow.schema([
+            (column, getattr(pyarrow, self.TYPES.get(column, 'string'))()) for column in EXPORT_COLUMNS
+        ])
+        self._sink = _Sink()
+        self._writer = pyarrow.parquet.ParquetWriter(self._sink, self.schema, compression='zstd')
+
+    def header(self) -> bytes:
+        return self._sink.drain()
+
+    def encode(self, rows: List[Tuple]) -> bytes:
+        columns = list(zip(*rows))
+        arrays = [self._array(values, field.type) for values, field in zip(columns, self.schema)]
+        self._writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+        return self._sink.drain()
+
+    def footer(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+    @staticmethod
+    def _array(values, arrow_type):
+        try:
+            return pyarrow.array(values, type=arrow_type)
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+            # SQLite columns are loosely typed; values that don't fit the column become null
+            return pyarrow.array([_coerce(value, arrow_type) for value in values], type=arrow_type)
+
+
+def _coerce(value, arrow_type):
+    if value is None:
+        return None
+    try:
+        if pyarrow.types.is_integer(arrow_type):
+            return int(float(value))
+        if pyarrow.types.is_floating(arrow_type):
+            return float(value)
+        return str(value)
+    except (TypeError, ValueError):
+        return None
+
+
+ENCODERS = {'csv': CsvEncoder, 'ndjson': NdjsonEncoder, 'parquet': ParquetEncoder}
+
+
+def encoder_for(format_name: str):
+    encoder = ENCODERS.get(format_name)
+    if encoder is None:
+        raise ValueError(f"format must be one of {', '.join(ENCODERS)}")
+    return encoder()
+
+
+def export_stream(store: HealthStore, query: ExportQuery, encoder,
+                  progress: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """Encoded export, one piece per chunk; `progress` is called with each chunk's row count"""
+    header = encoder.header()
+    if header:
+        yield header
+    for rows in iter_chunks(store, query):
+        if progress is not None:
+            progress(len(rows))
+        data = encoder.encode(rows)
+        if data:
+            yield data
+    footer = encoder.footer()
+    if footer:
+        yield footer
+
+
+def export_filename(encoder) -> str:
+    return f"health_records-{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.{encoder.extension}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream health_records to CSV, NDJSON or Parquet')
+    parser.add_argument('--format', default='csv', choices=sorted(ENCODERS))
+    parser.add_argument('--from', dest='date_from', help='YYYY-MM-DD or ISO timestamp (UTC)')
+    parser.add_argument('--to', dest='date_to', help='YYYY-MM-DD or ISO timestamp (UTC)')
+    parser.add_argument('--status', default='', help='Comma-separated statuses')
+    parser.add_argument('--patient', help='Only this patient_id')
+    parser.add_argument('--archive', action='store_true', help='Include records moved to the retention archive')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--output', help='File to write (default: stdout)')
+    args = parser.parse_args()
+
+    try:
+        query = ExportQuery(args.date_from, args.date_to, [s for s in args.status.split(',') if s],
+                            args.patient, args.archive, args.chunk_size)
+        encoder = encoder_for(args.format)
+    except ValueError as e:
+        parser.error(str(e))
+
+    store = get_store()
+    store.init_schema()
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for data in export_stream(store, query, encoder):
+            out.write(data)
+    finally:
+        if args.output:
+            out.close()
+        else:
+            out.flush()
+
+
+if __name__ == '__main__':
+    main()
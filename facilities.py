@@ -0,0 +1,113 @@
+"""
+Overpass result pipeline: element parsing and nearest-k ranking.
+
+Responses come from an `out center;` query, so ways carry a real center
+point and there is no trailing node dump to skip. `iter_facilities` walks
+the elements once and yields only tagged nodes and ways. A `FacilitySet`
+stores the coordinates as NumPy arrays (radians, with the cosine
+precomputed) next to the facility dicts. The tile cache keeps that set, so
+each lookup only runs one vectorized haversine over the tile, then an
+O(n) partition that picks the k nearest, and sorts just those k. Facilities
+sharing a name are collapsed to the nearest one only after that ranking, so
+a copy outside the search radius can't hide one inside it.
+"""
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+
+UNNAMED = 'Unnamed Medical Facility'
+
+
+def iter_facilities(elements: Iterable[Dict]) -> Iterator[Dict]:
+    """
+    Medical facilities from Overpass elements, de-duplicated by name and position
+    (same-named ones elsewhere are left to `FacilitySet.nearest`)
+    Yields: {'name', 'lat', 'lon', 'tags'}
+    """
+    seen = set()  # Avoid duplicates
+    for element in elements:
+        tags = element.get('tags')
+        if not tags:
+            # Untagged geometry nodes are not facilities
+            continue
+        if element.get('type') == 'node':
+            lat, lon = element.get('lat'), element.get('lon')
+        else:
+            center = element.get('center') or {}
+            lat, lon = center.get('lat'), center.get('lon')
+        if lat is None or lon is None:
+            continue
+
+        name = tags.get('name', tags.get('operator', UNNAMED))
+        key = (name, round(lat, 4), round(lon, 4))
+        if key in seen:
+            continue
+        seen.add(key)
+        yield {'name': name, 'lat': lat, 'lon': lon, 'tags': tags}
+
+
+class FacilitySet:
+    """Facility dicts plus coordinate arrays for vectorized distance queries"""
+
+    def __init__(self, facilities: Sequence[Dict]):
+        self.facilities = list(facilities)
+        self._lat = np.radians(np.array([f['lat'] for f in self.facilities], dtype=float))
+        self._lon = np.radians(np.array([f['lon'] for f in self.facilities], dtype=float))
+        self._cos_lat = np.cos(self._lat)
+
+    @classmethod
+    def from_elements(cls, elements: Iterable[Dict]) -> 'FacilitySet':
+        return cls(list(iter_facilities(elements)))
+
+    def __len__(self) -> int:
+        return len(self.facilities)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.facilities)
+
+    def __getitem__(self, index):
+        return self.facilities[index]
+
+    def distances_km(self, latitude: float, longitude: float) -> np.ndarray:
+        """Great-circle distance from a point to every facility"""
+        lat1 = np.radians(latitude)
+        lon1 = np.radians(longitude)
+        a = (np.sin((self._lat - lat1) / 2) ** 2 +
+             np.cos(lat1) * self._cos_lat * np.sin((self._lon - lon1) / 2) ** 2)
+        return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    def nearest(self, latitude: float, longitude: float, radius: int, k: int = 5) -> List[Tuple[float, Dict]]:
+        """
+        The k nearest facilities within `radius` metres. Of several with the same name
+        (e.g. a hospital mapped as a node and as a building) only the nearest is kept;
+        unnamed facilities are all kept.
+        Returns: [(distance_km, facility), ...] sorted by distance
+        """
+        if not self.facilities or k <= 0:
+            return []
+        distances = self.distances_km(latitude, longitude)
+        within = np.flatnonzero(distances <= radius / 1000)
+        # Partition for the k nearest, and widen only if same-named ones leave fewer than k
+        take = k
+        while True:
+            candidates = within
+            if len(within) > take:
+                candidates = within[np.argpartition(distances[within], take - 1)[:take]]
+            candidates = candidates[np.argsort(distances[candidates], kind='stable')]
+            nearest = []
+            seen_names = set()
+            for i in candidates:
+                name = self.facilities[i]['name']
+                if name in seen_names:
+                    continue
+                if name != UNNAMED:
+                    seen_names.add(name)
+                nearest.append((float(distances[i]), self.facilities[i]))
+                if len(nearest) == k:
+                    return nearest
+            if len(candidates) == len(within):
+                return nearest
+            take *= 2
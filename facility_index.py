@@ -0,0 +1,299 @@
+"""
+Offline spatial index of medical facilities.
+
+Facilities are bucketed into a uniform lat/lon grid and stored as compact
+arrays (sorted by cell) in a single binary file, so nearest-hospital queries
+only touch the handful of cells overlapping the search radius and never need
+a network call.
+
+Import an OSM extract or a dump of hospital/clinic nodes and ways:
+
+    python facility_index.py import city.osm --output database/facilities.idx
+    python facility_index.py import overpass.json
+    python facility_index.py import hospitals.csv
+
+Supported inputs: OSM XML (.osm), Overpass/OSM JSON (.json) and CSV with
+`name,lat,lon` columns (any other column is kept as a tag).
+"""
+import argparse
+import csv
+import heapq
+import json
+import struct
+import xml.etree.ElementTree as ET
+from array import array
+from math import cos, radians, sin, sqrt, atan2, floor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+INDEX_MAGIC = b'FIDX'
+INDEX_VERSION = 1
+HEADER_FORMAT = '<4sHdII'  # magic, version, cell_size, facility count, cell count
+
+MEDICAL_AMENITIES = ('hospital', 'clinic')
+DEFAULT_CELL_SIZE = 0.05  # degrees (~5.5 km of latitude)
+KM_PER_DEGREE = 111.32
+EARTH_RADIUS_KM = 6371
+
+
+def _cell_coords(latitude: float, longitude: float, cell_size: float) -> Tuple[int, int]:
+    return floor((latitude + 90) / cell_size), floor((longitude + 180) / cell_size)
+
+
+def _cell_key(row: int, col: int, cell_size: float) -> int:
+    cols = int(360 / cell_size) + 1
+    return row * cols + (col % cols)
+
+
+class FacilityIndex:
+    """Read-only grid index over facilities loaded from an index file"""
+
+    def __init__(self, cell_size: float, latitudes: array, longitudes: array,
+                 cell_keys: array, cell_offsets: array, metadata: List[Dict]):
+        self.cell_size = cell_size
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.metadata = metadata
+        # cell key -> (start, end) slice into the coordinate arrays
+        self._cells = {
+            cell_keys[i]: (cell_offsets[i], cell_offsets[i + 1])
+            for i in range(len(cell_keys))
+        }
+
+    def __len__(self) -> int:
+        return len(self.latitudes)
+
+    @classmethod
+    def build(cls, facilities: Iterable[Dict], cell_size: float = DEFAULT_CELL_SIZE) -> 'FacilityIndex':
+        """Build an index from facilities shaped like {'name', 'lat', 'lon', 'tags'}"""
+        keyed = []
+        for facility in facilities:
+            row, col = _cell_coords(facility['lat'], facility['lon'], cell_size)
+            keyed.append((_cell_key(row, col, cell_size), facility))
+        keyed.sort(key=lambda item: item[0])
+
+        latitudes, longitudes = array('d'), array('d')
+        cell_keys, cell_offsets = array('q'), array('I')
+        metadata = []
+        for position, (key, facility) in enumerate(keyed):
+            if not cell_keys or cell_keys[-1] != key:
+                cell_keys.append(key)
+                cell_offsets.append(position)
+            latitudes.append(facility['lat'])
+            longitudes.append(facility['lon'])
+            metadata.append({'name': facility['name'], 'tags': facility.get('tags', {})})
+        cell_offsets.append(len(keyed))
+
+        return cls(cell_size, latitudes, longitudes, cell_keys, cell_offsets, metadata)
+
+    def save(self, path: str):
+        """Write the index as header + little-endian arrays + JSON metadata"""
+        cell_keys = array('q', sorted(self._cells))
+        cell_offsets = array('I', [self._cells[key][0] for key in cell_keys] + [len(self)])
+        arrays = [cell_keys, cell_offsets, self.latitudes, self.longitudes]
+        metadata = json.dumps(self.metadata, separators=(',', ':')).encode('utf-8')
+
+        with open(path, 'wb') as f:
+            f.write(struct.pack(HEADER_FORMAT, INDEX_MAGIC, INDEX_VERSION,
+                                self.cell_size, len(self), len(cell_keys)))
+            for values in arrays:
+                f.write(values.tobytes())
+            f.write(metadata)
+
+    @classmethod
+    def load(cls, path: str) -> 'FacilityIndex':
+        """Load an index file written by `save`"""
+        with open(path, 'rb') as f:
+            header = f.read(struct.calcsize(HEADER_FORMAT))
+            magic, version, cell_size, count, cells = struct.unpack(HEADER_FORMAT, header)
+            if magic != INDEX_MAGIC or version != INDEX_VERSION:
+                raise ValueError(f"{path} is not a facility index (version {INDEX_VERSION})")
+
+            def read_array(typecode: str, length: int) -> array:
+                values = array(typecode)
+                values.frombytes(f.read(values.itemsize * length))
+                return values
+
+            cell_keys = read_array('q', cells)
+            cell_offsets = read_array('I', cells + 1)
+            latitudes = read_array('d', count)
+            longitudes = read_array('d', count)
+            metadata = json.loads(f.read().decode('utf-8'))
+
+        return cls(cell_size, latitudes, longitudes, cell_keys, cell_offsets, metadata)
+
+    def nearest(self, latitude: float, longitude: float, radius: int, k: int = 5) -> List[Tuple[float, Dict]]:
+        """
+        The k nearest facilities within `radius` metres
+        Returns: [(distance_km, {'name', 'lat', 'lon', 'tags'}), ...] sorted by distance
+        """
+        radius_km = radius / 1000
+        lat_span = radius_km / KM_PER_DEGREE
+        lon_span = radius_km / (KM_PER_DEGREE * max(cos(radians(latitude)), 0.01))
+
+        row_min, col_min = _cell_coords(latitude - lat_span, longitude - lon_span, self.cell_size)
+        row_max, col_max = _cell_coords(latitude + lat_span, longitude + lon_span, self.cell_size)
+
+        lat1, lon1 = radians(latitude), radians(longitude)
+        cos_lat1 = cos(lat1)
+        lats, lons = self.latitudes, self.longitudes
+        heap = []  # max-heap on distance via negation
+
+        for row in range(row_min, row_max + 1):
+            for col in range(col_min, col_max + 1):
+                bounds = self._cells.get(_cell_key(row, col, self.cell_size))
+                if bounds is None:
+                    continue
+                for i in range(bounds[0], bounds[1]):
+                    # Cheap bounding-box rejection before the trigonometry
+                    if abs(lats[i] - latitude) > lat_span:
+                        continue
+                    lat2 = radians(lats[i])
+                    a = sin((lat2 - lat1) / 2) ** 2 + cos_lat1 * cos(lat2) * sin((radians(lons[i]) - lon1) / 2) ** 2
+                    distance = EARTH_RADIUS_KM * 2 * atan2(sqrt(a), sqrt(1 - a))
+                    if distance > radius_km:
+                        continue
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-distance, i))
+                    elif -heap[0][0] > distance:
+                        heapq.heapreplace(heap, (-distance, i))
+
+        results = []
+        for negative_distance, i in sorted(heap, reverse=True):
+            facility = dict(self.metadata[i], lat=lats[i], lon=lons[i])
+            results.append((-negative_distance, facility))
+        return results
+
+
+def _facility_from_tags(tags: Dict, lat: Optional[float], lon: Optional[float]) -> Optional[Dict]:
+    if tags.get('amenity') not in MEDICAL_AMENITIES or lat is None or lon is None:
+        return None
+    name = tags.get('name', tags.get('operator', 'Unnamed Medical Facility'))
+    return {'name': name, 'lat': float(lat), 'lon': float(lon), 'tags': tags}
+
+
+def _centroid(refs: List[int], nodes: Dict[int, Tuple[float, float]]) -> Tuple[Optional[float], Optional[float]]:
+    points = [nodes[ref] for ref in refs if ref in nodes]
+    if not points:
+        return None, None
+    return sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points)
+
+
+def read_osm_json(path: str) -> List[Dict]:
+    """Facilities from Overpass/OSM JSON (`out body; >; out skel` or `out center`)"""
+    with open(path, encoding='utf-8') as f:
+        elements = json.load(f).get('elements', [])
+
+    nodes = {e['id']: (e['lat'], e['lon']) for e in elements
+             if e.get('type') == 'node' and 'lat' in e}
+    facilities = []
+    for element in elements:
+        tags = element.get('tags', {})
+        if element.get('type') == 'node':
+            lat, lon = element.get('lat'), element.get('lon')
+        elif element.get('type') == 'way':
+            center = element.get('center')
+            if center:
+                lat, lon = center['lat'], center['lon']
+            else:
+                lat, lon = _centroid(element.get('nodes', []), nodes)
+        else:
+            continue
+        facility = _facility_from_tags(tags, lat, lon)
+        if facility:
+            facilities.append(facility)
+    return facilities
+
+
+def read_osm_xml(path: str) -> List[Dict]:
+    """Facilities from an OSM XML extract, streamed with iterparse"""
+    nodes = {}
+    facilities = []
+
+    for _, elem in ET.iterparse(path, events=('end',)):
+        if elem.tag == 'node':
+            lat, lon = float(elem.get('lat')), float(elem.get('lon'))
+            nodes[int(elem.get('id'))] = (lat, lon)
+            tags = {t.get('k'): t.get('v') for t in elem.findall('tag')}
+            facility = _facility_from_tags(tags, lat, lon)
+            if facility:
+                facilities.append(facility)
+            elem.clear()
+        elif elem.tag == 'way':
+            tags = {t.get('k'): t.get('v') for t in elem.findall('tag')}
+            if tags.get('amenity') in MEDICAL_AMENITIES:
+                refs = [int(nd.get('ref')) for nd in elem.findall('nd')]
+                facility = _facility_from_tags(tags, *_centroid(refs, nodes))
+                if facility:
+                    facilities.append(facility)
+            elem.clear()
+
+    return facilities
+
+
+def read_csv(path: str) -> List[Dict]:
+    """Facilities from a CSV dump with name, lat and lon columns"""
+    facilities = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            tags = {k: v for k, v in row.items() if k not in ('name', 'lat', 'lon') and v}
+            tags.setdefault('amenity', 'hospital')
+            facilities.append({
+                'name': row.get('name') or 'Unnamed Medical Facility',
+                'lat': float(row['lat']),
+                'lon': float(row['lon']),
+                'tags': tags
+            })
+    return facilities
+
+
+def import_facilities(input_path: str, output_path: str, cell_size: float = DEFAULT_CELL_SIZE) -> FacilityIndex:
+    """Read an extract/dump, deduplicate by name and position, and write the index"""
+    if input_path.endswith('.csv'):
+        facilities = read_csv(input_path)
+    elif input_path.endswith('.json'):
+        facilities = read_osm_json(input_path)
+    else:
+        facilities = read_osm_xml(input_path)
+
+    seen = set()
+    unique = []
+    for facility in facilities:
+        key = (facility['name'], round(facility['lat'], 4), round(facility['lon'], 4))
+        if key not in seen:
+            seen.add(key)
+            unique.append(facility)
+
+    index = FacilityIndex.build(unique, cell_size)
+    index.save(output_path)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Medical facility spatial index')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help='Build an index from an OSM extract, JSON or CSV dump')
+    import_parser.add_argument('input')
+    import_parser.add_argument('--output', default='database/facilities.idx')
+    import_parser.add_argument('--cell-size', type=float, default=DEFAULT_CELL_SIZE,
+                               help='Grid cell size in degrees')
+
+    query_parser = subparsers.add_parser('query', help='Nearest facilities around a point')
+    query_parser.add_argument('latitude', type=float)
+    query_parser.add_argument('longitude', type=float)
+    query_parser.add_argument('--index', default='database/facilities.idx')
+    query_parser.add_argument('--radius', type=int, default=5000)
+    query_parser.add_argument('-k', type=int, default=5)
+
+    args = parser.parse_args()
+    if args.command == 'import':
+        index = import_facilities(args.input, args.output, args.cell_size)
+        print(f"Indexed {len(index)} facilities into {args.output}")
+    else:
+        index = FacilityIndex.load(args.index)
+        for distance, facility in index.nearest(args.latitude, args.longitude, args.radius, args.k):
+            print(f"{distance:6.2f} km  {facility['name']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""
+gunicorn settings for the async serving mode (see asgi.py):
+
+    gunicorn -c gunicorn_asgi.conf.py asgi:app
+
+Each uvicorn worker runs one event loop, so a worker keeps serving while
+/find_hospitals requests wait on Overpass. Workers share one port, so their
+metrics are combined through METRICS_MULTIPROC_DIR (see metrics.py): a
+scrape of /metrics on any worker reports the whole server.
+"""
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = 'uvicorn.workers.UvicornWorker'
+
+# Above the longest hospital search deadline (HOSPITAL_SEARCH_MAX_DEADLINE)
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Per-server directory of metrics snapshots; set before the workers are forked
+os.environ.setdefault('METRICS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), f'health-metrics-{os.getpid()}'))
+
+
+def on_starting(server):
+    # Snapshots of a previous run would be summed into this one's counters
+    directory = os.environ['METRICS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def on_exit(server):
+    shutil.rmtree(os.environ['METRICS_MULTIPROC_DIR'], ignore_errors=True)
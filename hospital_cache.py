@@ -0,0 +1,279 @@
+"""
+Geo-tiled cache for nearby hospital lookups.
+
+Queries are bucketed into geohash tiles. Each tile stores the full set of
+medical facilities around its center (padded so that any point inside the
+tile is covered by the requested radius), so every caller in the same tile
+is served from one upstream fetch and distances are recomputed locally for
+the caller's exact position.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from math import cos, radians, sqrt
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Metres per degree of latitude (roughly constant over the globe)
+METERS_PER_DEGREE = 111320
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int = 5) -> str:
+    """Encode a coordinate as a geohash string of the given precision"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(geohash) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits = bits << 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits = bits << 1
+                lat_range[1] = mid
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(geohash)
+
+
+def geohash_bounds(geohash: str) -> Tuple[float, float, float, float]:
+    """
+    Decode a geohash into its bounding box
+    Returns: (lat_min, lat_max, lon_min, lon_max)
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lon_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if bit:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def tile_center_and_padding(geohash: str) -> Tuple[float, float, int]:
+    """
+    Center of a geohash tile and its half-diagonal in metres
+    Returns: (latitude, longitude, padding_m)
+    """
+    lat_min, lat_max, lon_min, lon_max = geohash_bounds(geohash)
+    center_lat = (lat_min + lat_max) / 2
+    center_lon = (lon_min + lon_max) / 2
+
+    # Use the tile edge closest to the equator, where a degree of longitude is widest
+    widest_lat = min(abs(lat_min), abs(lat_max)) if lat_min * lat_max > 0 else 0.0
+    height_m = (lat_max - lat_min) * METERS_PER_DEGREE
+    width_m = (lon_max - lon_min) * METERS_PER_DEGREE * cos(radians(widest_lat))
+    padding_m = int(sqrt(height_m ** 2 + width_m ** 2) / 2) + 1
+
+    return center_lat, center_lon, padding_m
+
+
+class _TileEntry:
+    """Cached facility set for one (tile, radius) key"""
+    __slots__ = ('facilities', 'fetched_at', 'refreshing')
+
+    def __init__(self, facilities: List[Dict], fetched_at: float):
+        self.facilities = facilities
+        self.fetched_at = fetched_at
+        self.refreshing = False
+
+
+class HospitalTileCache:
+    """
+    TTL + LRU cache of medical facilities keyed on (geohash tile, radius).
+
+    `loader(latitude, longitude, radius)` must return the facilities around a
+    point and raise on upstream failure; failures are never cached.
+
+    With `stale_while_revalidate` enabled, an entry older than `ttl` but
+    younger than `ttl + stale_ttl` is returned immediately while a single
+    background refresh replaces it.
+    """
+
+    def __init__(self, loader: Callable[[float, float, int], List[Dict]],
+                 precision: int = 5, ttl: float = 900, max_tiles: int = 512,
+                 stale_while_revalidate: bool = True, stale_ttl: float = 3600):
+        self.loader = loader
+        self.precision = precision
+        self.ttl = ttl
+        self.max_tiles = max_tiles
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_ttl = stale_ttl
+
+        self._entries: 'OrderedDict[Tuple[str, int], _TileEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'refreshes': 0,
+            'refresh_errors': 0,
+            'evictions': 0
+        }
+
+    def tile_for(self, latitude: float, longitude: float) -> str:
+        """Geohash tile containing a coordinate"""
+        return geohash_encode(latitude, longitude, self.precision)
+
+    def get(self, latitude: float, longitude: float, radius: int) -> List[Dict]:
+        """
+        Facilities covering `radius` metres around the given point.
+        The returned list may contain facilities slightly outside the radius;
+        callers filter by their exact distance.
+        """
+        key = (self.tile_for(latitude, longitude), radius)
+        facilities, refresh = self._lookup(key)
+        if facilities is not None:
+            if refresh:
+                threading.Thread(target=self._refresh, args=(key,), daemon=True).start()
+            return facilities
+
+        facilities = self._load(key)
+        self._store(key, facilities)
+        return facilities
+
+    async def get_async(self, latitude: float, longitude: float, radius: int,
+                        loader: Callable[[float, float, int], Awaitable[List[Dict]]]) -> List[Dict]:
+        """
+        `get` for asyncio callers: misses and stale refreshes await `loader` (an async
+        counterpart of the constructor's loader) on the running event loop
+        """
+        key = (self.tile_for(latitude, longitude), radius)
+        facilities, refresh = self._lookup(key)
+        if facilities is not None:
+            if refresh:
+                asyncio.ensure_future(self._refresh_async(key, loader))
+            return facilities
+
+        # Shielded so the tile is still stored when the caller gives up waiting
+        task = asyncio.ensure_future(self._load_async(key, loader))
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return await asyncio.shield(task)
+
+    async def _load_async(self, key: Tuple[str, int],
+                          loader: Callable[[float, float, int], Awaitable[List[Dict]]]) -> List[Dict]:
+        center_lat, center_lon, padding = tile_center_and_padding(key[0])
+        facilities = await loader(center_lat, center_lon, key[1] + padding)
+        self._store(key, facilities)
+        return facilities
+
+    def _lookup(self, key: Tuple[str, int]) -> Tuple[Optional[List[Dict]], bool]:
+        """
+        Cached facilities for a key (None on a miss), and whether the caller
+        should start the background refresh of a stale entry
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.fetched_at
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self._counters['hits'] += 1
+                    return entry.facilities, False
+                if self.stale_while_revalidate and age < self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self._counters['stale_hits'] += 1
+                    refresh = not entry.refreshing
+                    entry.refreshing = True
+                    return entry.facilities, refresh
+            self._counters['misses'] += 1
+            return None, False
+
+    def invalidate(self, latitude: Optional[float] = None, longitude: Optional[float] = None):
+        """Drop the tile containing a point, or the whole cache when no point is given"""
+        with self._lock:
+            if latitude is None or longitude is None:
+                self._entries.clear()
+                return
+            tile = self.tile_for(latitude, longitude)
+            for key in [k for k in self._entries if k[0] == tile]:
+                del self._entries[key]
+
+    def stats(self) -> Dict:
+        """Snapshot of hit/miss counters and current size"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['tiles'] = len(self._entries)
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['hits'] + stats['stale_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _load(self, key: Tuple[str, int]) -> List[Dict]:
+        """Fetch the padded facility set for a tile from the loader"""
+        tile, radius = key
+        center_lat, center_lon, padding = tile_center_and_padding(tile)
+        return self.loader(center_lat, center_lon, radius + padding)
+
+    def _store(self, key: Tuple[str, int], facilities: List[Dict]):
+        """Insert or replace an entry, evicting least recently used tiles"""
+        with self._lock:
+            self._entries[key] = _TileEntry(facilities, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_tiles:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def _refresh(self, key: Tuple[str, int]):
+        """Background revalidation of a stale entry"""
+        try:
+            facilities = self._load(key)
+        except Exception as e:
+            self._refresh_failed(key, e)
+            return
+        self._refreshed(key, facilities)
+
+    async def _refresh_async(self, key: Tuple[str, int],
+                             loader: Callable[[float, float, int], Awaitable[List[Dict]]]):
+        """Background revalidation of a stale entry on the event loop"""
+        center_lat, center_lon, padding = tile_center_and_padding(key[0])
+        try:
+            facilities = await loader(center_lat, center_lon, key[1] + padding)
+        except Exception as e:
+            self._refresh_failed(key, e)
+            return
+        self._refreshed(key, facilities)
+
+    def _refreshed(self, key: Tuple[str, int], facilities: List[Dict]):
+        with self._lock:
+            self._counters['refreshes'] += 1
+        self._store(key, facilities)
+
+    def _refresh_failed(self, key: Tuple[str, int], error: Exception):
+        print(f"Error refreshing hospital cache tile {key[0]}: {error}")
+        with self._lock:
+            self._counters['refresh_errors'] += 1
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.refreshing = False
@@ -0,0 +1,97 @@
+"""
+Asyncio hospital search with speculative radius expansion and a hard deadline.
+
+Instead of waiting for the smallest radius to fail completely before trying
+the next one, each larger radius is launched either as soon as the previous
+one comes back empty/failed or after `hedge_delay` seconds, whichever is
+first (`hedge_delay=0` fires every radius at once). The search returns as
+soon as any radius yields enough facilities, and never runs past the
+deadline: on timeout the best partial result seen so far is returned.
+"""
+import asyncio
+from concurrent.futures import Executor
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from metrics import count_error
+
+Lookup = Callable[[float, float, int], Union[List[Dict], Awaitable[List[Dict]]]]
+
+
+async def search_expanding_radii(lookup: Lookup, latitude: float, longitude: float,
+                                 radii: Sequence[int], deadline: float,
+                                 executor: Optional[Executor] = None,
+                                 hedge_delay: float = 1.0,
+                                 min_results: int = 1) -> Tuple[List[Dict], Dict]:
+    """
+    Run `lookup(latitude, longitude, radius)` for expanding radii and return the
+    first sufficient answer. A blocking lookup runs on `executor`; a coroutine
+    function runs as a task on the current loop.
+    Returns: (hospitals, {'radius', 'timed_out', 'elapsed_ms', 'errors'})
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    end = started + deadline
+
+    pending: Dict[asyncio.Future, int] = {}
+    launched = 0
+    next_launch = started
+    best: List[Dict] = []
+    best_radius = None
+    errors = 0
+    answer = None
+
+    def launch():
+        nonlocal launched, next_launch
+        radius = radii[launched]
+        launched += 1
+        next_launch = loop.time() + hedge_delay
+        if asyncio.iscoroutinefunction(lookup):
+            future = asyncio.ensure_future(lookup(latitude, longitude, radius))
+        else:
+            future = loop.run_in_executor(executor, lookup, latitude, longitude, radius)
+        pending[future] = radius
+
+    launch()
+    while answer is None and (pending or launched < len(radii)):
+        now = loop.time()
+        if now >= end:
+            break
+        if launched < len(radii) and (not pending or now >= next_launch):
+            launch()
+            continue
+
+        wake = min(end, next_launch) if launched < len(radii) else end
+        done, _ = await asyncio.wait(pending, timeout=max(0.0, wake - now),
+                                     return_when=asyncio.FIRST_COMPLETED)
+
+        # Among radii finishing together, prefer the smallest
+        for future in sorted(done, key=lambda f: pending[f]):
+            radius = pending.pop(future)
+            try:
+                hospitals = future.result()
+            except Exception as e:
+                print(f"Hospital lookup within {radius}m failed: {e}")
+                count_error('hospital_lookup')
+                errors += 1
+                hospitals = []
+
+            if len(hospitals) >= min_results and answer is None:
+                answer = (hospitals, radius)
+            elif len(hospitals) > len(best):
+                best, best_radius = hospitals, radius
+
+            if not hospitals and launched < len(radii):
+                next_launch = loop.time()
+
+    # Lookups already running keep warming the cache, but nobody waits on them
+    for future in pending:
+        future.cancel()
+
+    timed_out = answer is None and loop.time() >= end
+    hospitals, radius = answer if answer is not None else (best, best_radius)
+    return hospitals, {
+        'radius': radius,
+        'timed_out': timed_out,
+        'elapsed_ms': round((loop.time() - started) * 1000, 1),
+        'errors': errors
+    }
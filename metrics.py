@@ -0,0 +1,342 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Counters and histograms are kept per label set behind a small lock, so
+recording costs about a microsecond. A scrape only formats the current
+values. Components that already keep their own counters (tile cache, write
+queue, ...) are folded in by registering a collector callback instead of
+being double-counted.
+
+Values are recorded per process. Behind one port, gunicorn hands each scrape
+to whichever worker accepts it, so with METRICS_MULTIPROC_DIR set every
+process also writes a snapshot of its families to that directory (every
+METRICS_FLUSH_INTERVAL seconds, at exit and before it renders a scrape). A
+scrape then sums counters and histograms over every snapshot, including
+those of workers that have exited, so totals never go backwards; gauges are
+reported per live worker with a `pid` label. The directory must be emptied
+when the server starts (gunicorn_asgi.conf.py does this).
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond scoring up to slow upstream calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (name, type, help, [(labels, value[, name suffix]), ...])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Timer:
+    """Context manager observing elapsed seconds into a histogram child"""
+    __slots__ = ('_child', '_start')
+
+    def __init__(self, child: '_HistogramChild'):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _CounterChild:
+    __slots__ = ('_lock', 'value')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ('_lock', '_buckets', 'counts', 'sum')
+
+    def __init__(self, buckets: Sequence[float]):
+        self._lock = threading.Lock()
+        self._buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional['Registry'] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            # Unlabeled metrics report 0 before their first event
+            self.labels()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Child for one label set (cache it for hot paths)"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f'{self.name} expects labels {self.labelnames}')
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _items(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def collect(self) -> Family:
+        samples = [(dict(zip(self.labelnames, key)), child.value) for key, child in self._items()]
+        return self.name, self.kind, self.documentation, samples
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional['Registry'] = None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def collect(self) -> Family:
+        samples = []
+        for key, child in self._items():
+            labels = dict(zip(self.labelnames, key))
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append(({**labels, 'le': _format_value(float(bound))}, cumulative, '_bucket'))
+            samples.append((labels, total, '_sum'))
+            samples.append((labels, cumulative, '_count'))
+        return self.name, self.kind, self.documentation, samples
+
+
+class Registry:
+    """Metrics and collector callbacks rendered together on scrape"""
+
+    def __init__(self, multiproc_dir: Optional[str] = None, flush_interval: float = 1.0):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        self._lock = threading.Lock()
+        self.multiproc_dir = multiproc_dir
+        self.flush_interval = flush_interval
+        self._flush_lock = threading.Lock()
+        if multiproc_dir:
+            self._start_flusher()
+            os.register_at_fork(after_in_child=self._start_flusher)
+            atexit.register(self.flush)
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]):
+        """`collector()` returns metric families computed at scrape time"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def collect(self) -> List[Family]:
+        """This process's families"""
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+
+        families: List[Family] = [metric.collect() for metric in metrics]
+        for collector in collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+        return families
+
+    def _start_flusher(self):
+        """Snapshot file and flush thread of this process (again after a fork)"""
+        self._snapshot_path = os.path.join(self.multiproc_dir, f'metrics-{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+        threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def _flush_loop(self):
+        path = self._snapshot_path
+        while path == self._snapshot_path:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Write this process's snapshot for the other workers' scrapes"""
+        if not self.multiproc_dir:
+            return
+        try:
+            snapshot = {'pid': os.getpid(), 'families': self.collect()}
+            with self._flush_lock:
+                os.makedirs(self.multiproc_dir, exist_ok=True)
+                temporary = f'{self._snapshot_path}.tmp'
+                with open(temporary, 'w', encoding='utf-8') as f:
+                    json.dump(snapshot, f, separators=(',', ':'))
+                os.replace(temporary, self._snapshot_path)
+        except Exception as e:
+            print(f"Error writing metrics snapshot: {e}")
+
+    def _merged(self) -> List[Family]:
+        """Families of every process that wrote a snapshot, counters and histograms summed"""
+        self.flush()
+        merged: Dict[str, List] = {}
+        totals: Dict[Tuple, float] = {}
+        for path in sorted(glob.glob(os.path.join(self.multiproc_dir, 'metrics-*.json'))):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            pid = snapshot['pid']
+            live = _alive(pid)
+            for name, kind, documentation, samples in snapshot['families']:
+                family = merged.setdefault(name, [name, kind, documentation, []])
+                for sample in samples:
+                    labels, value = sample[0], sample[1]
+                    suffix = sample[2] if len(sample) > 2 else ''
+                    if kind == 'gauge':
+                        # A level, not a total: one series per live worker
+                        if live:
+                            family[3].append(({**labels, 'pid': str(pid)}, value, suffix))
+                        continue
+                    key = (name, suffix, tuple(labels.items()))
+                    if key not in totals:
+                        family[3].append((labels, key, suffix))
+                        totals[key] = 0.0
+                    totals[key] += value
+        return [
+            (name, kind, documentation,
+             [(labels, totals[value] if kind != 'gauge' else value, suffix) for labels, value, suffix in samples])
+            for name, kind, documentation, samples in merged.values()
+        ]
+
+    def render(self) -> str:
+        """Everything in the Prometheus text exposition format (version 0.0.4)"""
+        families = self._merged() if self.multiproc_dir else self.collect()
+
+        lines = []
+        for name, kind, documentation, samples in families:
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {kind}')
+            for sample in samples:
+                labels, value = sample[0], sample[1]
+                suffix = sample[2] if len(sample) > 2 else ''
+                lines.append(f'{name}{suffix}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def stats_families(prefix: str, documentation: str, stats: Dict,
+                   counters: Iterable[str] = ()) -> List[Family]:
+    """Map a component's numeric stats() dict to gauges (and `_total` counters for `counters` keys)"""
+    counters = set(counters)
+    families = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        if key in counters:
+            families.append((f'{prefix}_{key}_total', 'counter', f'{documentation}: {key}', [({}, value)]))
+        else:
+            families.append((f'{prefix}_{key}', 'gauge', f'{documentation}: {key}', [({}, value)]))
+    return families
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+REGISTRY = Registry(
+    os.environ.get('METRICS_MULTIPROC_DIR') or None,
+    float(os.environ.get('METRICS_FLUSH_INTERVAL', 1.0))
+)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Shared hot-path instruments
+OPERATION_SECONDS = Histogram(
+    'health_operation_duration_seconds',
+    'Time spent in instrumented operations (Overpass, parsing, distance, SQLite, scoring)',
+    ['operation']
+)
+ERRORS = Counter('health_errors_total', 'Errors by code path', ['source'])
+
+
+def timed(operation: str) -> _Timer:
+    """`with timed('db_insert'):` observes the block into OPERATION_SECONDS"""
+    return OPERATION_SECONDS.labels(operation).time()
+
+
+def count_error(source: str):
+    ERRORS.labels(source).inc()
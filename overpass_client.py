@@ -0,0 +1,222 @@
+"""
+Pooled HTTP client for the Overpass API.
+
+A single `requests.Session` keeps TCP/TLS connections alive between lookups,
+retries transient upstream failures with exponential backoff, and coalesces
+concurrent identical queries (single-flight) so a burst of lookups from the
+same area results in one upstream request.
+
+`AsyncOverpassClient` offers the same behaviour on an asyncio event loop
+(httpx) for the ASGI serving mode, so a slow upstream parks a coroutine
+instead of a worker thread.
+"""
+import asyncio
+import threading
+from typing import Callable, Dict, Hashable, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import count_error, timed
+
+DEFAULT_OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+
+
+class _Call:
+    """An in-flight call that followers wait on"""
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share its result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class OverpassClient:
+    """Keep-alive, retrying, single-flight client for Overpass QL queries"""
+
+    def __init__(self, url: str = DEFAULT_OVERPASS_URL, pool_size: int = 10,
+                 retries: int = 2, backoff_factor: float = 0.5, timeout: float = 10):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'POST']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                              max_retries=retry, pool_block=False)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self.errors = 0
+
+    def query(self, query: str) -> Dict:
+        """Run an Overpass QL query and return the decoded JSON body"""
+        return self._flight.do(query, lambda: self._post(query))
+
+    def _post(self, query: str) -> Dict:
+        try:
+            with timed('overpass_request'):
+                response = self.session.post(self.url, data={'data': query}, timeout=self.timeout)
+            response.raise_for_status()
+            with timed('overpass_parse'):
+                return response.json()
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            count_error('overpass')
+            raise
+
+    def stats(self) -> Dict:
+        """Upstream request/coalescing counters"""
+        return {
+            'upstream_requests': self._flight.leaders,
+            'coalesced_requests': self._flight.coalesced,
+            'in_flight': self._flight.in_flight(),
+            'errors': self.errors
+        }
+
+    def close(self):
+        self.session.close()
+
+
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class AsyncOverpassClient:
+    """asyncio counterpart of OverpassClient: pooled, retrying, single-flight"""
+
+    def __init__(self, url: str = DEFAULT_OVERPASS_URL, pool_size: int = 10,
+                 retries: int = 2, backoff_factor: float = 0.5, timeout: float = 10):
+        self.url = url
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}  # query -> upstream task
+        self.leaders = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def _http(self) -> httpx.AsyncClient:
+        # Created on first use so it binds to the serving event loop
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            # Waiting for a free connection isn't an upstream failure; callers' deadlines bound it
+            timeout = httpx.Timeout(self.timeout, pool=None)
+            self._client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        return self._client
+
+    async def query(self, query: str) -> Dict:
+        """
+        Run an Overpass QL query and return the decoded JSON body. The upstream call
+        runs as its own task: a caller that gives up (e.g. a hedged search that already
+        has its answer) doesn't cancel it for the other callers sharing it.
+        """
+        task = self._in_flight.get(query)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(self._post(query))
+            self._in_flight[query] = task
+            task.add_done_callback(lambda done: self._finished(query, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finished(self, query: str, task: asyncio.Future):
+        self._in_flight.pop(query, None)
+        if not task.cancelled():
+            # Retrieve it so a failure nobody awaited isn't logged as unhandled
+            task.exception()
+
+    async def _post(self, query: str) -> Dict:
+        attempt = 0
+        while True:
+            try:
+                with timed('overpass_request'):
+                    response = await self._http().post(self.url, data={'data': query})
+                if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                    raise _Retry()
+                response.raise_for_status()
+                with timed('overpass_parse'):
+                    return response.json()
+            except (_Retry, httpx.TransportError):
+                attempt += 1
+                if attempt > self.retries:
+                    self.errors += 1
+                    count_error('overpass')
+                    raise
+                await asyncio.sleep(self.backoff_factor * 2 ** (attempt - 1))
+            except Exception:
+                self.errors += 1
+                count_error('overpass')
+                raise
+
+    def stats(self) -> Dict:
+        """Upstream request/coalescing counters"""
+        return {
+            'upstream_requests': self.leaders,
+            'coalesced_requests': self.coalesced,
+            'in_flight': len(self._in_flight),
+            'errors': self.errors
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class _Retry(Exception):
+    """Retryable upstream status"""
@@ -0,0 +1,239 @@
+"""
+Retention for health_records: archive, delete in chunks, reclaim space.
+
+Records older than `days` are moved to the gzip NDJSON archive
+(archive.py), oldest first, `chunk_size` rows at a time. Each chunk is
+appended and fsynced to its day file, then deleted in its own short
+transaction. The job pauses between chunks so request writers never wait
+behind one long write lock. Freed pages are then returned to the OS with
+`PRAGMA incremental_vacuum`, again in small steps. Rollups (rollups.py) are
+kept, so /stats still covers archived periods, and /health_history reads
+archived records back through HealthStore.history_page.
+
+Every worker may start the periodic job; a lock file next to the archive
+makes sure only one process runs a pass at a time.
+
+    python retention.py --days 365                # one pass
+    python retention.py --convert-vacuum          # once, for databases created before auto_vacuum
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, single-process use only
+    fcntl = None
+
+from archive import RecordArchive
+from metrics import count_error, timed
+from storage import HISTORY_COLUMNS, HealthStore, get_store
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+SELECT_EXPIRED = (
+    f"SELECT {', '.join(HISTORY_COLUMNS)} FROM health_records "
+    f"WHERE date < ? ORDER BY date, id LIMIT ?"
+)
+
+
+class RetentionManager:
+    """Moves expired records from the hot table into the archive"""
+
+    def __init__(self, store: HealthStore, archive: RecordArchive, days: float,
+                 chunk_size: int = 500, pause: float = 0.05, vacuum_pages: int = 1000):
+        if days <= 0:
+            raise ValueError('days must be positive')
+        self.store = store
+        self.archive = archive
+        self.days = days
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._counters = {'runs': 0, 'archived_rows': 0, 'chunks': 0, 'vacuumed_pages': 0,
+                          'skipped_runs': 0, 'errors': 0, 'last_run_ms': 0.0}
+        self._stats_lock = threading.Lock()
+
+    def cutoff(self, now: Optional[datetime] = None) -> str:
+        """Records dated before this (UTC, SQLite text form) are expired"""
+        now = now or datetime.utcnow()
+        return (now - timedelta(days=self.days)).strftime('%Y-%m-%d %H:%M:%S')
+
+    def run_once(self, now: Optional[datetime] = None) -> Dict:
+        """
+        One archive + delete + vacuum pass; skipped when another process is running one
+        Returns: {'archived', 'chunks', 'vacuumed_pages', 'skipped'}
+        """
+        with self._process_lock() as acquired:
+            if not acquired:
+                self._count(skipped_runs=1)
+                return {'archived': 0, 'chunks': 0, 'vacuumed_pages': 0, 'skipped': True}
+
+            start = time.perf_counter()
+            cutoff = self.cutoff(now)
+            archived = chunks = 0
+            while not self._stop.is_set():
+                moved = self._move_chunk(cutoff)
+                if not moved:
+                    break
+                archived += moved
+                chunks += 1
+                self._count(archived_rows=moved, chunks=1)
+                time.sleep(self.pause)
+
+            vacuumed = self.vacuum() if archived else 0
+            with self._stats_lock:
+                self._counters['runs'] += 1
+                self._counters['last_run_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            return {'archived': archived, 'chunks': chunks, 'vacuumed_pages': vacuumed, 'skipped': False}
+
+    def _move_chunk(self, cutoff: str) -> int:
+        """Up to chunk_size expired records from each partition"""
+        return sum(self._move_partition_chunk(partition.connection(), cutoff) for partition in self.store.partitions)
+
+    def _move_partition_chunk(self, conn, cutoff: str) -> int:
+        rows = conn.execute(SELECT_EXPIRED, (cutoff, self.chunk_size)).fetchall()
+        if not rows:
+            return 0
+        records = [dict(zip(HISTORY_COLUMNS, row)) for row in rows]
+
+        # Durable in the archive before leaving the hot table
+        with timed('archive_write'):
+            for day, group in groupby(records, key=lambda r: r['date'][:10]):
+                self.archive.append(day, group)
+
+        ids = [record['id'] for record in records]
+        try:
+            with timed('retention_delete'):
+                conn.execute(f"DELETE FROM health_records WHERE id IN ({', '.join('?' * len(ids))})", ids)
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return len(ids)
+
+    def vacuum(self) -> int:
+        """Release free pages in small steps; returns the number released (0 without auto_vacuum)"""
+        released = sum(self._vacuum_partition(partition.connection()) for partition in self.store.partitions)
+        self._count(vacuumed_pages=released)
+        return released
+
+    def _vacuum_partition(self, conn) -> int:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+            return 0
+        released = 0
+        while not self._stop.is_set():
+            free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if not free:
+                break
+            step = min(free, self.vacuum_pages)
+            with timed('incremental_vacuum'):
+                # executescript steps the pragma to completion (execute() frees a single page)
+                conn.executescript(f'PRAGMA incremental_vacuum({int(step)})')
+            released += free - conn.execute('PRAGMA freelist_count').fetchone()[0]
+            time.sleep(self.pause)
+        return released
+
+    def start(self, interval: float):
+        """Run a pass every `interval` seconds on a daemon thread (this process)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(interval,), name='health-retention', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                self._count(errors=1)
+                count_error('retention')
+                print(f"Error running retention: {e}")
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return dict(self._counters)
+
+    def _count(self, **amounts):
+        with self._stats_lock:
+            for key, amount in amounts.items():
+                self._counters[key] += amount
+
+    def _process_lock(self):
+        return _FileLock(os.path.join(self.archive.root, '.retention.lock'))
+
+
+class _FileLock:
+    """Non-blocking exclusive flock; `with` yields whether it was acquired"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self) -> bool:
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, 'a')
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self._file.close()
+            self._file = None
+            return False
+
+    def __exit__(self, *exc_info):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        return False
+
+
+def convert_to_incremental_vacuum(store: HealthStore):
+    """Switch existing databases to auto_vacuum=INCREMENTAL (a full VACUUM each; run while idle)"""
+    for partition in store.partitions:
+        conn = partition.connection()
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('VACUUM')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive and delete old health records')
+    parser.add_argument('--days', type=float, default=float(os.environ.get('RETENTION_DAYS', 365)),
+                        help='Keep this many days in the hot table')
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--pause', type=float, default=0.05, help='Seconds between chunks')
+    parser.add_argument('--convert-vacuum', action='store_true',
+                        help='Enable incremental vacuum on an existing database (one full VACUUM)')
+    args = parser.parse_args()
+
+    store = get_store()
+    store.init_schema()
+    if args.convert_vacuum:
+        convert_to_incremental_vacuum(store)
+        print(f"{', '.join(p.path for p in store.partitions)}: auto_vacuum=INCREMENTAL")
+        return
+
+    manager = RetentionManager(store, store.archive, args.days, chunk_size=args.chunk_size, pause=args.pause)
+    result = manager.run_once()
+    if result['skipped']:
+        print('Another retention pass is running')
+    else:
+        print(f"Archived {result['archived']} records older than {manager.cutoff()} to {store.archive.root} "
+              f"in {result['chunks']} chunks, released {result['vacuumed_pages']} pages")
+
+
+if __name__ == '__main__':
+    main()
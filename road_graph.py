@@ -0,0 +1,544 @@
+"""
+Offline road graph for drive-time estimates.
+
+A road network extract is turned into a directed graph whose edge weights are
+travel times in seconds (way length / speed for its highway class, or its
+`maxspeed`). At import time the graph is preprocessed into a contraction
+hierarchy. Nodes are contracted one by one, least important first, and
+shortcut edges keep the shortest paths between the remaining nodes. Every
+node gets a level above all the nodes contracted into it. Only edges between
+a node and more important ones are kept. They are stored as compact CSR
+arrays in a single binary file, with the nodes sorted by grid cell for
+snapping, the same way facility_index.py lays out facilities.
+
+A query is one multi-target search (RPHAST). A small upward search from the
+caller settles a few hundred nodes. Then one sweep runs down the hierarchy,
+one level at a time, with each level as a handful of numpy operations. The
+sweep only covers the part of the hierarchy that leads down to the
+candidate hospitals, which is selected with the same vectorised
+operations, so it touches thousands of edges, not millions.
+
+    python road_graph.py import city.osm --output database/roads.graph
+    python road_graph.py query 28.6139 77.2090 --to 28.5672,77.2100 --to 28.6353,77.2250
+
+Supported inputs: OSM XML (.osm) and Overpass/OSM JSON (.json) containing
+`highway` ways and their nodes (e.g. `way["highway"]; >; out skel qt;`).
+"""
+import argparse
+import heapq
+import json
+import re
+import struct
+import xml.etree.ElementTree as ET
+from array import array
+from math import cos, floor, radians, sqrt
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+GRAPH_MAGIC = b'RGPH'
+GRAPH_VERSION = 1
+HEADER_FORMAT = '<4sHdIIIII'  # magic, version, cell_size, nodes, up edges, down edges, levels, cells
+
+DEFAULT_CELL_SIZE = 0.005  # degrees (~550 m of latitude)
+MAX_SNAP_KM = 0.5          # points farther than this from any road are off the graph
+CONNECTOR_SPEED_KMH = 15   # from the point to its nearest road node
+KM_PER_DEGREE = 111.32
+
+# km/h by highway class when a way has no usable maxspeed
+HIGHWAY_SPEEDS = {
+    'motorway': 100, 'motorway_link': 50,
+    'trunk': 80, 'trunk_link': 40,
+    'primary': 60, 'primary_link': 35,
+    'secondary': 50, 'secondary_link': 30,
+    'tertiary': 40, 'tertiary_link': 25,
+    'unclassified': 30, 'residential': 25, 'road': 25,
+    'living_street': 10, 'service': 15
+}
+
+# Witness searches during contraction give up after settling this many nodes;
+# a missed witness only adds a redundant shortcut, never a wrong distance
+WITNESS_SETTLE_LIMIT = 500
+
+
+def _cell_coords(latitude: float, longitude: float, cell_size: float) -> Tuple[int, int]:
+    return floor((latitude + 90) / cell_size), floor((longitude + 180) / cell_size)
+
+
+def _cell_key(row: int, col: int, cell_size: float) -> int:
+    cols = int(360 / cell_size) + 1
+    return row * cols + (col % cols)
+
+
+def _flat_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Equirectangular distance in km; accurate enough between nearby road nodes"""
+    x = (lon2 - lon1) * cos(radians((lat1 + lat2) / 2))
+    return sqrt(x * x + (lat2 - lat1) ** 2) * KM_PER_DEGREE
+
+
+class RoadGraph:
+    """Read-only contraction hierarchy over a road network loaded from a graph file"""
+
+    def __init__(self, cell_size: float, latitudes: array, longitudes: array,
+                 up_offsets: array, up_heads: array, up_weights: array,
+                 down_heads: array, down_tails: array, down_weights: array, level_offsets: array,
+                 cell_keys: array, cell_offsets: array):
+        self.cell_size = cell_size
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        # Edges u -> v towards more important nodes, per u, for the search from the caller
+        self.up_offsets, self.up_heads, self.up_weights = up_offsets, up_heads, up_weights
+        # Edges u -> v from more important nodes, ordered by v's level (highest first)
+        # and then by v; level_offsets slices them into one run per level
+        self.down_heads, self.down_tails, self.down_weights = down_heads, down_tails, down_weights
+        self.level_offsets = level_offsets
+        self._cells = {
+            cell_keys[i]: (cell_offsets[i], cell_offsets[i + 1])
+            for i in range(len(cell_keys))
+        }
+        self._lats = np.frombuffer(latitudes, dtype=np.float64)
+        self._lons = np.frombuffer(longitudes, dtype=np.float64)
+        self._prepare_sweep()
+
+    def __len__(self) -> int:
+        return len(self.latitudes)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.up_heads) + len(self.down_heads)
+
+    def _prepare_sweep(self):
+        """numpy views of the down edges, and each node's run of them (its edges from above)"""
+        self._heads = np.frombuffer(self.down_heads, dtype=np.uint32).astype(np.intp)
+        self._tails = np.frombuffer(self.down_tails, dtype=np.uint32).astype(np.intp)
+        self._weights = np.frombuffer(self.down_weights, dtype=np.float32).astype(np.float64)
+        self._levels = np.frombuffer(self.level_offsets, dtype=np.uint32).astype(np.intp)
+        runs = np.flatnonzero(np.r_[True, self._heads[1:] != self._heads[:-1]]) if len(self._heads) else np.empty(0, np.intp)
+        self._run_start = np.zeros(len(self), np.intp)
+        self._run_end = np.zeros(len(self), np.intp)
+        self._run_start[self._heads[runs]] = runs
+        self._run_end[self._heads[runs]] = np.r_[runs[1:], len(self._heads)]
+
+    @classmethod
+    def build(cls, latitudes: Sequence[float], longitudes: Sequence[float],
+              edges: Iterable[Tuple[int, int, float]], cell_size: float = DEFAULT_CELL_SIZE) -> 'RoadGraph':
+        """Contract a graph of nodes 0..n-1 and directed (tail, head, seconds) edges"""
+        count = len(latitudes)
+        up, down, level = contract(count, edges)
+
+        # Renumber nodes by grid cell so that snapping reads contiguous slices
+        keyed = sorted(range(count), key=lambda node: _cell_key(
+            *_cell_coords(latitudes[node], longitudes[node], cell_size), cell_size))
+        new_id = [0] * count
+        for position, node in enumerate(keyed):
+            new_id[node] = position
+
+        lats, lons = array('d'), array('d')
+        cell_keys, cell_offsets = array('q'), array('I')
+        for position, node in enumerate(keyed):
+            key = _cell_key(*_cell_coords(latitudes[node], longitudes[node], cell_size), cell_size)
+            if not cell_keys or cell_keys[-1] != key:
+                cell_keys.append(key)
+                cell_offsets.append(position)
+            lats.append(latitudes[node])
+            lons.append(longitudes[node])
+        cell_offsets.append(count)
+
+        up_offsets, up_heads, up_weights = array('I', [0]), array('I'), array('f')
+        for node in keyed:
+            for head, seconds in up[node].items():
+                up_heads.append(new_id[head])
+                up_weights.append(seconds)
+            up_offsets.append(len(up_heads))
+
+        down_heads, down_tails, down_weights = array('I'), array('I'), array('f')
+        level_offsets = array('I')
+        by_level = sorted(keyed, key=lambda node: (-level[node], new_id[node]))
+        current = None
+        for node in by_level:
+            if level[node] != current:
+                current = level[node]
+                level_offsets.append(len(down_heads))
+            for tail, seconds in down[node].items():
+                down_heads.append(new_id[node])
+                down_tails.append(new_id[tail])
+                down_weights.append(seconds)
+        level_offsets.append(len(down_heads))
+
+        return cls(cell_size, lats, lons, up_offsets, up_heads, up_weights,
+                   down_heads, down_tails, down_weights, level_offsets, cell_keys, cell_offsets)
+
+    def save(self, path: str):
+        """Write the graph as header + little-endian arrays"""
+        cell_keys = array('q', sorted(self._cells))
+        cell_offsets = array('I', [self._cells[key][0] for key in cell_keys] + [len(self)])
+        arrays = [cell_keys, cell_offsets, self.latitudes, self.longitudes,
+                  self.up_offsets, self.up_heads, self.up_weights,
+                  self.down_heads, self.down_tails, self.down_weights, self.level_offsets]
+
+        with open(path, 'wb') as f:
+            f.write(struct.pack(HEADER_FORMAT, GRAPH_MAGIC, GRAPH_VERSION, self.cell_size, len(self),
+                                len(self.up_heads), len(self.down_heads), len(self.level_offsets), len(cell_keys)))
+            for values in arrays:
+                f.write(values.tobytes())
+
+    @classmethod
+    def load(cls, path: str) -> 'RoadGraph':
+        """Load a graph file written by `save`"""
+        with open(path, 'rb') as f:
+            header = f.read(struct.calcsize(HEADER_FORMAT))
+            magic, version, cell_size, count, up_edges, down_edges, levels, cells = struct.unpack(HEADER_FORMAT, header)
+            if magic != GRAPH_MAGIC or version != GRAPH_VERSION:
+                raise ValueError(f"{path} is not a road graph (version {GRAPH_VERSION})")
+
+            def read_array(typecode: str, length: int) -> array:
+                values = array(typecode)
+                values.frombytes(f.read(values.itemsize * length))
+                return values
+
+            cell_keys = read_array('q', cells)
+            cell_offsets = read_array('I', cells + 1)
+            latitudes = read_array('d', count)
+            longitudes = read_array('d', count)
+            up = (read_array('I', count + 1), read_array('I', up_edges), read_array('f', up_edges))
+            down = (read_array('I', down_edges), read_array('I', down_edges), read_array('f', down_edges))
+            level_offsets = read_array('I', levels)
+
+        return cls(cell_size, latitudes, longitudes, *up, *down, level_offsets, cell_keys, cell_offsets)
+
+    def snap(self, latitude: float, longitude: float,
+             max_km: float = MAX_SNAP_KM) -> Optional[Tuple[int, float]]:
+        """(nearest node, distance in km) within `max_km`, or None when off the graph"""
+        row, col = _cell_coords(latitude, longitude, self.cell_size)
+        scale = max(cos(radians(latitude)), 0.01)
+        reach = int(max_km / (self.cell_size * KM_PER_DEGREE * scale)) + 1
+        spans = [self._cells.get(_cell_key(r, c, self.cell_size))
+                 for r in range(row - reach, row + reach + 1) for c in range(col - reach, col + reach + 1)]
+        nodes = [np.arange(*span) for span in spans if span is not None]
+        if not nodes:
+            return None
+        nodes = np.concatenate(nodes)
+        x = (self._lons[nodes] - longitude) * scale
+        y = self._lats[nodes] - latitude
+        squared = x * x + y * y
+        nearest = int(np.argmin(squared))
+        distance = sqrt(squared[nearest]) * KM_PER_DEGREE
+        return (int(nodes[nearest]), distance) if distance <= max_km else None
+
+    def travel_times(self, latitude: float, longitude: float,
+                     destinations: Sequence[Tuple[float, float]]) -> List[Optional[float]]:
+        """
+        Drive time in seconds from a point to each (lat, lon) destination.
+        None where the point or a destination is off the graph or unreachable.
+        """
+        origin = self.snap(latitude, longitude)
+        if origin is None or not destinations:
+            return [None] * len(destinations)
+        source, source_km = origin
+        access = source_km / CONNECTOR_SPEED_KMH * 3600
+        snapped = [self.snap(lat, lon) for lat, lon in destinations]
+        targets = [s[0] for s in snapped if s is not None]
+        seconds = dict(zip(targets, self.times_to(source, targets).tolist())) if targets else {}
+
+        times = []
+        for point in snapped:
+            if point is None or seconds[point[0]] == float('inf'):
+                times.append(None)
+            else:
+                times.append(access + seconds[point[0]] + point[1] / CONNECTOR_SPEED_KMH * 3600)
+        return times
+
+    def times_to(self, source: int, targets: Sequence[int]) -> np.ndarray:
+        """
+        Drive time in seconds from node `source` to each target node (inf where
+        unreachable): an upward search from the source, then a sweep down the
+        hierarchy restricted to the nodes the targets can be reached from
+        """
+        seconds = np.full(len(self), np.inf)
+        upward = self._upward_search(source)
+        seconds[list(upward)] = list(upward.values())
+
+        edges = self._edges_into(np.asarray(targets, dtype=np.intp))
+        bounds = np.searchsorted(edges, self._levels)
+        for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            if start == end:
+                continue
+            level = edges[start:end]
+            heads = self._heads[level]
+            runs = np.flatnonzero(np.r_[True, heads[1:] != heads[:-1]])
+            heads = heads[runs]
+            # Every tail sits on a higher level, so it is final by the time this level is done
+            best = np.minimum.reduceat(seconds[self._tails[level]] + self._weights[level], runs)
+            seconds[heads] = np.minimum(seconds[heads], best)
+        return seconds[targets]
+
+    def _edges_into(self, targets: np.ndarray) -> np.ndarray:
+        """Sorted indices of the down edges on any downward path into `targets`"""
+        selected = np.zeros(len(self), dtype=bool)
+        selected[targets] = True
+        frontier = np.unique(targets)
+        found = []
+        while frontier.size:
+            starts, counts = self._run_start[frontier], self._run_end[frontier] - self._run_start[frontier]
+            total = int(counts.sum())
+            if not total:
+                break
+            # Concatenated ranges start..start+count of every frontier node
+            edges = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+            found.append(edges)
+            tails = self._tails[edges]
+            frontier = np.unique(tails[~selected[tails]])
+            selected[frontier] = True
+        return np.sort(np.concatenate(found)) if found else np.empty(0, np.intp)
+
+    def _upward_search(self, source: int) -> Dict[int, float]:
+        """Shortest times from `source` to every node reachable over upward edges"""
+        offsets, heads, weights = self.up_offsets, self.up_heads, self.up_weights
+        settled: Dict[int, float] = {}
+        best = {source: 0.0}
+        heap = [(0.0, source)]
+        while heap:
+            seconds, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            settled[node] = seconds
+            for i in range(offsets[node], offsets[node + 1]):
+                head = heads[i]
+                candidate = seconds + weights[i]
+                if candidate < best.get(head, float('inf')):
+                    best[head] = candidate
+                    heapq.heappush(heap, (candidate, head))
+        return settled
+
+
+def contract(count: int, edges: Iterable[Tuple[int, int, float]]
+             ) -> Tuple[List[Dict[int, float]], List[Dict[int, float]], List[int]]:
+    """
+    Contraction hierarchy preprocessing.
+    Returns (up, down, level): for each node, its edges to more important
+    nodes as {head: seconds}, its edges from more important nodes as
+    {tail: seconds} (shortcuts included), and its level, which is higher
+    than the level of every node it has an edge to in `down`.
+    """
+    out: List[Dict[int, float]] = [{} for _ in range(count)]
+    inc: List[Dict[int, float]] = [{} for _ in range(count)]
+    for tail, head, seconds in edges:
+        if tail != head and seconds < out[tail].get(head, float('inf')):
+            out[tail][head] = seconds
+            inc[head][tail] = seconds
+
+    contracted_neighbors = [0] * count
+    level = [0] * count
+
+    def simulate(node: int) -> Tuple[int, List[Tuple[int, int, float]]]:
+        """(priority, shortcuts needed to keep shortest paths through `node` once it is removed)"""
+        needed = []
+        if out[node]:
+            longest_out = max(out[node].values())
+            for tail, in_weight in inc[node].items():
+                targets = {head: in_weight + w for head, w in out[node].items() if head != tail}
+                if not targets:
+                    continue
+                witness = _witness_search(out, tail, node, in_weight + longest_out, targets)
+                for head, via in targets.items():
+                    if witness.get(head, float('inf')) > via:
+                        needed.append((tail, head, via))
+        edge_difference = len(needed) - len(inc[node]) - len(out[node])
+        return 2 * edge_difference + contracted_neighbors[node] + level[node], needed
+
+    heap = [(simulate(node)[0], node) for node in range(count)]
+    heapq.heapify(heap)
+    while heap:
+        _, node = heapq.heappop(heap)
+        # Lazy update: contract only if the node is still the least important
+        current, added = simulate(node)
+        if heap and current > heap[0][0]:
+            heapq.heappush(heap, (current, node))
+            continue
+
+        for tail in inc[node]:
+            del out[tail][node]
+        for head in out[node]:
+            del inc[head][node]
+        for tail, head, seconds in added:
+            if seconds < out[tail].get(head, float('inf')):
+                out[tail][head] = seconds
+                inc[head][tail] = seconds
+        for neighbor in set(inc[node]) | set(out[node]):
+            contracted_neighbors[neighbor] += 1
+            level[neighbor] = max(level[neighbor], level[node] + 1)
+        # What is left on the node are its edges to and from more important nodes
+
+    return out, inc, level
+
+
+def _witness_search(out: List[Dict[int, float]], source: int, skip: int, limit: float,
+                    targets: Dict[int, float]) -> Dict[int, float]:
+    """Bounded Dijkstra from `source` avoiding `skip`; shortest times found to `targets`"""
+    best = {source: 0.0}
+    settled = set()
+    found = {}
+    heap = [(0.0, source)]
+    while heap and len(settled) < WITNESS_SETTLE_LIMIT:
+        seconds, node = heapq.heappop(heap)
+        if node in settled:
+            continue
+        if seconds > limit:
+            break
+        settled.add(node)
+        if node in targets:
+            found[node] = seconds
+            if len(found) == len(targets):
+                break
+        for head, weight in out[node].items():
+            if head == skip:
+                continue
+            candidate = seconds + weight
+            if candidate < best.get(head, float('inf')):
+                best[head] = candidate
+                heapq.heappush(heap, (candidate, head))
+    return found
+
+
+# --- OSM import -----------------------------------------------------------------
+
+def way_speed(tags: Dict) -> Optional[float]:
+    """km/h for a drivable highway way, or None when cars can't use it"""
+    speed = HIGHWAY_SPEEDS.get(tags.get('highway'))
+    if speed is None or tags.get('access') in ('no', 'private') or tags.get('motor_vehicle') == 'no':
+        return None
+    match = re.match(r'\s*(\d+(?:\.\d+)?)\s*(mph)?', tags.get('maxspeed', ''))
+    if match:
+        maxspeed = float(match.group(1)) * (1.609 if match.group(2) else 1)
+        if maxspeed > 0:
+            speed = maxspeed
+    return speed
+
+
+def way_direction(tags: Dict) -> int:
+    """1 one-way along the nodes, -1 against them, 0 both ways"""
+    oneway = tags.get('oneway')
+    if oneway == '-1':
+        return -1
+    if oneway in ('yes', 'true', '1'):
+        return 1
+    if oneway in ('no', 'false', '0'):
+        return 0
+    return 1 if tags.get('junction') == 'roundabout' or tags.get('highway') == 'motorway' else 0
+
+
+def read_osm_json(path: str) -> Tuple[Dict[int, Tuple[float, float]], List[Tuple[List[int], Dict]]]:
+    """(node coordinates, drivable ways as (node refs, tags)) from Overpass/OSM JSON"""
+    with open(path, encoding='utf-8') as f:
+        elements = json.load(f).get('elements', [])
+    nodes = {e['id']: (e['lat'], e['lon']) for e in elements if e.get('type') == 'node' and 'lat' in e}
+    ways = [(e.get('nodes', []), e.get('tags', {})) for e in elements
+            if e.get('type') == 'way' and way_speed(e.get('tags', {})) is not None]
+    return nodes, ways
+
+
+def read_osm_xml(path: str) -> Tuple[Dict[int, Tuple[float, float]], List[Tuple[List[int], Dict]]]:
+    """(node coordinates, drivable ways as (node refs, tags)) from an OSM XML extract"""
+    nodes = {}
+    ways = []
+    for _, elem in ET.iterparse(path, events=('end',)):
+        if elem.tag == 'node':
+            nodes[int(elem.get('id'))] = (float(elem.get('lat')), float(elem.get('lon')))
+            elem.clear()
+        elif elem.tag == 'way':
+            tags = {t.get('k'): t.get('v') for t in elem.findall('tag')}
+            if way_speed(tags) is not None:
+                ways.append(([int(nd.get('ref')) for nd in elem.findall('nd')], tags))
+            elem.clear()
+    return nodes, ways
+
+
+def graph_from_ways(nodes: Dict[int, Tuple[float, float]], ways: List[Tuple[List[int], Dict]]
+                    ) -> Tuple[List[float], List[float], List[Tuple[int, int, float]]]:
+    """
+    (latitudes, longitudes, timed edges) of the largest connected road network;
+    islands (e.g. a car park with no way out in the extract) would otherwise
+    swallow snapped points and make them unreachable
+    """
+    index: Dict[int, int] = {}
+    edges = []
+    for refs, tags in ways:
+        speed = way_speed(tags)
+        direction = way_direction(tags)
+        refs = [ref for ref in refs if ref in nodes]
+        for a, b in zip(refs, refs[1:]):
+            u, v = index.setdefault(a, len(index)), index.setdefault(b, len(index))
+            seconds = _flat_km(*nodes[a], *nodes[b]) / speed * 3600
+            if direction >= 0:
+                edges.append((u, v, seconds))
+            if direction <= 0:
+                edges.append((v, u, seconds))
+
+    parent = list(range(len(index)))
+
+    def find(node: int) -> int:
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for u, v, _ in edges:
+        parent[find(u)] = find(v)
+    sizes: Dict[int, int] = {}
+    for node in range(len(index)):
+        root = find(node)
+        sizes[root] = sizes.get(root, 0) + 1
+    largest = max(sizes, key=sizes.get) if sizes else None
+
+    kept: Dict[int, int] = {}
+    latitudes, longitudes = [], []
+    for ref, node in index.items():
+        if find(node) == largest:
+            kept[node] = len(kept)
+            latitudes.append(nodes[ref][0])
+            longitudes.append(nodes[ref][1])
+    edges = [(kept[u], kept[v], seconds) for u, v, seconds in edges if u in kept]
+    return latitudes, longitudes, edges
+
+
+def import_roads(input_path: str, output_path: str, cell_size: float = DEFAULT_CELL_SIZE) -> RoadGraph:
+    """Read an extract, keep its drivable network, contract it and write the graph"""
+    if input_path.endswith('.json'):
+        nodes, ways = read_osm_json(input_path)
+    else:
+        nodes, ways = read_osm_xml(input_path)
+    graph = RoadGraph.build(*graph_from_ways(nodes, ways), cell_size=cell_size)
+    graph.save(output_path)
+    return graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Road graph for drive-time estimates')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help='Build a graph from an OSM XML or JSON extract')
+    import_parser.add_argument('input')
+    import_parser.add_argument('--output', default='database/roads.graph')
+    import_parser.add_argument('--cell-size', type=float, default=DEFAULT_CELL_SIZE,
+                               help='Snapping grid cell size in degrees')
+
+    query_parser = subparsers.add_parser('query', help='Drive times from a point to destinations')
+    query_parser.add_argument('latitude', type=float)
+    query_parser.add_argument('longitude', type=float)
+    query_parser.add_argument('--to', action='append', required=True, help='LAT,LON (repeatable)')
+    query_parser.add_argument('--graph', default='database/roads.graph')
+
+    args = parser.parse_args()
+    if args.command == 'import':
+        graph = import_roads(args.input, args.output, args.cell_size)
+        print(f"Contracted {len(graph)} road nodes ({graph.edge_count} edges incl. shortcuts) into {args.output}")
+    else:
+        graph = RoadGraph.load(args.graph)
+        destinations = [tuple(float(x) for x in point.split(',')) for point in args.to]
+        for (lat, lon), seconds in zip(destinations, graph.travel_times(args.latitude, args.longitude, destinations)):
+            eta = 'unreachable' if seconds is None else f"{seconds / 60:5.1f} min"
+            print(f"{eta:>12}  {lat:.5f},{lon:.5f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Hourly and daily rollups of health_records.
+
+`health_rollups` holds one row per (granularity, bucket, status) with the
+record count and the count/sum/min/max of the score and of each vital. An
+AFTER INSERT trigger upserts the hour and day rows in the same transaction
+as the record. That keeps them current for every write path (single
+inserts, batches, the write-behind queue). A range query then reads at most
+one row per bucket and status instead of scanning raw records. Vitals
+stored as 0 (not measured) are left out of their aggregates. Deleting raw
+records does not change the rollups.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Measures aggregated per bucket; for vitals 0 means "not measured"
+MEASURES = ('score', 'temperature', 'heart_rate', 'bp_sys', 'bp_dia', 'spo2')
+OPTIONAL_MEASURES = ('temperature', 'heart_rate', 'bp_sys', 'bp_dia', 'spo2')
+
+# Bucket key of a 'YYYY-MM-DD HH:MM:SS' date, in SQL and as a step in Python
+GRANULARITIES = {
+    'hour': ("strftime('%Y-%m-%d %H:00:00', {date})", timedelta(hours=1)),
+    'day': ("date({date})", timedelta(days=1)),
+}
+
+AGGREGATES = ('n', 'sum', 'min', 'max')
+ROLLUP_COLUMNS = ('bucket', 'status', 'records') + tuple(
+    f'{measure}_{aggregate}' for measure in MEASURES for aggregate in AGGREGATES
+)
+
+CREATE_HEALTH_ROLLUPS = '''
+    CREATE TABLE IF NOT EXISTS health_rollups (
+        granularity TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        status TEXT NOT NULL,
+        records INTEGER NOT NULL,
+        {measures},
+        PRIMARY KEY (granularity, bucket, status)
+    ) WITHOUT ROWID
+'''.format(measures=',\n        '.join(
+    f'{m}_n INTEGER NOT NULL, {m}_sum REAL NOT NULL, {m}_min REAL, {m}_max REAL' for m in MEASURES
+))
+
+
+def _value(measure: str, prefix: str = '') -> str:
+    column = f'{prefix}{measure}'
+    return f'NULLIF({column}, 0)' if measure in OPTIONAL_MEASURES else column
+
+
+def _backfill(granularity: str) -> str:
+    """
+    Rollup rows for records already in the table. init_schema runs the
+    migration under BEGIN IMMEDIATE, and a re-run leaves existing buckets
+    as they are instead of failing on the primary key.
+    """
+    bucket = GRANULARITIES[granularity][0].format(date='date')
+    aggregates = ', '.join(
+        f'COUNT({_value(m)}), TOTAL({_value(m)}), MIN({_value(m)}), MAX({_value(m)})' for m in MEASURES
+    )
+    return (
+        f"INSERT INTO health_rollups (granularity, {', '.join(ROLLUP_COLUMNS)}) "
+        f"SELECT '{granularity}', {bucket}, COALESCE(status, ''), COUNT(*), {aggregates} "
+        f"FROM health_records WHERE date IS NOT NULL GROUP BY 2, 3 "
+        f"ON CONFLICT (granularity, bucket, status) DO NOTHING"
+    )
+
+
+def _upsert(granularity: str) -> str:
+    """Fold the NEW record into its bucket (trigger body statement)"""
+    bucket = GRANULARITIES[granularity][0].format(date='NEW.date')
+    values = ', '.join(
+        f'{_value(m, "NEW.")} IS NOT NULL, COALESCE({_value(m, "NEW.")}, 0), {_value(m, "NEW.")}, {_value(m, "NEW.")}'
+        for m in MEASURES
+    )
+    updates = ', '.join(
+        f'{m}_n = {m}_n + excluded.{m}_n, {m}_sum = {m}_sum + excluded.{m}_sum, '
+        f'{m}_min = min(COALESCE({m}_min, excluded.{m}_min), COALESCE(excluded.{m}_min, {m}_min)), '
+        f'{m}_max = max(COALESCE({m}_max, excluded.{m}_max), COALESCE(excluded.{m}_max, {m}_max))'
+        for m in MEASURES
+    )
+    return (
+        f"INSERT INTO health_rollups (granularity, {', '.join(ROLLUP_COLUMNS)}) "
+        f"VALUES ('{granularity}', {bucket}, COALESCE(NEW.status, ''), 1, {values}) "
+        f"ON CONFLICT (granularity, bucket, status) DO UPDATE SET records = records + 1, {updates}"
+    )
+
+
+CREATE_ROLLUP_TRIGGER = (
+    'CREATE TRIGGER IF NOT EXISTS health_records_rollup AFTER INSERT ON health_records '
+    'WHEN NEW.date IS NOT NULL BEGIN '
+    + '; '.join(_upsert(granularity) for granularity in GRANULARITIES)
+    + '; END'
+)
+
+# Migration statements: table, backfill of existing records, then the trigger
+ROLLUP_MIGRATION = [CREATE_HEALTH_ROLLUPS] + [_backfill(g) for g in GRANULARITIES] + [CREATE_ROLLUP_TRIGGER]
+
+SELECT_ROLLUPS = (
+    f"SELECT {', '.join(ROLLUP_COLUMNS)} FROM health_rollups "
+    f"WHERE granularity = ? AND bucket >= ? AND bucket <= ?"
+)
+
+
+def bucket_of(granularity: str, timestamp: str) -> str:
+    """Bucket key of a 'YYYY-MM-DD HH:MM:SS' timestamp (matches the SQL expression)"""
+    if granularity == 'hour':
+        return timestamp[:13] + ':00:00'
+    return timestamp[:10]
+
+
+def bucket_count(granularity: str, first: str, last: str) -> int:
+    """Number of buckets from `first` to `last` inclusive"""
+    start = datetime.fromisoformat(first)
+    end = datetime.fromisoformat(last)
+    if end < start:
+        return 0
+    return int((end - start) / GRANULARITIES[granularity][1]) + 1
+
+
+class Aggregate:
+    """Rollup rows merged into one record count, status histogram and measure summary"""
+    __slots__ = ('records', 'statuses', 'measures')
+
+    def __init__(self):
+        self.records = 0
+        self.statuses: Dict[str, int] = {}
+        self.measures = {m: [0, 0.0, None, None] for m in MEASURES}
+
+    def add(self, row: Dict):
+        self.records += row['records']
+        self.statuses[row['status']] = self.statuses.get(row['status'], 0) + row['records']
+        for measure, acc in self.measures.items():
+            count = row[f'{measure}_n']
+            if not count:
+                continue
+            acc[0] += count
+            acc[1] += row[f'{measure}_sum']
+            low, high = row[f'{measure}_min'], row[f'{measure}_max']
+            acc[2] = low if acc[2] is None else min(acc[2], low)
+            acc[3] = high if acc[3] is None else max(acc[3], high)
+
+    def to_dict(self) -> Dict:
+        measures = {}
+        for measure, (count, total, low, high) in self.measures.items():
+            measures[measure] = {
+                'count': count,
+                'mean': round(total / count, 2) if count else None,
+                'min': low,
+                'max': high
+            }
+        return {'records': self.records, 'statuses': self.statuses, 'vitals': measures}
+
+
+def summarize(rows: Iterable[Sequence]) -> Tuple[List[Dict], Dict]:
+    """
+    Merge SELECT_ROLLUPS rows (any order) per bucket
+    Returns: ([{'bucket', 'records', 'statuses', 'vitals'}, ...] oldest first, totals over the range)
+    """
+    buckets: Dict[str, Aggregate] = {}
+    totals = Aggregate()
+    for values in rows:
+        row = dict(zip(ROLLUP_COLUMNS, values))
+        aggregate = buckets.get(row['bucket'])
+        if aggregate is None:
+            aggregate = buckets[row['bucket']] = Aggregate()
+        aggregate.add(row)
+        totals.add(row)
+    return [{'bucket': key, **buckets[key].to_dict()} for key in sorted(buckets)], totals.to_dict()
@@ -0,0 +1,260 @@
+"""
+Table-driven rule engine for health scoring and emergency classification.
+
+Rules live in a JSON file (rules/health_rules.json by default, override with
+HEALTH_RULES_PATH) and are compiled once at startup:
+
+- vital ranges become one sorted boundary array per field with precomputed
+  penalties, so a reading costs a single bisect (np.searchsorted for batches);
+- all symptom keywords become one Aho-Corasick automaton, which finds every
+  (overlapping) keyword in a single pass whose cost depends on the text
+  length rather than the number of keywords;
+- triage tables become a direct lookup from (symptom, yes-count);
+- the "trends" section (rules on rolling per-patient slopes/EWMAs) is handed
+  to trends.TrendEngine.
+
+A vital group scores the largest penalty matched by any of its fields; each
+symptom group applies its penalty at most once. Restart the workers (e.g.
+`kill -HUP` the gunicorn master) to pick up an edited rule file.
+"""
+import json
+import os
+from collections import deque
+from bisect import bisect_right
+import sys
+from math import inf, nextafter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules', 'health_rules.json')
+RULES_PATH = os.environ.get('HEALTH_RULES_PATH', DEFAULT_RULES_PATH)
+
+# Vitals are JSON numbers that order like floats; bool, NaN, +-inf and ints
+# beyond float range are rejected instead of landing in an arbitrary bucket
+VITAL_TYPES = (int, float)
+VITAL_MAX = sys.float_info.max
+
+
+def is_vital(value) -> bool:
+    """Whether a value can be scored as a vital"""
+    return type(value) in VITAL_TYPES and -VITAL_MAX <= value <= VITAL_MAX
+
+
+class _VitalField:
+    """
+    Compiled boundaries for one field: `value < t` (below) and `value > t` (above)
+    thresholds merged into one sorted array, so a reading costs a single bisect
+    """
+
+    def __init__(self, below: Sequence[Sequence[float]], above: Sequence[Sequence[float]]):
+        # value > t  <=>  value >= nextafter(t), which makes every boundary bisect_right-compatible
+        bounds = sorted(
+            [(float(t), True, penalty) for t, penalty in below] +
+            [(nextafter(float(t), inf), False, penalty) for t, penalty in above],
+            key=lambda bound: bound[0]
+        )
+        self.bounds = [value for value, _, _ in bounds]
+        # penalties[i]: largest penalty matched when bisect_right(bounds, value) == i
+        self.penalties = [
+            max([penalty for j, (_, is_below, penalty) in enumerate(bounds)
+                 if (is_below and j >= i) or (not is_below and j < i)], default=0)
+            for i in range(len(bounds) + 1)
+        ]
+        self._bounds = np.array(self.bounds)
+        self._penalties = np.array(self.penalties)
+
+    def batch_penalties(self, values: np.ndarray) -> np.ndarray:
+        return self._penalties[np.searchsorted(self._bounds, values, side='right')]
+
+
+class RuleEngine:
+    """Evaluator compiled from a rule table (see rules/health_rules.json)"""
+
+    def __init__(self, rules: Dict):
+        self.version = rules.get('version')
+        self.base_score = rules.get('base_score', 100)
+        self.defaults: Dict[str, float] = rules.get('defaults', {})
+
+        self.vital_groups: List[List[Tuple[str, _VitalField]]] = [
+            [(field, _VitalField(spec.get('below', []), spec.get('above', [])))
+             for field, spec in group['fields'].items()]
+            for group in rules.get('vitals', [])
+        ]
+        self.vital_fields = sorted({field for group in self.vital_groups for field, _ in group})
+        # Flattened per-group field tables for the scalar hot path
+        self._plan = [
+            tuple((name, self.defaults.get(name, 0), field.bounds, field.penalties) for name, field in group)
+            for group in self.vital_groups
+        ]
+
+        self._compile_symptoms(rules.get('symptoms', []))
+
+        status = rules.get('status', {})
+        thresholds = sorted(status.get('thresholds', []))
+        self._status_bounds = [t for t, _ in thresholds]
+        self._status_names = [status.get('default', 'Emergency')] + [name for _, name in thresholds]
+
+        self._compile_triage(rules.get('triage', {}))
+        # Per-patient trend rules are evaluated by trends.TrendEngine
+        self.trends: Dict = rules.get('trends', {})
+
+    @classmethod
+    def load(cls, path: str = RULES_PATH) -> 'RuleEngine':
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def _compile_symptoms(self, groups: List[Dict]):
+        """Build an Aho-Corasick automaton over every symptom keyword"""
+        self.symptom_groups = [(group['name'], group['penalty']) for group in groups]
+        goto: List[Dict[str, int]] = [{}]
+        output = [0]  # bit mask of symptom groups whose keyword ends in each state
+        keywords = set()
+        for bit, group in enumerate(groups):
+            for keyword in group['keywords']:
+                keyword = keyword.lower()
+                keywords.add(keyword)
+                state = 0
+                for char in keyword:
+                    next_state = goto[state].get(char)
+                    if next_state is None:
+                        goto.append({})
+                        output.append(0)
+                        next_state = len(goto) - 1
+                        goto[state][char] = next_state
+                    state = next_state
+                output[state] |= 1 << bit
+
+        # Breadth-first over the trie: fold failure links into full DFA transitions
+        # and inherit the outputs of every keyword that ends inside a longer one
+        fail = [0] * len(goto)
+        transitions: List[Dict[str, int]] = [{} for _ in goto]
+        transitions[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            fallback = fail[state]
+            output[state] |= output[fallback]
+            transitions[state] = {**transitions[fallback], **goto[state]}
+            for char, child in goto[state].items():
+                fail[child] = transitions[fallback].get(char, 0) if state else 0
+                queue.append(child)
+
+        self.symptom_keywords = sorted(keywords)
+        self._transitions = transitions
+        self._output = output
+        full_mask = (1 << len(groups)) - 1
+        self._mask_penalty = [
+            sum(penalty for bit, (_, penalty) in enumerate(self.symptom_groups) if mask & (1 << bit))
+            for mask in range(full_mask + 1)
+        ]
+
+    def _compile_triage(self, triage: Dict):
+        self.default_symptom = triage.get('default_symptom', 'other')
+        self._triage: Dict[str, List[Tuple[str, str]]] = {}
+        for symptom, levels in triage.get('symptoms', {}).items():
+            levels = sorted(levels, key=lambda level: level['min_yes'])
+            table = []
+            for yes_count in range(levels[-1]['min_yes'] + 1):
+                matched = [level for level in levels if level['min_yes'] <= yes_count]
+                level = matched[-1] if matched else {'severity': 'stable', 'instructions': 'stable'}
+                table.append((level['severity'], level['instructions']))
+            self._triage[symptom] = table
+        unconscious = triage.get('caretaker_unconscious')
+        self._caretaker_unconscious = (
+            (unconscious['severity'], unconscious['instructions']) if unconscious else None
+        )
+
+    def symptom_mask(self, symptoms: str) -> int:
+        """Bit mask of symptom groups with a keyword anywhere in the text (one pass)"""
+        transitions = self._transitions
+        output = self._output
+        state = 0
+        mask = 0
+        for char in symptoms.lower():
+            state = transitions[state].get(char, 0)
+            mask |= output[state]
+        return mask
+
+    def status_for(self, score: int) -> str:
+        return self._status_names[bisect_right(self._status_bounds, score)]
+
+    def score(self, data: Dict) -> Tuple[int, str]:
+        """
+        Score one record; Returns: (score, status)
+        Raises ValueError for a vital that is not a finite number or symptoms that are not text
+        """
+        score = self.base_score
+        get = data.get
+        for fields in self._plan:
+            penalty = 0
+            for name, default, bounds, penalties in fields:
+                value = get(name, default)
+                if type(value) not in VITAL_TYPES or not -VITAL_MAX <= value <= VITAL_MAX:
+                    raise ValueError(f"'{name}' must be a finite number")
+                p = penalties[bisect_right(bounds, value)]
+                if p > penalty:
+                    penalty = p
+            score -= penalty
+        symptoms = get('symptoms', '')
+        if not isinstance(symptoms, str):
+            raise ValueError("'symptoms' must be text")
+        score -= self._mask_penalty[self.symptom_mask(symptoms)]
+        return max(0, score), self.status_for(score)
+
+    def score_batch(self, columns: Dict[str, np.ndarray], symptom_masks: np.ndarray) -> Tuple[np.ndarray, List[str]]:
+        """
+        Score pre-extracted columns (one float array per vital field) and symptom masks
+        Returns: (scores, statuses)
+        """
+        score = np.full(len(symptom_masks), self.base_score, dtype=int)
+        for group in self.vital_groups:
+            penalty = None
+            for name, field in group:
+                field_penalty = field.batch_penalties(columns[name])
+                penalty = field_penalty if penalty is None else np.maximum(penalty, field_penalty)
+            score -= penalty
+        score -= np.array(self._mask_penalty)[symptom_masks]
+
+        status_index = np.searchsorted(np.array(self._status_bounds), score, side='right')
+        statuses = np.array(self._status_names)[status_index].tolist()
+        return np.maximum(score, 0), statuses
+
+    def symptom_masks(self, texts: Sequence[str]) -> np.ndarray:
+        """Symptom group masks for many texts"""
+        return np.array([self.symptom_mask(text) for text in texts], dtype=np.int64)
+
+    def classify(self, symptom: Optional[str], yes_count: int, caretaker_unconscious: bool = False) -> Tuple[str, str]:
+        """Triage severity; Returns: (severity, instructions_key)"""
+        if caretaker_unconscious and self._caretaker_unconscious:
+            return self._caretaker_unconscious
+        table = self._triage.get(symptom) if isinstance(symptom, str) else None
+        if table is None:
+            table = self._triage[self.default_symptom]
+        return table[min(max(yes_count, 0), len(table) - 1)]
+
+    def triage_symptoms(self) -> List[str]:
+        return list(self._triage)
+
+    def triage_depth(self) -> int:
+        """Yes-counts at or above this classify like the largest one of every table"""
+        return max(len(table) for table in self._triage.values())
+
+    def triage_tables(self) -> Dict:
+        """Compiled triage tables in a JSON-friendly form, for clients that classify locally"""
+        return {
+            'default_symptom': self.default_symptom,
+            'symptoms': {symptom: [list(level) for level in table] for symptom, table in self._triage.items()},
+            'caretaker_unconscious': list(self._caretaker_unconscious) if self._caretaker_unconscious else None
+        }
+
+
+_engine: Optional[RuleEngine] = None
+
+
+def get_engine() -> RuleEngine:
+    """Process-wide engine compiled from RULES_PATH on first use"""
+    global _engine
+    if _engine is None:
+        _engine = RuleEngine.load(RULES_PATH)
+    return _engine
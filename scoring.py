@@ -0,0 +1,63 @@
+"""
+Health stability scoring.
+
+Thresholds, symptom keywords and status cut-offs come from the compiled rule
+table (see rule_engine.py). `calculate_health_score` scores one record;
+`score_batch` scores many at once with NumPy and returns exactly the same
+(score, status) pairs as calling the scalar function on each record.
+"""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from metrics import timed
+from rule_engine import VITAL_MAX, VITAL_TYPES, get_engine
+
+
+def calculate_health_score(data: Dict) -> Tuple[int, str]:
+    """
+    Calculate health stability score based on input parameters
+    Returns: (score, status)
+    Score: 0-100 (higher is better)
+    Status: 'Stable', 'Monitor', 'Emergency'
+    """
+    with timed('scoring'):
+        return get_engine().score(data)
+
+
+def score_batch(records: Sequence[Dict]) -> Tuple[np.ndarray, List[str]]:
+    """
+    Score many records at once.
+    Returns: (scores as an int array, statuses) in input order.
+    Raises ValueError naming the first record with a vital that is not a finite number
+    or symptoms that are not text, the values calculate_health_score rejects.
+    """
+    engine = get_engine()
+
+    columns = {}
+    for field in engine.vital_fields:
+        default = engine.defaults.get(field, 0)
+        values = [r.get(field, default) for r in records]
+        # Every value's type is checked, as RuleEngine.score does: np.array alone would
+        # quietly turn None into NaN and accept numeric strings
+        column = None
+        if set(map(type, values)) <= set(VITAL_TYPES):
+            try:
+                column = np.array(values, dtype=float)
+            except OverflowError:
+                pass
+        if column is None or not (np.abs(column) < VITAL_MAX).all():
+            # Rare: find the offending record, or accept values right at the float limit
+            for i, value in enumerate(values):
+                if type(value) not in VITAL_TYPES or not -VITAL_MAX <= value <= VITAL_MAX:
+                    raise ValueError(f"Record {i}: '{field}' must be a finite number")
+            column = np.array(values, dtype=float)
+        columns[field] = column
+
+    texts = [r.get('symptoms', '') for r in records]
+    for i, text in enumerate(texts):
+        if not isinstance(text, str):
+            raise ValueError(f"Record {i}: 'symptoms' must be text")
+
+    with timed('scoring_batch'):
+        return engine.score_batch(columns, engine.symptom_masks(texts))
@@ -15,6 +15,7 @@ class EmergencyHealthAssistant {
             severity: null
         };
         this.currentQuestionIndex = 0;
+        this.triageCatalog = null;
         
         this.init();
     }
@@ -24,6 +25,55 @@ class EmergencyHealthAssistant {
         this.setupSpeechRecognition();
         this.getCurrentLocation();
         this.loadHealthHistory();
+        this.loadTriageCatalog();
+    }
+
+    async loadTriageCatalog() {
+        // Last catalog seen, so triage keeps working offline
+        try {
+            const stored = localStorage.getItem('triageCatalog');
+            if (stored) {
+                this.triageCatalog = JSON.parse(stored);
+            }
+        } catch (error) {
+            console.error('Error reading stored triage catalog:', error);
+        }
+
+        try {
+            // Revalidated with its ETag, so an unchanged catalog costs a 304
+            const response = await fetch('/triage_catalog');
+            const result = await response.json();
+            
+            if (result.success) {
+                this.triageCatalog = result;
+                localStorage.setItem('triageCatalog', JSON.stringify(result));
+            }
+        } catch (error) {
+            console.error('Error loading triage catalog:', error);
+        }
+    }
+
+    classifyLocally(session) {
+        // Same rules as /classify_emergency, evaluated from the triage catalog
+        const catalog = this.triageCatalog;
+        const triage = catalog.triage;
+        const yesCount = session.triageAnswers.filter(answer => answer.answer === 'yes').length;
+        
+        let level;
+        if (session.isCaretaker && session.caretakerData.conscious === 'no' && triage.caretaker_unconscious) {
+            level = triage.caretaker_unconscious;
+        } else {
+            const table = triage.symptoms[session.symptom] || triage.symptoms[triage.default_symptom];
+            level = table[Math.min(yesCount, table.length - 1)];
+        }
+
+        return {
+            success: true,
+            severity: level[0],
+            instructions: catalog.instructions[level[1]] || catalog.instructions.stable,
+            symptom: session.symptom,
+            offline: true
+        };
     }
 
     setupEventListeners() {
@@ -222,6 +272,15 @@ class EmergencyHealthAssistant {
     }
 
     async startGuidedTriage(symptom) {
+        // Questions are static: take them from the catalog when we have it
+        if (this.triageCatalog) {
+            const questions = this.triageCatalog.questions;
+            this.triageQuestions = questions[symptom] || questions.other;
+            this.currentQuestionIndex = 0;
+            this.showTriageQuestion();
+            return;
+        }
+
         this.showLoading(true);
         
         try {
@@ -287,13 +346,24 @@ class EmergencyHealthAssistant {
         document.getElementById('triageQuestions').classList.add('hidden');
         this.showLoading(true);
 
+        // Don't keep someone in an emergency waiting on a slow or overloaded server
+        const controller = new AbortController();
+        const timeout = setTimeout(() => controller.abort(), 3000);
+
         try {
             const response = await fetch('/classify_emergency', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(this.emergencySession)
+                body: JSON.stringify(this.emergencySession),
+                signal: controller.signal
             });
 
+            if (!response.ok && this.triageCatalog) {
+                // Saturated or failing server (429/503/...): classify on the device
+                this.displayEmergencyResult(this.classifyLocally(this.emergencySession));
+                return;
+            }
+
             const result = await response.json();
             
             if (result.success) {
@@ -303,8 +373,13 @@ class EmergencyHealthAssistant {
             }
         } catch (error) {
             console.error('Error:', error);
-            this.showNotification('Network error', 'error');
+            if (this.triageCatalog) {
+                this.displayEmergencyResult(this.classifyLocally(this.emergencySession));
+            } else {
+                this.showNotification('Network error', 'error');
+            }
         } finally {
+            clearTimeout(timeout);
             this.showLoading(false);
         }
     }
@@ -564,6 +639,7 @@ class EmergencyHealthAssistant {
                                     <span class="text-gray-500"><i class="fas fa-phone mr-1"></i>${hospital.phone}</span>
                                     ${hospital.rating ? `<span class="text-gray-500"><i class="fas fa-star text-yellow-500 mr-1"></i>${hospital.rating}</span>` : ''}
                                     <span class="font-semibold text-blue-600"><i class="fas fa-map-marker-alt mr-1"></i>${hospital.distance}</span>
+                                    ${hospital.eta ? `<span class="font-semibold text-blue-600"><i class="fas fa-car mr-1"></i>${hospital.eta}</span>` : ''}
                                     ${hospital.is_open === true ? '<span class="bg-green-100 text-green-800 px-2 py-1 rounded-full text-xs font-bold inline-flex items-center"><i class="fas fa-circle text-green-500 mr-1 text-xs"></i>OPEN</span>' : hospital.is_open === false ? '<span class="bg-red-100 text-red-800 px-2 py-1 rounded-full text-xs font-bold inline-flex items-center"><i class="fas fa-circle text-red-500 mr-1 text-xs"></i>CLOSED</span>' : '<span class="bg-gray-100 text-gray-600 px-2 py-1 rounded-full text-xs font-bold">Hours Unknown</span>'}
                                     ${hospital.emergency && hospital.emergency !== 'unknown' ? `<span class="bg-red-100 text-red-800 px-2 py-1 rounded-full text-xs font-bold">24/7 Emergency</span>` : ''}
                                 </div>
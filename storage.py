@@ -0,0 +1,666 @@
+"""
+SQLite storage layer for health_records.
+
+Each thread (per gunicorn worker process) keeps one long-lived connection
+configured for concurrent access: WAL journaling so readers never block the
+writer, `synchronous=NORMAL`, a larger page cache, memory-mapped reads and a
+busy timeout instead of immediate `database is locked` errors. SQL is kept
+in module constants so sqlite3's per-connection statement cache reuses the
+prepared statements.
+
+`PartitionedHealthStore` spreads the table over several such files, each
+with its own write lock, and fans reads out across them.
+
+`AsyncHealthStore` exposes the same queries as coroutines for the ASGI
+serving mode; they run on a small dedicated thread pool (each pool thread
+keeps its own connection) so SQLite never blocks the event loop.
+"""
+import asyncio
+import base64
+import heapq
+import itertools
+import json
+import math
+import os
+import sqlite3
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from archive import RecordArchive
+from metrics import timed
+from rollups import GRANULARITIES, ROLLUP_MIGRATION, SELECT_ROLLUPS, bucket_count, bucket_of, summarize
+from trends import record_time
+
+DB_PATH = os.environ.get('HEALTH_DB_PATH', 'database/health_records.db')
+# More than 1 spreads health_records over that many files (see PartitionedHealthStore)
+PARTITIONS = int(os.environ.get('HEALTH_PARTITIONS', 1))
+ARCHIVE_DIR = os.environ.get('HEALTH_ARCHIVE_DIR', os.path.join(os.path.dirname(DB_PATH) or '.', 'archive'))
+
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+CREATE_HEALTH_RECORDS = '''
+    CREATE TABLE IF NOT EXISTS health_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        age INTEGER,
+        temperature REAL,
+        heart_rate INTEGER,
+        bp_sys INTEGER,
+        bp_dia INTEGER,
+        spo2 INTEGER,
+        symptoms TEXT,
+        status TEXT,
+        score INTEGER,
+        date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+INSERT_HEALTH_RECORD = '''
+    INSERT INTO health_records
+    (age, temperature, heart_rate, bp_sys, bp_dia, spo2, symptoms, status, score, patient_id, reading_time)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def add_column(table: str, column: str, definition: str):
+    """Migration step adding a column unless it exists (ALTER TABLE ADD COLUMN has no IF NOT EXISTS)"""
+    def step(conn: sqlite3.Connection):
+        if column not in {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return step
+
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# A step is an SQL statement or a callable taking the connection; both must be safe to re-run.
+MIGRATIONS = [
+    # 1: indexes for history pagination and filtering
+    [
+        'CREATE INDEX IF NOT EXISTS idx_health_records_date ON health_records (date, id)',
+        'CREATE INDEX IF NOT EXISTS idx_health_records_status_date ON health_records (status, date, id)',
+        'CREATE INDEX IF NOT EXISTS idx_health_records_score ON health_records (score)'
+    ],
+    # 2: optional patient/session key for per-patient history and trends
+    [
+        add_column('health_records', 'patient_id', 'TEXT'),
+        'CREATE INDEX IF NOT EXISTS idx_health_records_patient_date ON health_records (patient_id, date, id)'
+    ],
+    # 3: hourly/daily rollups maintained by an insert trigger (see rollups.py)
+    ROLLUP_MIGRATION,
+    # 4: the reading's own time (epoch seconds) when the record carried a timestamp
+    [
+        add_column('health_records', 'reading_time', 'REAL')
+    ]
+]
+
+HISTORY_COLUMNS = (
+    'id', 'age', 'temperature', 'heart_rate', 'bp_sys', 'bp_dia',
+    'spo2', 'symptoms', 'status', 'score', 'date', 'patient_id'
+)
+
+# Vitals in INSERT_HEALTH_RECORD order; SQLite INTEGER is a signed 64-bit value
+RECORD_VITALS = ('age', 'temperature', 'heart_rate', 'bp_sys', 'bp_dia', 'spo2')
+SQLITE_INT_MIN, SQLITE_INT_MAX = -(1 << 63), (1 << 63) - 1
+
+TREND_COLUMNS = ('age', 'temperature', 'heart_rate', 'bp_sys', 'bp_dia', 'spo2', 'date', 'reading_time')
+
+MAX_HISTORY_PAGE = 100
+
+# How long a worker waits for another worker's migration to finish
+MIGRATION_BUSY_TIMEOUT_MS = 10 * 60 * 1000
+
+# /stats range limit and the range used when no start is given
+MAX_STATS_BUCKETS = 1000
+DEFAULT_STATS_SPAN = {'hour': timedelta(hours=24), 'day': timedelta(days=30)}
+
+
+def record_params(data: Dict, status: str, score: int) -> Tuple:
+    """
+    INSERT_HEALTH_RECORD parameters for a submitted health check.
+    Raises ValueError for a value SQLite cannot store, so that a queued row
+    can never fail the batch it is flushed with.
+    """
+    symptoms = data.get('symptoms', '')
+    if symptoms is not None and not isinstance(symptoms, str):
+        raise ValueError("'symptoms' must be text")
+    return (
+        *(column_value(field, data.get(field, 0)) for field in RECORD_VITALS),
+        symptoms,
+        status,
+        score,
+        patient_key(data),
+        record_time(data)
+    )
+
+
+def column_value(field: str, value):
+    """A vital as SQLite can bind it: None, an int within INTEGER range or a finite float"""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"'{field}' must be a number")
+    if isinstance(value, int):
+        if not SQLITE_INT_MIN <= value <= SQLITE_INT_MAX:
+            raise ValueError(f"'{field}' is out of range")
+        return int(value)
+    if not math.isfinite(value):
+        raise ValueError(f"'{field}' must be finite")
+    return float(value)
+
+
+def patient_key(data: Dict) -> Optional[str]:
+    """Patient/session key of a submitted record, or None when it has none"""
+    value = data.get('patient_id')
+    if value is None or value == '':
+        return None
+    return str(value)
+
+
+def encode_cursor(date: str, record_id: int) -> str:
+    """Opaque pagination cursor for the position after (date, id)"""
+    raw = json.dumps([date, record_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Inverse of encode_cursor; raises ValueError on malformed input"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date, record_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return str(date), int(record_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def normalize_timestamp(value: str, end_of_day: bool = False) -> str:
+    """
+    Accept 'YYYY-MM-DD' or ISO-8601 timestamps and return SQLite's
+    'YYYY-MM-DD HH:MM:SS' text form used by the date column
+    """
+    value = value.strip().replace('T', ' ').rstrip('Z')
+    if len(value) == 10:
+        value += ' 23:59:59' if end_of_day else ' 00:00:00'
+    try:
+        return datetime.fromisoformat(value).strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        raise ValueError(f'Invalid date: {value}')
+
+
+class HistoryQuery:
+    """Validated /health_history filters and keyset position; raises ValueError on bad input"""
+
+    def __init__(self, limit: int = 10, cursor: Optional[str] = None,
+                 statuses: Optional[Sequence[str]] = None,
+                 date_from: Optional[str] = None,
+                 date_to: Optional[str] = None,
+                 patient_id: Optional[str] = None):
+        self.limit = max(1, min(int(limit), MAX_HISTORY_PAGE))
+        self.before = decode_cursor(cursor) if cursor else None
+        self.statuses = statuses
+        self.date_from = normalize_timestamp(date_from) if date_from else None
+        self.date_to = normalize_timestamp(date_to, end_of_day=True) if date_to else None
+        self.patient_id = patient_id
+
+    def page(self, records: List[Dict], archive: Optional[RecordArchive]) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Finish a page from up to limit + 1 hot records, newest first
+        Returns: (records, next_cursor)
+        """
+        # Continue into the archive once the page reaches archived dates
+        if archive is not None:
+            newest = archive.newest()
+            if newest is not None and (len(records) <= self.limit or records[-1]['date'] <= newest):
+                with timed('archive_read'):
+                    archived = archive.page(self.limit + 1, self.before, self.statuses,
+                                            self.date_from, self.date_to, self.patient_id)
+                merged = {record['id']: record for record in archived}
+                merged.update((record['id'], record) for record in records)
+                records = sorted(merged.values(), key=lambda r: (r['date'], r['id']), reverse=True)[:self.limit + 1]
+
+        next_cursor = None
+        if len(records) > self.limit:
+            records = records[:self.limit]
+            last = records[-1]
+            next_cursor = encode_cursor(last['date'], last['id'])
+        return records, next_cursor
+
+
+class RollupQuery:
+    """A validated /stats range as SELECT_ROLLUPS parameters; raises ValueError on bad input"""
+
+    def __init__(self, granularity: str = 'hour', date_from: Optional[str] = None,
+                 date_to: Optional[str] = None, statuses: Optional[Sequence[str]] = None):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+        now = datetime.utcnow()
+        date_to = normalize_timestamp(date_to, end_of_day=True) if date_to else now.strftime('%Y-%m-%d %H:%M:%S')
+        if date_from:
+            date_from = normalize_timestamp(date_from)
+        else:
+            date_from = (datetime.fromisoformat(date_to) - DEFAULT_STATS_SPAN[granularity]).strftime('%Y-%m-%d %H:%M:%S')
+
+        self.granularity = granularity
+        self.first, self.last = bucket_of(granularity, date_from), bucket_of(granularity, date_to)
+        if bucket_count(granularity, self.first, self.last) > MAX_STATS_BUCKETS:
+            raise ValueError(f'Range spans more than {MAX_STATS_BUCKETS} {granularity} buckets')
+
+        self.sql = SELECT_ROLLUPS
+        self.params: List = [granularity, self.first, self.last]
+        if statuses:
+            self.sql += f" AND status IN ({', '.join('?' * len(statuses))})"
+            self.params.extend(statuses)
+
+    def result(self, rows: Iterable[Sequence]) -> Dict:
+        buckets, totals = summarize(rows)
+        return {
+            'granularity': self.granularity,
+            'from': self.first,
+            'to': self.last,
+            'buckets': buckets,
+            'totals': totals
+        }
+
+
+def trend_readings(rows: Iterable[Sequence]) -> List[Dict]:
+    """recent_rows() output (newest first) as trend engine readings, oldest first"""
+    readings = []
+    for row in reversed(list(rows)):
+        reading = dict(zip(TREND_COLUMNS, row))
+        # The date column is UTC text in SQLite's CURRENT_TIMESTAMP format
+        date = reading.pop('date').replace(' ', 'T') + '+00:00'
+        reading_time = reading.pop('reading_time')
+        reading['timestamp'] = reading_time if reading_time is not None else date
+        readings.append(reading)
+    return readings
+
+
+class HealthStore:
+    """Per-thread pool of tuned SQLite connections to the health records database"""
+
+    def __init__(self, path: str = DB_PATH, synchronous: str = 'NORMAL',
+                 cache_size_kb: int = 16384, mmap_size: int = 256 * 1024 * 1024,
+                 busy_timeout_ms: int = 5000, cached_statements: int = 64,
+                 archive: Optional[RecordArchive] = None):
+        if synchronous.upper() not in SYNCHRONOUS_MODES:
+            raise ValueError(f"synchronous must be one of {SYNCHRONOUS_MODES}")
+        self.path = path
+        self.synchronous = synchronous.upper()
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self.archive = archive  # records moved out by retention.py, read back by history_page
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use (and again after a fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        with timed('db_connect'):
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout_ms / 1000,
+                check_same_thread=False,
+                cached_statements=self.cached_statements
+            )
+            self._configure(conn)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def _configure(self, conn: sqlite3.Connection):
+        # Only takes effect on a new database (existing ones: `python retention.py --convert-vacuum`)
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        conn.execute(f'PRAGMA cache_size=-{int(self.cache_size_kb)}')
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+
+    def init_schema(self):
+        """
+        Create tables if they don't exist and apply pending migrations.
+        Every worker calls this on import, so the whole upgrade runs in one
+        BEGIN IMMEDIATE transaction: the first worker migrates while the others
+        wait on the write lock, then re-read user_version and find nothing to do.
+        """
+        conn = self.connection()
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= len(MIGRATIONS):
+            return
+
+        # A backfill over a large table can hold the lock for longer than busy_timeout
+        conn.execute(f'PRAGMA busy_timeout={MIGRATION_BUSY_TIMEOUT_MS}')
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute(CREATE_HEALTH_RECORDS)
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+                for number, statements in enumerate(MIGRATIONS, start=1):
+                    if number <= version:
+                        continue
+                    for statement in statements:
+                        if callable(statement):
+                            statement(conn)
+                        else:
+                            conn.execute(statement)
+                    conn.execute(f'PRAGMA user_version={number}')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        finally:
+            conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+
+    def insert_record(self, params: Sequence) -> int:
+        """Insert one health record in its own transaction; returns the row id"""
+        conn = self.connection()
+        try:
+            with timed('db_insert'):
+                cursor = conn.execute(INSERT_HEALTH_RECORD, params)
+            with timed('db_commit'):
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return cursor.lastrowid
+
+    def insert_records(self, rows: Sequence[Sequence]) -> int:
+        """Insert many health records in a single transaction"""
+        conn = self.connection()
+        try:
+            with timed('db_insert_many'):
+                conn.executemany(INSERT_HEALTH_RECORD, rows)
+            with timed('db_commit'):
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return len(rows)
+
+    @property
+    def partitions(self) -> List['HealthStore']:
+        """The SQLite files behind this store (see PartitionedHealthStore)"""
+        return [self]
+
+    def history_page(self, limit: int = 10, cursor: Optional[str] = None,
+                     statuses: Optional[Sequence[str]] = None,
+                     date_from: Optional[str] = None,
+                     date_to: Optional[str] = None,
+                     patient_id: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        One page of health records, newest first, using keyset pagination on (date, id)
+        Returns: (records, next_cursor) - next_cursor is None on the last page
+        """
+        query = HistoryQuery(limit, cursor, statuses, date_from, date_to, patient_id)
+        return query.page(self.history_rows(query), self.archive)
+
+    def history_rows(self, query: 'HistoryQuery') -> List[Dict]:
+        """Up to limit + 1 records from this file's table, newest first"""
+        clauses = []
+        params: List = []
+
+        if query.before:
+            clauses.append('(date, id) < (?, ?)')
+            params.extend(query.before)
+        if query.statuses:
+            clauses.append(f"status IN ({', '.join('?' * len(query.statuses))})")
+            params.extend(query.statuses)
+        if query.patient_id:
+            clauses.append('patient_id = ?')
+            params.append(query.patient_id)
+        if query.date_from:
+            clauses.append('date >= ?')
+            params.append(query.date_from)
+        if query.date_to:
+            clauses.append('date <= ?')
+            params.append(query.date_to)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        sql = (
+            f"SELECT {', '.join(HISTORY_COLUMNS)} FROM health_records {where} "
+            f"ORDER BY date DESC, id DESC LIMIT ?"
+        )
+        rows = self.connection().execute(sql, params + [query.limit + 1]).fetchall()
+        return [dict(zip(HISTORY_COLUMNS, row)) for row in rows]
+
+    def rollup_stats(self, granularity: str = 'hour', date_from: Optional[str] = None,
+                     date_to: Optional[str] = None,
+                     statuses: Optional[Sequence[str]] = None) -> Dict:
+        """
+        Per-bucket status counts and score/vital summaries from the rollup table;
+        reads one row per bucket and status, never the raw records.
+        Empty buckets are omitted. Raises ValueError on a bad granularity or range.
+        Returns: {'granularity', 'from', 'to', 'buckets', 'totals'}
+        """
+        query = RollupQuery(granularity, date_from, date_to, statuses)
+        return query.result(self.rollup_rows(query))
+
+    def rollup_rows(self, query: 'RollupQuery') -> List[Tuple]:
+        with timed('db_rollup_query'):
+            return self.connection().execute(query.sql, query.params).fetchall()
+
+    def recent_readings(self, patient_id: str, limit: int) -> List[Dict]:
+        """A patient's most recent `limit` readings, oldest first (the trend engine's history)"""
+        return trend_readings(self.recent_rows(patient_id, limit))
+
+    def recent_rows(self, patient_id: str, limit: int) -> List[Tuple]:
+        """A patient's most recent `limit` rows of TREND_COLUMNS + id, newest first"""
+        return self.connection().execute(
+            f"SELECT {', '.join(TREND_COLUMNS)}, id FROM health_records "
+            f"WHERE patient_id = ? ORDER BY date DESC, id DESC LIMIT ?",
+            (patient_id, int(limit))
+        ).fetchall()
+
+    def close(self):
+        """Close every connection opened by this store"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+
+# Partition i numbers its records from i << 40, so ids stay unique across files
+PARTITION_ID_STRIDE = 1 << 40
+
+
+def partition_paths(path: str, count: int) -> List[str]:
+    """Database files of `count` partitions; partition 0 is `path` itself"""
+    root, ext = os.path.splitext(path)
+    return [path] + [f'{root}.p{index}{ext}' for index in range(1, count)]
+
+
+class PartialInsertError(Exception):
+    """
+    Some partitions of a batch failed to commit; `rows` are the ones that were not
+    written and `indices` their positions in the batch
+    """
+
+    def __init__(self, rows: List[Sequence], error: BaseException, indices: Sequence[int] = ()):
+        super().__init__(f"{len(rows)} rows not written: {error}")
+        self.rows = rows
+        self.error = error
+        self.indices = list(indices)
+
+
+class PartitionedHealthStore:
+    """
+    health_records spread over several SQLite files, each a HealthStore with its
+    own write lock. Records go to the partition picked by a hash of their
+    patient_id (spread round-robin when they have none). Batches are split by
+    partition and written in parallel. Reads fan out to every partition and
+    k-way merge the results on (date, id), so they stay correct when the
+    partition count changes.
+    """
+
+    def __init__(self, path: str = DB_PATH, partitions: int = 4,
+                 archive: Optional[RecordArchive] = None, **options):
+        if partitions < 1:
+            raise ValueError('partitions must be at least 1')
+        self.path = path
+        self.archive = archive
+        self.partitions = [HealthStore(p, **options) for p in partition_paths(path, partitions)]
+        self._round_robin = itertools.count(os.getpid())
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = None
+        self._executor_lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        """One thread per partition, started again after a fork"""
+        with self._executor_lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=len(self.partitions),
+                                                    thread_name_prefix='health-partition')
+                self._pid = os.getpid()
+            return self._executor
+
+    def _fan_out(self, calls: Sequence[Tuple]) -> List:
+        """Run (fn, *args) calls in parallel; results in order, the first error re-raised"""
+        if len(calls) == 1:
+            fn, *args = calls[0]
+            return [fn(*args)]
+        futures = [self._pool().submit(*call) for call in calls]
+        errors = [future.exception() for future in futures]
+        for error in errors:
+            if error is not None:
+                raise error
+        return [future.result() for future in futures]
+
+    def partition_for(self, params: Sequence) -> int:
+        """Partition index of a row of INSERT_HEALTH_RECORD parameters"""
+        patient_id = params[9]
+        if patient_id is None:
+            return next(self._round_robin) % len(self.partitions)
+        return self.patient_partition(patient_id)
+
+    def patient_partition(self, patient_id: str) -> int:
+        """Partition index holding every record of a patient"""
+        return zlib.crc32(patient_id.encode('utf-8')) % len(self.partitions)
+
+    def init_schema(self):
+        """Create and migrate every partition, and start each one's ids at its own offset"""
+        for index, partition in enumerate(self.partitions):
+            partition.init_schema()
+            if index == 0:
+                continue
+            conn = partition.connection()
+            # Write-locked read, so two workers starting together can't both insert the row
+            conn.execute('BEGIN IMMEDIATE')
+            with conn:
+                row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'health_records'").fetchone()
+                if row is None:
+                    conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('health_records', ?)",
+                                 (index * PARTITION_ID_STRIDE,))
+                elif row[0] < index * PARTITION_ID_STRIDE:
+                    conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'health_records'",
+                                 (index * PARTITION_ID_STRIDE,))
+
+    def insert_record(self, params: Sequence) -> int:
+        return self.partitions[self.partition_for(params)].insert_record(params)
+
+    def insert_records(self, rows: Sequence[Sequence]) -> int:
+        """One transaction per partition, written in parallel (not atomic across partitions)"""
+        groups: Dict[int, List[int]] = {}
+        for position, params in enumerate(rows):
+            groups.setdefault(self.partition_for(params), []).append(position)
+        calls = [(self.partitions[index].insert_records, [rows[p] for p in group]) for index, group in groups.items()]
+        with timed('db_partition_write'):
+            futures = [self._pool().submit(*call) for call in calls]
+            errors = [future.exception() for future in futures]
+        failed = sorted(p for error, group in zip(errors, groups.values()) if error is not None for p in group)
+        if failed:
+            raise PartialInsertError([rows[p] for p in failed], next(error for error in errors if error is not None),
+                                     failed)
+        return len(rows)
+
+    def history_page(self, limit: int = 10, cursor: Optional[str] = None,
+                     statuses: Optional[Sequence[str]] = None,
+                     date_from: Optional[str] = None,
+                     date_to: Optional[str] = None,
+                     patient_id: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """HealthStore.history_page over every partition"""
+        query = HistoryQuery(limit, cursor, statuses, date_from, date_to, patient_id)
+        with timed('db_partition_fan_out'):
+            pages = self._fan_out([(partition.history_rows, query) for partition in self.partitions])
+        merged = heapq.merge(*pages, key=lambda r: (r['date'] or '', r['id']), reverse=True)
+        return query.page(list(itertools.islice(merged, query.limit + 1)), self.archive)
+
+    def rollup_stats(self, granularity: str = 'hour', date_from: Optional[str] = None,
+                     date_to: Optional[str] = None,
+                     statuses: Optional[Sequence[str]] = None) -> Dict:
+        """HealthStore.rollup_stats over every partition; rows of the same bucket are summed"""
+        query = RollupQuery(granularity, date_from, date_to, statuses)
+        rows = self._fan_out([(partition.rollup_rows, query) for partition in self.partitions])
+        return query.result(itertools.chain.from_iterable(rows))
+
+    def recent_readings(self, patient_id: str, limit: int) -> List[Dict]:
+        # A patient's rows all live in the partition its key hashes to
+        return trend_readings(self.partitions[self.patient_partition(patient_id)].recent_rows(patient_id, limit))
+
+    def close(self):
+        for partition in self.partitions:
+            partition.close()
+        with self._executor_lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class AsyncHealthStore:
+    """Awaitable HealthStore calls, run on a bounded thread pool"""
+
+    def __init__(self, store: HealthStore, max_workers: int = 4):
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='health-db')
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(*args, **kwargs))
+
+    async def insert_record(self, params: Sequence) -> int:
+        return await self._run(self.store.insert_record, params)
+
+    async def history_page(self, **kwargs) -> Tuple[List[Dict], Optional[str]]:
+        return await self._run(self.store.history_page, **kwargs)
+
+    async def recent_readings(self, patient_id: str, limit: int) -> List[Dict]:
+        return await self._run(self.store.recent_readings, patient_id, limit)
+
+    async def call(self, fn, *args, **kwargs):
+        """Any other blocking call that touches the database (e.g. scoring with trends)"""
+        return await self._run(fn, *args, **kwargs)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+_store: Optional[HealthStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> HealthStore:
+    """Process-wide store for the configured database (partitioned when HEALTH_PARTITIONS > 1)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            options = dict(
+                synchronous=os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+                cache_size_kb=int(os.environ.get('SQLITE_CACHE_SIZE_KB', 16384)),
+                mmap_size=int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+            )
+            if PARTITIONS > 1:
+                _store = PartitionedHealthStore(DB_PATH, PARTITIONS, archive=RecordArchive(ARCHIVE_DIR), **options)
+            else:
+                _store = HealthStore(DB_PATH, archive=RecordArchive(ARCHIVE_DIR), **options)
+        return _store
@@ -0,0 +1,286 @@
+"""
+Per-patient trend analysis over incoming vital-sign readings.
+
+Each patient has, per vital, a sliding window of the last `window` readings
+with running sums (mean and least-squares slope), monotonic deques
+(min/max) and an EWMA. With a `history` source (the patient's latest stored
+readings, read over the (patient_id, date) index) the window is rebuilt from
+it for every reading and report, so every worker scores a patient from the
+same data. Without one, each process keeps its windows in an LRU of bounded
+size and folds every reading in with O(1) amortized work.
+
+Trend rules come from the "trends" section of the rule table, e.g. a SpO2
+slope below -2 %/hour adds a penalty to the health score. Slope conditions
+only apply once the window covers `min_span_minutes`: over a few seconds of
+bedside-monitor readings, ±1 of noise extrapolates to tens of units per hour.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from metrics import count_error
+
+SECONDS_PER_HOUR = 3600.0
+
+
+class RollingStats:
+    """Sliding-window mean, slope, min/max plus an EWMA for one vital"""
+    __slots__ = ('window', 'alpha', 'values', 'origin', 'sum_x', 'sum_y', 'sum_xy', 'sum_xx',
+                 'min_queue', 'max_queue', 'ewma', 'count', 'updates')
+
+    def __init__(self, window: int, alpha: float):
+        self.window = window
+        self.alpha = alpha
+        self.values: deque = deque()  # (sequence, timestamp, value)
+        self.origin = None
+        self.sum_x = self.sum_y = self.sum_xy = self.sum_xx = 0.0
+        self.min_queue: deque = deque()
+        self.max_queue: deque = deque()
+        self.ewma = None
+        self.count = 0
+        self.updates = 0
+
+    def add(self, timestamp: float, value: float):
+        if self.origin is None:
+            self.origin = timestamp
+        x = (timestamp - self.origin) / SECONDS_PER_HOUR
+        sequence = self.count
+        self.count += 1
+
+        self.values.append((sequence, timestamp, value))
+        self.sum_x += x
+        self.sum_y += value
+        self.sum_xy += x * value
+        self.sum_xx += x * x
+        if len(self.values) > self.window:
+            _, old_timestamp, old_value = self.values.popleft()
+            old_x = (old_timestamp - self.origin) / SECONDS_PER_HOUR
+            self.sum_x -= old_x
+            self.sum_y -= old_value
+            self.sum_xy -= old_x * old_value
+            self.sum_xx -= old_x * old_x
+
+        # Monotonic deques: front is the window min/max
+        while self.min_queue and self.min_queue[-1][1] >= value:
+            self.min_queue.pop()
+        self.min_queue.append((sequence, value))
+        while self.max_queue and self.max_queue[-1][1] <= value:
+            self.max_queue.pop()
+        self.max_queue.append((sequence, value))
+        oldest = sequence - self.window + 1
+        if self.min_queue[0][0] < oldest:
+            self.min_queue.popleft()
+        if self.max_queue[0][0] < oldest:
+            self.max_queue.popleft()
+
+        self.ewma = value if self.ewma is None else self.alpha * value + (1 - self.alpha) * self.ewma
+
+        # Now and then rebase x on the oldest reading and re-derive the sums,
+        # so neither float error nor a growing x can erode the slope
+        self.updates += 1
+        if self.updates % (self.window * 16) == 0:
+            self._rebase()
+
+    def _rebase(self):
+        self.origin = self.values[0][1]
+        points = [((t - self.origin) / SECONDS_PER_HOUR, v) for _, t, v in self.values]
+        self.sum_x = sum(x for x, _ in points)
+        self.sum_y = sum(v for _, v in points)
+        self.sum_xy = sum(x * v for x, v in points)
+        self.sum_xx = sum(x * x for x, _ in points)
+
+    @property
+    def size(self) -> int:
+        return len(self.values)
+
+    def span(self) -> float:
+        """Seconds between the oldest and newest reading in the window"""
+        return self.values[-1][1] - self.values[0][1] if self.values else 0.0
+
+    def slope(self) -> float:
+        """Least-squares slope over the window, in units per hour"""
+        n = len(self.values)
+        denominator = n * self.sum_xx - self.sum_x ** 2
+        if n < 2 or abs(denominator) < 1e-12:
+            return 0.0
+        return (n * self.sum_xy - self.sum_x * self.sum_y) / denominator
+
+    def summary(self) -> Dict:
+        n = len(self.values)
+        return {
+            'readings': n,
+            'latest': self.values[-1][2] if n else None,
+            'mean': round(self.sum_y / n, 3) if n else None,
+            'slope_per_hour': round(self.slope(), 3),
+            'span_minutes': round(self.span() / 60, 1),
+            'ewma': round(self.ewma, 3) if self.ewma is not None else None,
+            'min': self.min_queue[0][1] if n else None,
+            'max': self.max_queue[0][1] if n else None
+        }
+
+
+class TrendRule:
+    """One trend condition from the rule table"""
+
+    def __init__(self, spec: Dict, min_span_minutes: float = 30):
+        self.name = spec['name']
+        self.field = spec['field']
+        self.penalty = spec['penalty']
+        self.min_readings = spec.get('min_readings', 5)
+        # A slope is only trusted once the window covers this much time
+        self.min_span = spec.get('min_span_minutes', min_span_minutes) * 60
+        self.slope_below = spec.get('slope_below')
+        self.slope_above = spec.get('slope_above')
+        self.ewma_below = spec.get('ewma_below')
+        self.ewma_above = spec.get('ewma_above')
+
+    def matches(self, stats: RollingStats) -> bool:
+        if stats.size < self.min_readings:
+            return False
+        if stats.span() >= self.min_span:
+            slope = stats.slope()
+            if self.slope_below is not None and slope < self.slope_below:
+                return True
+            if self.slope_above is not None and slope > self.slope_above:
+                return True
+        if self.ewma_below is not None and stats.ewma < self.ewma_below:
+            return True
+        if self.ewma_above is not None and stats.ewma > self.ewma_above:
+            return True
+        return False
+
+
+def record_time(record: Dict) -> Optional[float]:
+    """Epoch seconds from a record's 'timestamp' (epoch or ISO-8601), or None"""
+    value = record.get('timestamp')
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value) if math.isfinite(value) else None
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            pass
+    return None
+
+
+def reading_timestamp(record: Dict, default: Optional[float] = None) -> float:
+    """Epoch seconds from a record's 'timestamp', else `default`, else now"""
+    timestamp = record_time(record)
+    if timestamp is not None:
+        return timestamp
+    return default if default is not None else time.time()
+
+
+class TrendEngine:
+    """Per-patient rolling statistics with rule-based trend penalties"""
+
+    def __init__(self, rules: Optional[Dict] = None, fields: Optional[Iterable[str]] = None,
+                 window: int = 30, ewma_alpha: float = 0.3, max_patients: int = 10000,
+                 history: Optional[Callable[[str, int], List[Dict]]] = None):
+        rules = rules or {}
+        self.window = rules.get('window', window)
+        self.ewma_alpha = rules.get('ewma_alpha', ewma_alpha)
+        self.max_penalty = rules.get('max_penalty')
+        min_span_minutes = rules.get('min_span_minutes', 30)
+        self.rules = [TrendRule(spec, min_span_minutes) for spec in rules.get('rules', [])]
+        # Tracked vitals: explicit list, else the rule table's, else those the rules reference
+        self.fields = list(fields or rules.get('fields') or sorted({rule.field for rule in self.rules}))
+        self.max_patients = max_patients
+        self.history = history
+
+        # In-process windows, only used without a history source
+        self._patients: 'OrderedDict[str, Dict[str, RollingStats]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _new_patient(self) -> Dict[str, RollingStats]:
+        return {field: RollingStats(self.window, self.ewma_alpha) for field in self.fields}
+
+    def _stored(self, patient_id: str) -> Dict[str, RollingStats]:
+        """A fresh window over the patient's latest stored readings"""
+        stats = self._new_patient()
+        try:
+            for record in self.history(patient_id, self.window):
+                self._fold(stats, record, reading_timestamp(record))
+        except Exception as e:
+            print(f"Error reading trend history for patient {patient_id}: {e}")
+            count_error('trend_history')
+        return stats
+
+    def _patient(self, patient_id: str) -> Dict[str, RollingStats]:
+        """In-process stats for a patient (caller holds the lock)"""
+        stats = self._patients.get(patient_id)
+        if stats is None:
+            stats = self._patients[patient_id] = self._new_patient()
+            while len(self._patients) > self.max_patients:
+                self._patients.popitem(last=False)
+        else:
+            self._patients.move_to_end(patient_id)
+        return stats
+
+    def _fold(self, stats: Dict[str, RollingStats], record: Dict, timestamp: float):
+        for field, field_stats in stats.items():
+            value = record.get(field)
+            # 0 is the "not measured" placeholder used by the forms
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and value:
+                field_stats.add(timestamp, float(value))
+
+    def _evaluate(self, stats: Dict[str, RollingStats]) -> Tuple[int, List[str]]:
+        penalty = 0
+        flags = []
+        for rule in self.rules:
+            field_stats = stats.get(rule.field)
+            if field_stats is not None and rule.matches(field_stats):
+                penalty += rule.penalty
+                flags.append(rule.name)
+        if self.max_penalty is not None:
+            penalty = min(penalty, self.max_penalty)
+        return penalty, flags
+
+    def update(self, patient_id: str, record: Dict, timestamp: Optional[float] = None,
+               pending: Iterable[Dict] = ()) -> Dict:
+        """
+        Fold one reading in and return the patient's current trend penalty and flags.
+        `pending` are earlier readings of the same request that are not stored yet.
+        Nothing is kept with a history source: the reading counts once it is stored.
+        """
+        timestamp = reading_timestamp(record, timestamp)
+        if self.history is not None:
+            stats = self._stored(patient_id)
+            for earlier in pending:
+                self._fold(stats, earlier, reading_timestamp(earlier, timestamp))
+            self._fold(stats, record, timestamp)
+            penalty, flags = self._evaluate(stats)
+            return {'penalty': penalty, 'flags': flags}
+
+        with self._lock:
+            stats = self._patient(patient_id)
+            self._fold(stats, record, timestamp)
+            penalty, flags = self._evaluate(stats)
+        return {'penalty': penalty, 'flags': flags}
+
+    def report(self, patient_id: str) -> Optional[Dict]:
+        """Rolling statistics for every vital of a patient, or None without readings"""
+        if self.history is not None:
+            return self._report(patient_id, self._stored(patient_id))
+        with self._lock:
+            return self._report(patient_id, self._patients.get(patient_id))
+
+    def _report(self, patient_id: str, stats: Optional[Dict[str, RollingStats]]) -> Optional[Dict]:
+        if stats is None or not any(field_stats.size for field_stats in stats.values()):
+            return None
+        penalty, flags = self._evaluate(stats)
+        return {
+            'patient_id': patient_id,
+            'window': self.window,
+            'penalty': penalty,
+            'flags': flags,
+            'vitals': {field: field_stats.summary() for field, field_stats in stats.items()}
+        }
+
+    def patients(self) -> int:
+        """Patients held in process (always 0 with a history source)"""
+        with self._lock:
+            return len(self._patients)
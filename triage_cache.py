@@ -0,0 +1,89 @@
+"""
+Pre-serialized triage responses.
+
+The triage input space is tiny (symptom x yes-count x caretaker flag), so
+every `/get_triage_questions` and `/classify_emergency` answer for a known
+symptom is rendered to JSON bytes once at startup, each with a strong ETag.
+The full catalog (questions, instructions and triage tables) is published
+under a content-hash version so clients can fetch it once, cache it forever
+and classify locally when offline or when the server is saturated.
+"""
+import hashlib
+import json
+from typing import Dict, List, NamedTuple, Optional
+
+from rule_engine import RuleEngine
+
+
+class CachedPayload(NamedTuple):
+    body: bytes
+    etag: str
+
+
+def serialize(payload: Dict) -> CachedPayload:
+    """JSON bytes (compact, sorted keys like jsonify) and their ETag"""
+    body = json.dumps(payload, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return CachedPayload(body, hashlib.sha256(body).hexdigest()[:32])
+
+
+class TriageResponseCache:
+    """Every triage/classification response for known symptoms, rendered once"""
+
+    def __init__(self, engine: RuleEngine, questions: Dict[str, List[Dict]],
+                 instructions: Dict[str, List[str]], fallback_symptom: str = 'other'):
+        self.engine = engine
+        self.questions = questions
+        self.instructions = instructions
+        self.fallback_symptom = fallback_symptom
+        self.depth = engine.triage_depth()
+
+        self._questions = {
+            symptom: serialize({'success': True, 'questions': symptom_questions})
+            for symptom, symptom_questions in questions.items()
+        }
+
+        # None is a missing symptom; it classifies with the default table and echoes null
+        symptoms = [None] + sorted(set(questions) | set(engine.triage_symptoms()))
+        self._classifications: Dict = {
+            (symptom, yes_count, unconscious): self._render_classification(symptom, yes_count, unconscious)
+            for symptom in symptoms
+            for yes_count in range(self.depth + 1)
+            for unconscious in (False, True)
+        }
+
+        catalog = {
+            'questions': questions,
+            'instructions': instructions,
+            'triage': engine.triage_tables(),
+            'rules_version': engine.version
+        }
+        self.version = serialize(catalog).etag[:12]
+        self.catalog = serialize({'success': True, 'version': self.version, **catalog})
+
+    def _render_classification(self, symptom: Optional[str], yes_count: int, unconscious: bool) -> CachedPayload:
+        return serialize(self.classification(symptom, yes_count, unconscious))
+
+    def classification(self, symptom, yes_count: int, unconscious: bool) -> Dict:
+        """The /classify_emergency payload, built from scratch"""
+        severity, instructions_key = self.engine.classify(symptom, yes_count, caretaker_unconscious=unconscious)
+        return {
+            'success': True,
+            'severity': severity,
+            'instructions': self.instructions.get(instructions_key, self.instructions['stable']),
+            'symptom': symptom
+        }
+
+    def questions_response(self, symptom) -> CachedPayload:
+        cached = self._questions.get(symptom) if isinstance(symptom, str) else None
+        return cached if cached is not None else self._questions[self.fallback_symptom]
+
+    def classify_response(self, symptom, yes_count: int, unconscious: bool) -> CachedPayload:
+        """
+        Pre-rendered classification; unknown symptom strings (echoed back verbatim)
+        are rendered per call rather than cached without bound
+        """
+        if symptom is None or isinstance(symptom, str):
+            cached = self._classifications.get((symptom, min(max(yes_count, 0), self.depth), unconscious))
+            if cached is not None:
+                return cached
+        return serialize(self.classification(symptom, yes_count, unconscious))
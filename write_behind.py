@@ -0,0 +1,153 @@
+"""
+Write-behind batching for health_records inserts.
+
+Request threads enqueue INSERT parameters and return immediately; a single
+background thread per worker drains the queue and writes rows with one
+`executemany` transaction per batch, flushing when `batch_size` rows are
+waiting or `flush_interval` seconds after the first row of a batch arrived.
+If a batch fails, its rows are retried one per transaction so that only the
+rows that fail on their own are lost. The queue is drained on interpreter
+shutdown.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from metrics import count_error
+from storage import HealthStore, PartialInsertError
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """Bounded queue of pending inserts flushed in batches by a background thread"""
+
+    def __init__(self, store: HealthStore, batch_size: int = 200,
+                 flush_interval: float = 0.05, max_queue: int = 10000):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: 'queue.Queue' = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._counters = {
+            'enqueued': 0,
+            'flushed_rows': 0,
+            'batches': 0,
+            'failed_rows': 0,
+            'total_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'last_flush_ms': 0.0
+        }
+
+    def submit(self, params: Sequence, block: bool = False, timeout: Optional[float] = None):
+        """
+        Queue one row of INSERT_HEALTH_RECORD parameters.
+        Raises queue.Full when the queue stays full (non-blocking by default).
+        """
+        self._ensure_started()
+        self._queue.put(params, block=block, timeout=timeout)
+        with self._stats_lock:
+            self._counters['enqueued'] += 1
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stop(self, timeout: float = 10.0):
+        """Flush everything still queued and stop the writer thread"""
+        thread = self._thread
+        if thread is None or not thread.is_alive() or self._pid != os.getpid():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def stats(self) -> Dict:
+        """Queue depth and flush latency metrics"""
+        with self._stats_lock:
+            stats = dict(self._counters)
+        batches = stats['batches']
+        stats['avg_flush_ms'] = round(stats.pop('total_flush_ms') / batches, 3) if batches else 0.0
+        stats['queue_depth'] = self.depth()
+        stats['queue_capacity'] = self._queue.maxsize
+        return stats
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='health-write-behind', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            batch: List[Sequence] = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._flush(batch)
+            if stopping:
+                # Drain whatever was queued behind the stop marker
+                rest = []
+                while True:
+                    try:
+                        rest.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                rest = [row for row in rest if row is not _STOP]
+                for start in range(0, len(rest), self.batch_size):
+                    self._flush(rest[start:start + self.batch_size])
+                return
+
+    def _flush(self, batch: List[Sequence]):
+        start = time.perf_counter()
+        try:
+            self.store.insert_records(batch)
+            failed = 0
+        except Exception as e:
+            print(f"Error flushing {len(batch)} health records, retrying them one by one: {e}")
+            count_error('write_flush')
+            failed = self._insert_each(e.rows if isinstance(e, PartialInsertError) else batch)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        with self._stats_lock:
+            self._counters['batches'] += 1
+            self._counters['flushed_rows'] += len(batch) - failed
+            self._counters['failed_rows'] += failed
+            self._counters['total_flush_ms'] += elapsed_ms
+            self._counters['last_flush_ms'] = round(elapsed_ms, 3)
+            self._counters['max_flush_ms'] = round(max(self._counters['max_flush_ms'], elapsed_ms), 3)
+
+    def _insert_each(self, rows: List[Sequence]) -> int:
+        """Insert rows one per transaction so a bad row only loses itself; Returns: rows that failed"""
+        failed = 0
+        for params in rows:
+            try:
+                self.store.insert_record(params)
+            except Exception as e:
+                print(f"Error saving health record {params!r}: {e}")
+                failed += 1
+        return failed